@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for analytics payloads
+
+Analytics documents for a GridFS ID never change, so once downloaded they
+can be served from disk on every later run. Payloads are stored once per
+content hash as zlib-compressed JSON under objects/, and each cache key
+(e.g. "analytics:<id>") points at its hash from a small file under refs/.
+Identical payloads stored under different keys share one object.
+
+All writes go through a temp file and os.replace, so concurrent crawlers
+never read a partial entry. open_writer streams a payload into the cache
+as it is produced, and iter_raw streams it back out, so neither side has
+to hold a whole payload in memory. A ref file's mtime is its last access time;
+once the objects exceed the byte budget, the least recently used refs are
+dropped and objects no ref points at are deleted.
+
+Usage:
+    python analytics_cache.py stats
+    python analytics_cache.py evict --max-mb 256
+    python analytics_cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_DIR = os.environ.get('ANALYTICS_CACHE_DIR', '.analytics_cache')
+ANALYTICS_CACHE_MAX_BYTES = 1024 ** 3
+
+# Unreferenced objects younger than this may belong to a put() still in
+# flight in another process, so eviction leaves them alone
+ORPHAN_GRACE_SECONDS = 60
+
+class AnalyticsCache:
+    def __init__(self, cache_dir: str = ANALYTICS_CACHE_DIR, max_bytes: int = ANALYTICS_CACHE_MAX_BYTES,
+                 compression_level: int = 6):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding objects/ and refs/
+            max_bytes: Disk budget for compressed objects
+            compression_level: zlib level used for new objects
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.refs_dir = os.path.join(cache_dir, 'refs')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Running estimate of object bytes, so put() only rescans the
+        # directory when the budget may actually be exceeded
+        self._approx_bytes = None
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.refs_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + '.json')
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest + '.json.z')
+
+    def _write_atomic(self, path: str, data: bytes):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read_ref(self, ref_path: str) -> Optional[Dict]:
+        try:
+            with open(ref_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def contains(self, key: str, max_age: Optional[float] = None) -> bool:
+        """Whether get(key, max_age) would find an entry, without loading it"""
+        ref = self._read_ref(self._ref_path(key))
+        if not ref or ref.get('key') != key:
+            return False
+        if max_age is not None and time.time() - ref['stored_at'] > max_age:
+            return False
+        return os.path.exists(self._object_path(ref['hash']))
+
+    def iter_raw(self, key: str, max_age: Optional[float] = None,
+                 chunk_size: int = 65536) -> Optional[Iterator[bytes]]:
+        """
+        Stream a cached payload's serialized JSON
+
+        Args:
+            key: Cache key, e.g. "analytics:<id>"
+            max_age: Treat entries stored more than this many seconds ago
+                as missing (None for immutable payloads)
+            chunk_size: Compressed bytes read at a time
+
+        Returns:
+            An iterator of decompressed chunks, or None on a miss. The
+            iterator raises ValueError at the end if the entry turns out to
+            be corrupt, after dropping it.
+        """
+        ref_path = self._ref_path(key)
+        ref = self._read_ref(ref_path)
+        if not ref or ref.get('key') != key or (max_age is not None and time.time() - ref['stored_at'] > max_age):
+            self._count(False)
+            return None
+
+        try:
+            f = open(self._object_path(ref['hash']), 'rb')
+        except OSError as e:
+            logger.warning(f"Dropping unreadable analytics cache entry {key}: {e}")
+            self._unlink(ref_path)
+            self._count(False)
+            return None
+
+        try:
+            os.utime(ref_path)
+        except OSError:
+            pass
+        self._count(True)
+        return self._read_object(f, key, ref_path, ref['hash'], chunk_size)
+
+    def _read_object(self, f, key: str, ref_path: str, expected: str, chunk_size: int) -> Iterator[bytes]:
+        digest = hashlib.sha256()
+        decompressor = zlib.decompressobj()
+        with f:
+            try:
+                for block in iter(lambda: f.read(chunk_size), b''):
+                    data = decompressor.decompress(block)
+                    digest.update(data)
+                    if data:
+                        yield data
+                data = decompressor.flush()
+            except (OSError, zlib.error) as e:
+                logger.warning(f"Dropping unreadable analytics cache entry {key}: {e}")
+                self._unlink(ref_path)
+                raise ValueError(f"Unreadable analytics cache entry {key}") from e
+        digest.update(data)
+        if data:
+            yield data
+        if digest.hexdigest() != expected or not decompressor.eof:
+            logger.warning(f"Dropping corrupt analytics cache entry {key}")
+            self._unlink(ref_path)
+            raise ValueError(f"Corrupt analytics cache entry {key}")
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        Load a cached payload
+
+        Args:
+            key: Cache key, e.g. "analytics:<id>"
+            max_age: Treat entries stored more than this many seconds ago
+                as missing (None for immutable payloads)
+
+        Returns:
+            The decoded payload, or None on a miss
+        """
+        chunks = self.iter_raw(key, max_age=max_age)
+        if chunks is None:
+            return None
+        try:
+            return json.loads(b''.join(chunks))
+        except ValueError:
+            return None
+
+    def open_writer(self, key: str) -> 'CacheWriter':
+        """Start streaming a payload's serialized JSON into the cache under key"""
+        return CacheWriter(self, key)
+
+    def put(self, key: str, payload: Any) -> str:
+        """
+        Store a payload under key
+
+        Args:
+            key: Cache key, e.g. "analytics:<id>"
+            payload: JSON-serializable payload
+
+        Returns:
+            SHA-256 of the payload's serialized form
+        """
+        with self.open_writer(key) as writer:
+            writer.write(json.dumps(payload, separators=(',', ':')).encode())
+            return writer.commit()
+
+    def _publish(self, key: str, digest: str, temp_path: str, raw_bytes: int, compressed_size: int):
+        """Move a finished temp object into place and point key at it"""
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            os.utime(object_path)
+            compressed_size = os.path.getsize(object_path)
+            self._unlink(temp_path)
+        else:
+            with self._lock:
+                if self._approx_bytes is None or self._approx_bytes + compressed_size > self.max_bytes:
+                    self._evict(reserve=compressed_size)
+                self._approx_bytes += compressed_size
+            os.replace(temp_path, object_path)
+
+        ref = {'key': key, 'hash': digest, 'raw_bytes': raw_bytes,
+               'compressed_bytes': compressed_size, 'stored_at': time.time()}
+        self._write_atomic(self._ref_path(key), json.dumps(ref).encode())
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Optional[Any]],
+                     max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        Return the cached payload for key, calling fetch and storing its result on a miss
+
+        A None result from fetch is returned but not cached.
+        """
+        payload = self.get(key, max_age=max_age)
+        if payload is not None:
+            return payload
+        payload = fetch()
+        if payload is not None:
+            try:
+                self.put(key, payload)
+            except OSError as e:
+                logger.warning(f"Could not cache {key}: {e}")
+        return payload
+
+    def _unlink(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _scan(self) -> Tuple[List[Tuple[float, str, Dict]], Dict[str, Tuple[int, float]]]:
+        """Refs as (last access, path, ref) and objects as {hash: (bytes, mtime)}"""
+        refs = []
+        for entry in os.scandir(self.refs_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            ref = self._read_ref(entry.path)
+            try:
+                if ref:
+                    refs.append((entry.stat().st_mtime, entry.path, ref))
+            except FileNotFoundError:
+                continue
+
+        objects = {}
+        for entry in os.scandir(self.objects_dir):
+            if not entry.name.endswith('.json.z'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            objects[entry.name[:-len('.json.z')]] = (stat.st_size, stat.st_mtime)
+        return refs, objects
+
+    def _evict(self, reserve: int = 0, max_bytes: Optional[int] = None) -> int:
+        """
+        Drop least recently used entries until objects fit the budget
+
+        Args:
+            reserve: Bytes about to be written
+            max_bytes: Budget to enforce (default: the cache's own)
+
+        Returns:
+            Bytes freed
+        """
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        refs, objects = self._scan()
+        now = time.time()
+
+        # Orphans first: objects whose refs were overwritten or evicted
+        live = {ref['hash'] for _, _, ref in refs}
+        freed = 0
+        for digest, (size, mtime) in list(objects.items()):
+            if digest not in live and now - mtime > ORPHAN_GRACE_SECONDS:
+                if self._unlink(self._object_path(digest)):
+                    freed += size
+                del objects[digest]
+
+        total = sum(size for size, _ in objects.values())
+        if total + reserve <= budget:
+            self._approx_bytes = total
+            return freed
+
+        holders = {}
+        for _, _, ref in refs:
+            holders[ref['hash']] = holders.get(ref['hash'], 0) + 1
+
+        for _, ref_path, ref in sorted(refs, key=lambda item: item[0]):
+            if total + reserve <= budget:
+                break
+            self._unlink(ref_path)
+            digest = ref['hash']
+            holders[digest] -= 1
+            if holders[digest] == 0 and digest in objects:
+                size = objects.pop(digest)[0]
+                if self._unlink(self._object_path(digest)):
+                    freed += size
+                total -= size
+
+        self._approx_bytes = total
+        if freed:
+            logger.info(f"Analytics cache evicted {freed / 1024 / 1024:.1f} MB")
+        return freed
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Enforce a byte budget now; returns bytes freed"""
+        return self._evict(max_bytes=max_bytes)
+
+    def clear(self):
+        """Remove every entry"""
+        for directory in (self.refs_dir, self.objects_dir):
+            for entry in os.scandir(directory):
+                self._unlink(entry.path)
+        self._approx_bytes = 0
+
+    def stats(self) -> Dict:
+        """
+        Summarize the cache contents
+
+        Returns:
+            Entry, object and byte counts, the compression ratio, entry ages
+            and this process's hit/miss counts
+        """
+        refs, objects = self._scan()
+        compressed = sum(size for size, _ in objects.values())
+        raw = {}
+        for _, _, ref in refs:
+            raw[ref['hash']] = ref.get('raw_bytes', 0)
+        raw_total = sum(raw.values())
+        kinds = {}
+        for _, _, ref in refs:
+            kind = ref['key'].split(':', 1)[0]
+            kinds[kind] = kinds.get(kind, 0) + 1
+        access_times = [mtime for mtime, _, _ in refs]
+
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': len(refs),
+            'entries_by_kind': kinds,
+            'objects': len(objects),
+            'compressed_bytes': compressed,
+            'raw_bytes': raw_total,
+            'compression_ratio': raw_total / compressed if compressed else 0.0,
+            'max_bytes': self.max_bytes,
+            'oldest_access': min(access_times) if access_times else None,
+            'newest_access': max(access_times) if access_times else None,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def log_stats(self):
+        """Log this process's hit rate and the cache size"""
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0.0
+        logger.info(f"Analytics cache: {stats['hits']}/{lookups} hits ({hit_rate:.0f}%), "
+                    f"{stats['entries']} entries, {stats['compressed_bytes'] / 1024 / 1024:.1f} MB on disk")
+
+class CacheWriter:
+    """
+    Streams one payload into the cache through a compressed temp file
+
+    commit() publishes it under the key; closing without a commit (or
+    leaving the with block on an exception) discards it.
+    """
+
+    def __init__(self, cache: AnalyticsCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.temp_path = os.path.join(cache.objects_dir,
+                                      f".{os.getpid()}.{threading.get_ident()}.{id(self)}.tmp")
+        self.file = open(self.temp_path, 'wb')
+        self.compressor = zlib.compressobj(cache.compression_level)
+        self.digest = hashlib.sha256()
+        self.raw_bytes = 0
+        self.committed = False
+
+    def write(self, data: bytes):
+        """Append serialized JSON"""
+        self.digest.update(data)
+        self.raw_bytes += len(data)
+        self.file.write(self.compressor.compress(data))
+
+    def commit(self) -> str:
+        """
+        Publish what was written
+
+        Returns:
+            SHA-256 of the payload's serialized form
+        """
+        self.file.write(self.compressor.flush())
+        self.file.close()
+        digest = self.digest.hexdigest()
+        self.cache._publish(self.key, digest, self.temp_path, self.raw_bytes, os.path.getsize(self.temp_path))
+        self.committed = True
+        return digest
+
+    def close(self):
+        """Discard the payload unless it was committed"""
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed:
+            self.cache._unlink(self.temp_path)
+
+    def __enter__(self) -> 'CacheWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    """Inspect or maintain the analytics cache"""
+    parser = argparse.ArgumentParser(description="Analytics payload cache maintenance")
+    parser.add_argument("command", choices=["stats", "evict", "clear"])
+    parser.add_argument("--cache-dir", default=ANALYTICS_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--max-mb", type=float, help="Budget to enforce for 'evict' (default: cache budget)")
+    args = parser.parse_args()
+
+    cache = AnalyticsCache(args.cache_dir)
+
+    if args.command == "evict":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        freed = cache.evict(max_bytes=max_bytes)
+        print(f"🗑️ Freed {freed / 1024 / 1024:.1f} MB")
+    elif args.command == "clear":
+        cache.clear()
+        print(f"🗑️ Cleared {args.cache_dir}")
+
+    stats = cache.stats()
+    print(f"📦 ANALYTICS CACHE: {stats['cache_dir']}")
+    print(f"   Entries: {stats['entries']} {stats['entries_by_kind'] or ''}")
+    print(f"   Objects: {stats['objects']}")
+    print(f"   On disk: {stats['compressed_bytes'] / 1024 / 1024:.1f} MB "
+          f"of {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    print(f"   Uncompressed: {stats['raw_bytes'] / 1024 / 1024:.1f} MB "
+          f"({stats['compression_ratio']:.1f}x compression)")
+    if stats['oldest_access']:
+        print(f"   Last access: {time.ctime(stats['newest_access'])} "
+              f"(oldest {time.ctime(stats['oldest_access'])})")
+
+if __name__ == "__main__":
+    main()
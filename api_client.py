@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the gymnastics analytics scripts
+
+Wraps a pooled requests.Session with:
+1. Keep-alive connection pools sized for concurrent callers
+2. Jittered exponential backoff on 5xx responses, 429s, timeouts and
+   connection errors (cold-starting hosts like onrender). Non-idempotent
+   requests such as POST are only retried on 429, since any other failure
+   may have reached the server after it acted.
+3. ETag / If-None-Match revalidation so unchanged GET responses come back
+   as cheap 304s. Validators and bodies are kept on disk under
+   API_ETAG_CACHE_DIR, so later runs revalidate instead of re-downloading.
+4. Per-endpoint counters for requests, retries, 304s and latency
+
+iter_json_items parses a streamed response incrementally, yielding the
+elements of a JSON array one at a time.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlparse
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods that are safe to repeat after a failure the server may have seen
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Validators and bodies of ETag-tagged GET responses, kept between runs
+API_ETAG_CACHE_DIR = os.environ.get('API_ETAG_CACHE_DIR', '.api_etag_cache')
+
+# Bodies larger than this are revalidated from memory only
+ETAG_CACHE_MAX_BODY_BYTES = 32 * 1024 * 1024
+
+# Path segments that identify a record rather than an endpoint
+_ID_SEGMENT = re.compile(r'^(?:[0-9a-fA-F]{8,}|\d+|[0-9a-fA-F-]{36})$')
+
+class ApiClient:
+    def __init__(self, base_url: str = "", pool_size: int = 10, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, timeout: float = 30,
+                 conditional: bool = True, etag_cache_dir: Optional[str] = API_ETAG_CACHE_DIR):
+        """
+        Initialize the client
+
+        Args:
+            base_url: Prefix for relative paths such as "/getSessions"
+            pool_size: Keep-alive connections kept per host
+            max_retries: Retries after the first attempt (0 disables retrying)
+            backoff_base: Backoff ceiling in seconds before the first retry
+            backoff_max: Largest backoff ceiling in seconds
+            timeout: Default request timeout in seconds
+            conditional: Revalidate GETs with If-None-Match when an ETag is known
+            etag_cache_dir: Directory persisting ETags and bodies between runs
+                (None keeps them in memory only)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.conditional = conditional
+        self.etag_cache_dir = etag_cache_dir
+        self.session = requests.Session()
+        self.set_pool_size(pool_size)
+
+        self._etags = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+    def set_pool_size(self, pool_size: int):
+        """Resize the keep-alive pool, e.g. to match a crawler's concurrency"""
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path: str) -> str:
+        """Absolute URL for a path relative to base_url"""
+        if path.startswith(('http://', 'https://')):
+            return path
+        return urljoin(self.base_url + '/', path.lstrip('/'))
+
+    @staticmethod
+    def endpoint_name(method: str, url: str) -> str:
+        """Counter key for a request, with record IDs collapsed to {id}"""
+        parsed = urlparse(url)
+        segments = ['{id}' if _ID_SEGMENT.match(segment) else segment
+                    for segment in parsed.path.split('/')]
+        return f"{method} {parsed.netloc}{'/'.join(segments)}"
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Full-jitter delay before retry number attempt (1-based)"""
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def _record(self, endpoint: str, latency: float, retries: int, status: Optional[int],
+                not_modified: bool = False):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {
+                'requests': 0, 'retries': 0, 'errors': 0, 'not_modified': 0,
+                'total_latency': 0.0, 'max_latency': 0.0
+            })
+            counters['requests'] += 1
+            counters['retries'] += retries
+            counters['total_latency'] += latency
+            counters['max_latency'] = max(counters['max_latency'], latency)
+            if status is None or status >= 400:
+                counters['errors'] += 1
+            if not_modified:
+                counters['not_modified'] += 1
+
+    def _etag_path(self, cache_key: str) -> str:
+        return os.path.join(self.etag_cache_dir, hashlib.sha256(cache_key.encode()).hexdigest()[:32] + '.z')
+
+    def _load_validator(self, cache_key: str) -> Optional[Tuple[str, requests.Response]]:
+        """ETag and cached response for a URL, from memory or disk"""
+        with self._lock:
+            cached = self._etags.get(cache_key)
+        if cached or not self.etag_cache_dir:
+            return cached
+
+        path = self._etag_path(cache_key)
+        try:
+            with open(path, 'rb') as f:
+                header, body = zlib.decompress(f.read()).split(b'\n', 1)
+            meta = json.loads(header)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Dropping unreadable ETag cache entry for {cache_key}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if meta.get('url') != cache_key:
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = cache_key
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = meta['encoding']
+        response._content = body
+        response.from_etag_cache = True
+        cached = (meta['etag'], response)
+        with self._lock:
+            self._etags[cache_key] = cached
+        return cached
+
+    def _store_validator(self, cache_key: str, response: requests.Response):
+        """Remember a tagged 200 response in memory and, if enabled, on disk"""
+        cached_response = requests.Response()
+        cached_response.__setstate__(response.__getstate__())
+        cached_response.from_etag_cache = True
+        etag = response.headers['ETag']
+        with self._lock:
+            self._etags[cache_key] = (etag, cached_response)
+
+        if not self.etag_cache_dir or len(response.content) > ETAG_CACHE_MAX_BODY_BYTES:
+            return
+        meta = {'url': cache_key, 'etag': etag, 'headers': dict(response.headers),
+                'encoding': response.encoding}
+        path = self._etag_path(cache_key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.etag_cache_dir, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(json.dumps(meta).encode() + b'\n' + response.content))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist ETag for {cache_key}: {e}")
+
+    def request(self, method: str, path: str, conditional: bool = None, idempotent: bool = None,
+                **kwargs) -> requests.Response:
+        """
+        Send a request with retries and, for GETs, ETag revalidation
+
+        Args:
+            method: HTTP method
+            path: Path relative to base_url, or an absolute URL
+            conditional: Override the client's ETag setting for this call
+            idempotent: Whether the request may be repeated after a timeout,
+                connection error or 5xx (default: True for GET, HEAD,
+                OPTIONS, PUT and DELETE). Non-idempotent requests are only
+                retried on 429.
+            **kwargs: Passed to requests.Session.request
+
+        Returns:
+            The final response. A 304 is answered with the cached 200
+            response, which has from_etag_cache set to True.
+
+        Raises:
+            requests.RequestException: If every attempt failed without a response
+        """
+        url = self.url(path)
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = self.endpoint_name(method, url)
+
+        if conditional is None:
+            conditional = self.conditional
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        headers = dict(kwargs.pop('headers', None) or {})
+        cache_key = None
+        cached = None
+        if (conditional and method == 'GET' and not kwargs.get('stream')
+                and 'Range' not in headers):
+            cache_key = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+            cached = self._load_validator(cache_key)
+            if cached:
+                headers['If-None-Match'] = cached[0]
+
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+                retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    break
+                failure = f"status {response.status_code}"
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    self._record(endpoint, time.perf_counter() - start, attempt, None)
+                    raise
+                failure = str(e)
+
+            attempt += 1
+            delay = self._backoff(attempt, response)
+            logger.info(f"Retrying {endpoint} in {delay:.2f}s (attempt {attempt}/{self.max_retries}): {failure}")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        latency = time.perf_counter() - start
+
+        if response.status_code == 304 and cached:
+            self._record(endpoint, latency, attempt, 200, not_modified=True)
+            return cached[1]
+
+        if cache_key and response.status_code == 200 and response.headers.get('ETag'):
+            response.from_etag_cache = False
+            self._store_validator(cache_key, response)
+
+        self._record(endpoint, latency, attempt, response.status_code)
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def head(self, path: str, **kwargs) -> requests.Response:
+        return self.request('HEAD', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-endpoint counters with average latency"""
+        with self._lock:
+            stats = {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+        for counters in stats.values():
+            counters['avg_latency'] = counters['total_latency'] / counters['requests']
+        return stats
+
+    def log_stats(self):
+        """Log a line of counters per endpoint"""
+        for endpoint, counters in sorted(self.stats().items()):
+            logger.info(f"{endpoint}: {counters['requests']} requests, {counters['retries']} retries, "
+                        f"{counters['not_modified']} not modified, {counters['errors']} errors, "
+                        f"avg {counters['avg_latency'] * 1000:.0f}ms, max {counters['max_latency'] * 1000:.0f}ms")
+
+
+def iter_json_items(chunks: Iterable[bytes], paths: Sequence[Tuple[str, ...]]) -> Iterator:
+    """
+    Yield the elements of a JSON array as the document streams in
+
+    Only one element is held in memory at a time, plus whatever values
+    sit on the way to the array. Uses ijson when installed, otherwise an
+    incremental scanner built on json.JSONDecoder.raw_decode.
+
+    Args:
+        chunks: Raw bytes, e.g. response.iter_content(65536)
+        paths: Candidate key paths to the array, tried in document order;
+            () is a top-level array, ('sessions',) the array under
+            {"sessions": [...]}
+
+    Yields:
+        Array elements from the first path found
+    """
+    if ijson is not None:
+        yield from _iter_items_ijson(chunks, paths)
+    else:
+        yield from _ItemScanner(chunks, paths).items()
+
+def _iter_items_ijson(chunks: Iterable[bytes], paths: Sequence[Tuple[str, ...]]) -> Iterator:
+    # ijson prefixes: "item" for a top-level array element, "sessions.item" under a key
+    arrays = {'.'.join(path + ('item',)): '.'.join(path) for path in paths}
+    builder = None
+    matched = None
+
+    for prefix, event, value in ijson.parse(_ChunkReader(chunks), use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == matched and event in ('end_map', 'end_array'):
+                yield builder.value
+                builder = None
+        elif matched is None and prefix in arrays and event != 'end_array':
+            matched = prefix
+        if builder is None and prefix == matched:
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif event not in ('end_map', 'end_array'):
+                yield value
+        elif matched is not None and prefix == arrays[matched] and event == 'end_array':
+            return
+
+class _ChunkReader:
+    """File-like wrapper over an iterator of byte chunks, for ijson"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b''
+        return next(self.chunks, b'')
+
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+class _ItemScanner:
+    """Incremental scanner that walks down a key path and decodes array items"""
+
+    def __init__(self, chunks: Iterable[bytes], paths: Sequence[Tuple[str, ...]]):
+        self.chunks = iter(chunks)
+        self.paths = [tuple(path) for path in paths]
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.found = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer; False at end of stream"""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buf += self.decoder.decode(b'', final=True)
+            return False
+        if self.pos > 65536:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += self.decoder.decode(chunk)
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found '{self.buf[self.pos]}'")
+        self.pos += 1
+
+    def _value(self):
+        """Decode one complete value, reading more input until it is whole"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # A number cut at a chunk boundary ("2" | ".5") may continue
+                if self.eof or (end < len(self.buf) and self.buf[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self) -> Iterator:
+        yield from self._walk(())
+
+    def _walk(self, path: Tuple[str, ...]) -> Iterator:
+        """Walk the value at path, returning after it once a target array was consumed"""
+        char = self._peek()
+        if char == '[' and path in self.paths:
+            self.pos += 1
+            if self._peek() == ']':
+                self.pos += 1
+                self.found = True
+                return
+            while True:
+                yield self._value()
+                if self._peek() == ',':
+                    self.pos += 1
+                    continue
+                self._expect(']')
+                self.found = True
+                return
+        elif char == '{' and any(p[:len(path)] == path and len(p) > len(path) for p in self.paths):
+            self.pos += 1
+            if self._peek() == '}':
+                self.pos += 1
+                return
+            while True:
+                key = self._value()
+                self._expect(':')
+                yield from self._walk(path + (key,))
+                if self.found:
+                    return
+                if self._peek() == ',':
+                    self.pos += 1
+                    continue
+                self._expect('}')
+                return
+        else:
+            # Not on the way to a target; decode and discard
+            self._value()
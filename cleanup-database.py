@@ -5,86 +5,216 @@ Helps free up MongoDB Atlas storage space by removing old/large files
 """
 
 import requests
+import argparse
 import json
-from datetime import datetime, timedelta
+import heapq
+from datetime import datetime, timedelta, timezone
+
+from api_client import ApiClient
+from frame_analytics_codec import compression_report
+from cleanup_executor import (CLEANUP_ACTIONS, CLEANUP_ARCHIVE_DIR, CLEANUP_JOURNAL, CleanupExecutor,
+                              HttpCleanupBackend, LocalCleanupBackend)
+from session_store import SessionStore
+from video_dedup import DuplicateDetector, duplicate_savings, video_key
 
 API_BASE = "http://localhost:5004"
 
-def get_sessions():
-    """Get all sessions from the API"""
+MB = 1024 * 1024
+LARGE_FILE_BYTES = 10 * MB  # Files larger than 10MB
+TOP_K_LARGE_FILES = 20
+SUGGESTED_DELETIONS = 5
+
+def sync_sessions(client, store):
+    """Sync new and changed sessions from the API into the local store
+
+    Args:
+        client: ApiClient for the backend
+        store: Local SessionStore mirroring that backend
+
+    Returns:
+        Number of sessions available locally
+    """
     try:
-        response = requests.get(f"{API_BASE}/getSessions")
-        if response.status_code == 200:
-            return response.json().get('sessions', [])
-        else:
-            print(f"❌ Failed to get sessions: {response.status_code}")
-            return []
+        sync = store.sync(client)
+        print(f"🔄 Synced sessions: {sync['inserted']} new, {sync['updated']} changed, {sync['deleted']} deleted")
     except Exception as e:
-        print(f"❌ Error getting sessions: {e}")
-        return []
+        print(f"❌ Error syncing sessions: {e}")
+        if store.count():
+            print("⚠️ Using the local copy of the sessions")
+    return store.count()
+
+def _log2_bucket(value):
+    """Log2 bucket index: 0 for value < 1, k for 2**(k-1) <= value < 2**k"""
+    return max(int(value), 0).bit_length()
+
+def _bucket_label(bucket, unit):
+    if bucket == 0:
+        return f"< 1 {unit}"
+    return f"{2 ** (bucket - 1)}-{2 ** bucket} {unit}"
+
+def _parse_created_at(value):
+    """Parse an ISO created_at string into a naive UTC datetime, or None"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+class StorageAnalyzer:
+    """Single-pass storage analysis over a stream of sessions
+
+    Keeps running totals, log2 size and age histograms and a bounded min-heap
+    of the top-K largest sessions, so memory stays constant however many
+    sessions are fed in.
+    """
+
+    def __init__(self, top_k=TOP_K_LARGE_FILES, large_file_bytes=LARGE_FILE_BYTES, now=None):
+        self.top_k = top_k
+        self.large_file_bytes = large_file_bytes
+        self.now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        self.session_count = 0
+        self.total_video_size = 0
+        self.total_analytics_size = 0
+        self.large_file_count = 0
+        self.large_file_bytes_total = 0
+        self.size_histogram = {}  # log2 MB bucket -> [sessions, bytes]
+        self.age_histogram = {}   # log2 day bucket -> [sessions, bytes]; None = unknown date
+        self._heap = []
+        self._seq = 0
+
+    def add(self, session):
+        """Account for one session"""
+        video_size = session.get('video_size') or 0
+        analytics_size = session.get('analytics_size') or 0
+        total_size = video_size + analytics_size
+
+        self.session_count += 1
+        self.total_video_size += video_size
+        self.total_analytics_size += analytics_size
+
+        size_bucket = self.size_histogram.setdefault(_log2_bucket(total_size / MB), [0, 0])
+        size_bucket[0] += 1
+        size_bucket[1] += total_size
+
+        created = _parse_created_at(session.get('created_at'))
+        age_key = None if created is None else _log2_bucket((self.now - created).total_seconds() / 86400)
+        age_bucket = self.age_histogram.setdefault(age_key, [0, 0])
+        age_bucket[0] += 1
+        age_bucket[1] += total_size
+
+        if total_size <= self.large_file_bytes:
+            return
+        self.large_file_count += 1
+        self.large_file_bytes_total += total_size
+        if len(self._heap) >= self.top_k and total_size <= self._heap[0][0]:
+            return
+
+        # Among equal sizes the latest arrival sits at the heap top, so ties
+        # are resolved the same way whether they are evicted or rejected
+        entry = (total_size, -self._seq, {
+            'session_id': session.get('_id'),
+            'filename': session.get('processed_video_filename', session.get('original_filename', 'Unknown')),
+            'video_size_mb': video_size / MB,
+            'analytics_size_mb': analytics_size / MB,
+            'total_size_mb': total_size / MB,
+            'date': session.get('created_at', 'Unknown')
+        })
+        self._seq += 1
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        else:
+            heapq.heapreplace(self._heap, entry)
+
+    def consume(self, sessions):
+        """Account for every session from an iterable"""
+        for session in sessions:
+            self.add(session)
+        return self
+
+    def largest(self):
+        """Top-K large files, largest first"""
+        return [entry for _, _, entry in sorted(self._heap, key=lambda e: (-e[0], -e[1]))]
+
+def analyze_storage_usage(sessions, top_k=TOP_K_LARGE_FILES):
+    """Analyze storage usage by sessions
+
+    Args:
+        sessions: Iterable of session dicts; consumed in a single pass
+        top_k: How many of the largest files to keep and list
+
+    Returns:
+        The largest files (>10MB), largest first
+    """
+    analyzer = StorageAnalyzer(top_k=top_k).consume(sessions)
+    total_size = analyzer.total_video_size + analyzer.total_analytics_size
 
-def analyze_storage_usage(sessions):
-    """Analyze storage usage by sessions"""
-    total_video_size = 0
-    total_analytics_size = 0
-    large_files = []
-    
     print("📊 Storage Usage Analysis:")
     print("=" * 50)
-    
-    for i, session in enumerate(sessions):
-        video_size = session.get('video_size', 0)
-        analytics_size = session.get('analytics_size', 0)
-        total_size = video_size + analytics_size
-        
-        total_video_size += video_size
-        total_analytics_size += analytics_size
-        
-        if total_size > 10 * 1024 * 1024:  # Files larger than 10MB
-            large_files.append({
-                'session_id': session.get('_id'),
-                'filename': session.get('processed_video_filename', session.get('original_filename', 'Unknown')),
-                'video_size_mb': video_size / 1024 / 1024,
-                'analytics_size_mb': analytics_size / 1024 / 1024,
-                'total_size_mb': total_size / 1024 / 1024,
-                'date': session.get('created_at', 'Unknown')
-            })
-    
-    print(f"Total Sessions: {len(sessions)}")
-    print(f"Total Video Size: {total_video_size / 1024 / 1024:.2f} MB")
-    print(f"Total Analytics Size: {total_analytics_size / 1024 / 1024:.2f} MB")
-    print(f"Total Storage Used: {(total_video_size + total_analytics_size) / 1024 / 1024:.2f} MB")
+    print(f"Total Sessions: {analyzer.session_count}")
+    print(f"Total Video Size: {analyzer.total_video_size / MB:.2f} MB")
+    print(f"Total Analytics Size: {analyzer.total_analytics_size / MB:.2f} MB")
+    print(f"Total Storage Used: {total_size / MB:.2f} MB")
     print()
-    
+
+    if analyzer.session_count:
+        print("📏 Sessions by Size:")
+        print("-" * 50)
+        for bucket in sorted(analyzer.size_histogram):
+            count, size = analyzer.size_histogram[bucket]
+            print(f"   {_bucket_label(bucket, 'MB'):>14}: {count:6d} sessions, {size / MB:10.2f} MB")
+        print()
+
+        print("📅 Sessions by Age:")
+        print("-" * 50)
+        for bucket in sorted(analyzer.age_histogram, key=lambda b: -1 if b is None else b):
+            count, size = analyzer.age_histogram[bucket]
+            label = "unknown date" if bucket is None else _bucket_label(bucket, 'days')
+            print(f"   {label:>14}: {count:6d} sessions, {size / MB:10.2f} MB")
+        print()
+
+    large_files = analyzer.largest()
     if large_files:
-        print("🔍 Large Files (>10MB):")
+        print(f"🔍 Large Files (>10MB): {analyzer.large_file_count} files, "
+              f"{analyzer.large_file_bytes_total / MB:.2f} MB")
+        if analyzer.large_file_count > len(large_files):
+            print(f"   Showing the {len(large_files)} largest")
         print("-" * 50)
-        for file_info in sorted(large_files, key=lambda x: x['total_size_mb'], reverse=True):
+        for file_info in large_files:
             print(f"📁 {file_info['filename']}")
             print(f"   Size: {file_info['total_size_mb']:.2f} MB (Video: {file_info['video_size_mb']:.2f} MB, Analytics: {file_info['analytics_size_mb']:.2f} MB)")
             print(f"   Date: {file_info['date']}")
             print(f"   Session ID: {file_info['session_id']}")
             print()
-    
+
     return large_files
 
-def suggest_cleanup(large_files):
-    """Suggest which files to delete"""
+def suggest_cleanup(large_files, count=SUGGESTED_DELETIONS):
+    """Suggest which files to delete
+
+    Args:
+        large_files: Large files, largest first (as returned by analyze_storage_usage)
+        count: How many deletions to suggest
+
+    Returns:
+        The suggested files
+    """
     print("💡 Cleanup Suggestions:")
     print("=" * 50)
     
     if not large_files:
         print("✅ No large files found. Storage usage is reasonable.")
-        return
-    
-    # Sort by size (largest first)
-    large_files.sort(key=lambda x: x['total_size_mb'], reverse=True)
+        return []
     
     print("🗑️  Recommended deletions (largest files first):")
     print()
     
     total_savings = 0
-    for i, file_info in enumerate(large_files[:5]):  # Top 5 largest files
+    suggestions = large_files[:count]
+    for i, file_info in enumerate(suggestions):
         savings_mb = file_info['total_size_mb']
         total_savings += savings_mb
         print(f"{i+1}. {file_info['filename']}")
@@ -95,36 +225,217 @@ def suggest_cleanup(large_files):
     
     print(f"💰 Total potential savings: {total_savings:.2f} MB")
     print()
-    print("⚠️  Note: This script only analyzes. To actually delete files,")
-    print("   you would need to implement a delete endpoint in the API.")
+    return suggestions
+
+def report_duplicates(client, store, perceptual=True):
+    """Find re-uploaded videos and list the redundant copies
+
+    Args:
+        client: ApiClient used to download videos for hashing
+        store: Local SessionStore to search
+        perceptual: Also look for near duplicates (re-encodes) by sampled-frame hashes
+
+    Returns:
+        Redundant copies in the same shape as the large files list, largest first
+
+    Both detector passes walk the sessions that have a video, so those rows
+    (metadata only, no analytics) are held in memory once while it runs.
+    Afterwards only the members of duplicate groups are loaded again.
+    """
+    print("🧬 Duplicate Videos:")
+    print("=" * 50)
+    sessions = [session for session in store.iter_sessions() if video_key(session)]
+    duplicates = DuplicateDetector(client, store).find_duplicates(sessions, perceptual=perceptual)
+    del sessions
+    sessions_by_id = {session_id: store.get(session_id)
+                      for kind in ('exact', 'near') for group in duplicates[kind] for session_id in group}
+    
+    copies = []
+    for kind, label in (('exact', 'Identical'), ('near', 'Near-identical')):
+        for entry in duplicate_savings(duplicates[kind], sessions_by_id):
+            kept = sessions_by_id[entry['keep']]
+            print(f"📁 {label}: keep {kept.get('processed_video_filename', kept.get('original_filename', 'Unknown'))} "
+                  f"({entry['keep']}), {len(entry['remove'])} copies, {entry['bytes'] / MB:.2f} MB")
+            for session_id in entry['remove']:
+                session = sessions_by_id[session_id]
+                video_size = session.get('video_size') or 0
+                analytics_size = session.get('analytics_size') or 0
+                copies.append({
+                    'session_id': session_id,
+                    'filename': session.get('processed_video_filename', session.get('original_filename', 'Unknown')),
+                    'video_size_mb': video_size / MB,
+                    'analytics_size_mb': analytics_size / MB,
+                    'total_size_mb': (video_size + analytics_size) / MB,
+                    'date': session.get('created_at', 'Unknown')
+                })
+                print(f"   🆔 {session_id}: {copies[-1]['filename']} ({copies[-1]['total_size_mb']:.2f} MB)")
+    
+    if copies:
+        print(f"💰 Removable duplicates: {len(copies)} sessions, {sum(c['total_size_mb'] for c in copies):.2f} MB")
+    else:
+        print("✅ No duplicate videos found.")
+    print()
+    return sorted(copies, key=lambda c: c['total_size_mb'], reverse=True)
+
+def report_codec_savings(client, store, sample_size):
+    """Estimate what re-encoding stored analytics with frame_analytics_codec would save
+
+    Args:
+        client: ApiClient used to download analytics
+        store: Local SessionStore to sample sessions from
+        sample_size: Sessions whose analytics are downloaded and encoded
+
+    Returns:
+        Measured ratio and projected savings, or None if nothing could be sampled
+    """
+    print("📦 Analytics Re-encoding Estimate:")
+    print("=" * 50)
+    json_bytes = 0
+    encoded_bytes = 0
+    measured = 0
+    for session in store.with_analytics(limit=sample_size):
+        analytics_id = session.get('analytics_id') or session.get('gridfs_analytics_id')
+        try:
+            response = client.get(f"/getAnalytics/{analytics_id}")
+            response.raise_for_status()
+            report = compression_report(response.json(), json_bytes=len(response.content))
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️  Could not sample {session.get('_id')}: {e}")
+            continue
+        json_bytes += report['json_bytes']
+        encoded_bytes += report['encoded_bytes']
+        measured += 1
+    
+    if not json_bytes:
+        print("❌ No analytics could be sampled")
+        print()
+        return None
+    
+    ratio = encoded_bytes / json_bytes
+    total_analytics = sum(session.get('analytics_size') or 0 for session in store.iter_sessions())
+    projected = total_analytics * ratio
+    print(f"Sampled {measured} sessions: {json_bytes / MB:.2f} MB JSON -> {encoded_bytes / MB:.2f} MB encoded "
+          f"({report['compression']}, {ratio * 100:.1f}%)")
+    print(f"Total Analytics Size: {total_analytics / MB:.2f} MB -> ~{projected / MB:.2f} MB re-encoded")
+    print(f"💰 Projected savings: {(total_analytics - projected) / MB:.2f} MB")
+    print()
+    return {'sampled': measured, 'ratio': ratio, 'analytics_bytes': total_analytics,
+            'projected_bytes': projected, 'savings_bytes': total_analytics - projected}
+
+def execute_cleanup(client, store, candidates, args):
+    """Delete or archive the suggested sessions (or project it with --dry-run)
+
+    Args:
+        client: ApiClient for the backend
+        store: Local SessionStore, updated as sessions are removed
+        candidates: Suggested files from suggest_cleanup
+        args: Parsed command line options
+
+    Returns:
+        Summary from CleanupExecutor.run
+    """
+    if args.local:
+        backend = LocalCleanupBackend(store, action=args.execute, archive_dir=args.archive_dir)
+    else:
+        backend = HttpCleanupBackend(client, action=args.execute, store=store)
+    executor = CleanupExecutor(backend, journal_path=args.journal, concurrency=args.concurrency,
+                               requests_per_second=args.rate, batch_size=args.batch_size)
+
+    mode = "Dry run" if args.dry_run else "Running"
+    target = f"local stand-in ({args.archive_dir})" if args.local else client.base_url
+    print(f"🚚 {mode}: {args.execute} {len(candidates)} sessions via {target}")
+    print("=" * 50)
+    summary = executor.run(candidates, dry_run=args.dry_run)
+
+    if summary['already_done']:
+        print(f"⏭️  Already done in {args.journal}: {summary['already_done']} sessions")
+    if summary['in_doubt']:
+        print(f"❓ Unconfirmed from last run: {summary['in_doubt']} sessions"
+              + ("" if args.dry_run else f" ({summary['verified_done']} confirmed done, "
+                                          f"{summary['unverified']} could not be checked)"))
+    if args.dry_run:
+        print(f"💾 Projected savings: {summary['projected_bytes'] / MB:.2f} MB from {summary['sessions']} sessions")
+        print(f"📨 Requests: {summary['requests']} (batch size {args.batch_size}, "
+              f"{args.concurrency} concurrent, {args.rate:g}/s)")
+        print(f"⏱️  Expected runtime: {summary['projected_seconds']:.1f}s")
+    else:
+        print(f"✅ Succeeded: {summary['succeeded']}, ❌ Failed: {summary['failed']} "
+              f"({summary['requests']} requests in {summary['elapsed_seconds']:.1f}s)")
+        print(f"💾 Freed: {summary['bytes_freed'] / MB:.2f} MB")
+        for session_id, error in summary['errors'].items():
+            print(f"   {session_id}: {error}")
+    print()
+    return summary
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Gymnastics analytics database cleanup")
+    parser.add_argument("--api-base", default=API_BASE, help="Gymnastics analytics backend URL")
+    parser.add_argument("--suggest", type=int, default=SUGGESTED_DELETIONS,
+                        help="Number of largest files to suggest (and act on with --execute)")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="Find duplicate videos; --execute then acts on the redundant copies")
+    parser.add_argument("--exact-only", action="store_true",
+                        help="With --duplicates: skip the perceptual (re-encode) pass")
+    parser.add_argument("--codec-sample", type=int, default=0, metavar="N",
+                        help="Estimate savings from re-encoding analytics compactly, sampling N sessions")
+    parser.add_argument("--execute", choices=CLEANUP_ACTIONS,
+                        help="Delete or archive the suggested sessions")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="With --execute: only report projected savings and runtime")
+    parser.add_argument("--local", action="store_true",
+                        help="With --execute: archive to a local directory instead of calling the API")
+    parser.add_argument("--archive-dir", default=CLEANUP_ARCHIVE_DIR,
+                        help="Archive directory for --local")
+    parser.add_argument("--journal", default=CLEANUP_JOURNAL,
+                        help="Journal used to resume an interrupted run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second")
+    parser.add_argument("--batch-size", type=int, default=25,
+                        help="Sessions per request where the API accepts batches")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    client = ApiClient(args.api_base)
+    store = SessionStore.for_backend(args.api_base)
+    
     print("🧹 Gymnastics Analytics Database Cleanup Tool")
     print("=" * 50)
     print()
     
     # Get sessions
     print("📥 Fetching sessions from API...")
-    sessions = get_sessions()
+    session_count = sync_sessions(client, store)
     
-    if not sessions:
+    if not session_count:
         print("❌ No sessions found or API not accessible")
         return
     
-    print(f"✅ Found {len(sessions)} sessions")
+    print(f"✅ Found {session_count} sessions")
     print()
     
-    # Analyze storage
-    large_files = analyze_storage_usage(sessions)
+    # Analyze storage, streaming sessions from the local store
+    large_files = analyze_storage_usage(store.iter_sessions(), top_k=max(TOP_K_LARGE_FILES, args.suggest))
     
     # Suggest cleanup
-    suggest_cleanup(large_files)
+    suggestions = suggest_cleanup(large_files, count=args.suggest)
+    
+    if args.codec_sample:
+        report_codec_savings(client, store, args.codec_sample)
+    
+    if args.duplicates:
+        suggestions = report_duplicates(client, store, perceptual=not args.exact_only)
+    
+    if args.execute and suggestions:
+        execute_cleanup(client, store, suggestions, args)
+        return
     
     print("🔧 Next Steps:")
     print("1. Review the large files listed above")
     print("2. Consider deleting old test files or duplicates")
     print("3. Upgrade MongoDB Atlas plan if needed")
-    print("4. Implement a delete endpoint in the API for cleanup")
+    print("4. Preview a cleanup with --execute delete --dry-run, then run it without --dry-run")
 
 if __name__ == "__main__":
     main()
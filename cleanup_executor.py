@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Rate-limited bulk deletion and archival of sessions
+
+A CleanupExecutor runs a candidate set (as ranked by cleanup-database.py)
+against a backend:
+1. HttpCleanupBackend calls delete/archive endpoints on the API, using a
+   batch endpoint when the API has one and single-session calls otherwise
+2. LocalCleanupBackend is a stand-in that archives session documents to a
+   local directory and drops them from the local session store
+
+Batches run on a bounded thread pool and every request start waits for a
+token bucket. Each batch is written to an append-only JSON Lines journal
+as "started" before its request goes out and "done"/"failed" after, with
+an fsync each time. A request that errored without a response (timeout,
+dropped connection) may still have been carried out, so its sessions are
+recorded as "in_doubt" rather than "failed". Re-running with the same
+journal skips finished sessions; sessions left "started" by a crash or
+"in_doubt" are checked against the backend first and only re-issued if
+they still exist, so a resumed run never deletes or archives the same
+session twice. Batch and archive POSTs are never retried by the client
+after a failure the server may have seen.
+
+A dry run touches nothing and reports the projected savings, request
+count and runtime.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import requests
+
+from api_client import ApiClient
+from session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_ACTIONS = ('delete', 'archive')
+CLEANUP_JOURNAL = 'cleanup_journal.jsonl'
+CLEANUP_ARCHIVE_DIR = os.environ.get('CLEANUP_ARCHIVE_DIR', '.session_archive')
+
+# (method, path) per action; batch endpoints take {"session_ids": [...]}
+CLEANUP_ENDPOINTS = {
+    'delete': {'one': ('DELETE', '/deleteSession/{session_id}'), 'batch': ('POST', '/deleteSessions')},
+    'archive': {'one': ('POST', '/archiveSession/{session_id}'), 'batch': ('POST', '/archiveSessions')},
+}
+
+# Statuses meaning the API has no batch endpoint
+_NO_BATCH_STATUSES = {404, 405, 501}
+
+# Used for runtime projections before any request has been timed
+ESTIMATED_REQUEST_SECONDS = 0.5
+
+def _candidate_id(candidate: Dict) -> str:
+    return candidate.get('session_id') or candidate.get('_id')
+
+def _candidate_bytes(candidate: Dict) -> int:
+    """Bytes freed by removing a candidate (a large_files entry or a raw session)"""
+    if 'total_size_mb' in candidate:
+        return int(round(candidate['total_size_mb'] * 1024 * 1024))
+    return (candidate.get('video_size') or 0) + (candidate.get('analytics_size') or 0)
+
+class TokenBucket:
+    """Thread-safe token bucket limiting request starts"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Requests per second
+            burst: Requests that may start back to back before throttling
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may start"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class CleanupJournal:
+    """Append-only JSON Lines record of cleanup progress"""
+
+    def __init__(self, path: str = CLEANUP_JOURNAL):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def state(self, action: str) -> Dict[str, str]:
+        """Latest event ("started", "done", "failed" or "in_doubt") per session for an action"""
+        events = {}
+        if not os.path.exists(self.path):
+            return events
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from a crash
+                if entry.get('action') == action:
+                    events[entry['session_id']] = entry['event']
+        return events
+
+    def record(self, action: str, session_ids: Iterable[str], event: str,
+               errors: Dict[str, str] = None):
+        """Append one event per session and flush it to disk"""
+        now = time.time()
+        lines = []
+        for session_id in session_ids:
+            entry = {'session_id': session_id, 'action': action, 'event': event, 'time': now}
+            if errors and errors.get(session_id):
+                entry['error'] = errors[session_id]
+            lines.append(json.dumps(entry) + "\n")
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+class HttpCleanupBackend:
+    """Deletes or archives sessions through the API"""
+
+    def __init__(self, client: ApiClient, action: str = 'delete', store: SessionStore = None,
+                 endpoints: Dict = None):
+        """
+        Args:
+            client: API client
+            action: 'delete' or 'archive'
+            store: Local session mirror to drop deleted sessions from (optional)
+            endpoints: Override CLEANUP_ENDPOINTS[action]
+        """
+        if action not in CLEANUP_ACTIONS:
+            raise ValueError(f"Unknown cleanup action: {action}")
+        self.client = client
+        self.action = action
+        self.store = store
+        self.endpoints = endpoints or CLEANUP_ENDPOINTS[action]
+        self.supports_batch = 'batch' in self.endpoints
+
+    def _done(self, session_ids: List[str]):
+        if self.store is not None and self.action == 'delete':
+            self.store.remove(session_ids)
+
+    def execute_batch(self, session_ids: List[str]) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Run the action on several sessions in one request
+
+        Returns:
+            Error message (None on success) per session, or None if the API
+            has no batch endpoint
+        """
+        method, path = self.endpoints['batch']
+        response = self.client.request(method, path, idempotent=False, json={'session_ids': session_ids})
+        if response.status_code in _NO_BATCH_STATUSES:
+            logger.warning(f"⚠️ {method} {path} returned {response.status_code}; "
+                           f"falling back to one request per session")
+            self.supports_batch = False
+            return None
+        if response.status_code >= 400:
+            error = f"status {response.status_code}"
+            return {session_id: error for session_id in session_ids}
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        failed = body.get('failed') if isinstance(body, dict) else None
+        failed = failed if isinstance(failed, dict) else {}
+        results = {session_id: failed.get(session_id) for session_id in session_ids}
+        self._done([session_id for session_id, error in results.items() if error is None])
+        return results
+
+    def execute_one(self, session_id: str) -> Optional[str]:
+        """Run the action on one session; returns an error message or None"""
+        method, path = self.endpoints['one']
+        response = self.client.request(method, path.format(session_id=session_id))
+        # 404 means either "already gone" or "no such route"; only the
+        # former is success, so ask the backend which one it was
+        if response.status_code == 404:
+            if self.exists(session_id):
+                return f"status 404 from {method} {path} but the session still exists"
+        elif response.status_code >= 400:
+            return f"status {response.status_code}"
+        self._done([session_id])
+        return None
+
+    def exists(self, session_id: str) -> bool:
+        """Whether the backend still has the session"""
+        response = self.client.get(f"/getSession/{session_id}", conditional=False)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+class LocalCleanupBackend:
+    """Local stand-in: archives session documents to disk and drops them from the store"""
+
+    supports_batch = True
+
+    def __init__(self, store: SessionStore, action: str = 'archive', archive_dir: str = CLEANUP_ARCHIVE_DIR):
+        """
+        Args:
+            store: Local session mirror
+            action: 'delete' or 'archive'
+            archive_dir: Where archived session documents are written
+        """
+        if action not in CLEANUP_ACTIONS:
+            raise ValueError(f"Unknown cleanup action: {action}")
+        self.store = store
+        self.action = action
+        self.archive_dir = archive_dir
+
+    def _archive(self, session: Dict):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{session['_id']}.json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(session, f, default=str)
+        os.replace(tmp_path, path)
+
+    def execute_batch(self, session_ids: List[str]) -> Dict[str, Optional[str]]:
+        if self.action == 'archive':
+            for session_id in session_ids:
+                session = self.store.get(session_id)
+                if session is not None:
+                    self._archive(session)
+        self.store.remove(session_ids)
+        return {session_id: None for session_id in session_ids}
+
+    def execute_one(self, session_id: str) -> Optional[str]:
+        return self.execute_batch([session_id])[session_id]
+
+    def exists(self, session_id: str) -> bool:
+        return self.store.get(session_id) is not None
+
+class CleanupExecutor:
+    """Runs a cleanup action over candidate sessions with bounded concurrency"""
+
+    def __init__(self, backend, journal_path: str = CLEANUP_JOURNAL, concurrency: int = 4,
+                 requests_per_second: float = 2.0, batch_size: int = 25,
+                 request_seconds: float = ESTIMATED_REQUEST_SECONDS):
+        """
+        Args:
+            backend: HttpCleanupBackend or LocalCleanupBackend
+            journal_path: JSON Lines journal used to resume interrupted runs
+            concurrency: Batches in flight at once
+            requests_per_second: Request rate limit
+            batch_size: Sessions per batch request (1 disables batching)
+            request_seconds: Expected request latency for runtime projections
+        """
+        self.backend = backend
+        self.action = backend.action
+        self.journal = CleanupJournal(journal_path)
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.batch_size = max(1, batch_size)
+        self.request_seconds = request_seconds
+        self.bucket = TokenBucket(requests_per_second, burst=concurrency)
+
+    def _resolve(self, candidates: List[Dict], verify: bool) -> Tuple[List[Dict], Dict]:
+        """
+        Split candidates into the ones still to process and journal counts
+
+        Sessions the journal shows as done are skipped. Sessions left
+        "started" or "in_doubt" are checked with the backend when verify is
+        set: gone ones are recorded as done, ones that cannot be checked are
+        held back.
+        """
+        events = self.journal.state(self.action)
+        counts = {'already_done': 0, 'in_doubt': 0, 'verified_done': 0, 'unverified': 0}
+        pending = []
+        seen = set()
+        for candidate in candidates:
+            session_id = _candidate_id(candidate)
+            if not session_id or session_id in seen:
+                continue
+            seen.add(session_id)
+            event = events.get(session_id)
+            if event == 'done':
+                counts['already_done'] += 1
+                continue
+            if event in ('started', 'in_doubt'):
+                counts['in_doubt'] += 1
+                if verify:
+                    try:
+                        exists = self.backend.exists(session_id)
+                    except (requests.RequestException, OSError) as e:
+                        logger.warning(f"⚠️ Could not check {session_id}, leaving it for a later run: {e}")
+                        counts['unverified'] += 1
+                        continue
+                    if not exists:
+                        self.journal.record(self.action, [session_id], 'done')
+                        counts['verified_done'] += 1
+                        continue
+            pending.append(candidate)
+        return pending, counts
+
+    def _request_count(self, session_count: int) -> int:
+        if self.backend.supports_batch and self.batch_size > 1:
+            return math.ceil(session_count / self.batch_size)
+        return session_count
+
+    def plan(self, candidates: List[Dict]) -> Dict:
+        """
+        Project a run without touching anything
+
+        Returns:
+            Sessions to process, projected bytes freed, request count and runtime
+        """
+        pending, counts = self._resolve(candidates, verify=False)
+        requests_needed = self._request_count(len(pending))
+        # Bounded by whichever is slower: the rate limit (after the initial
+        # burst) or request latency spread over the workers
+        rate_seconds = max(0, requests_needed - self.concurrency) / self.requests_per_second
+        latency_seconds = requests_needed * self.request_seconds / self.concurrency
+        return dict(counts, **{
+            'action': self.action,
+            'candidates': len(candidates),
+            'sessions': len(pending),
+            'projected_bytes': sum(_candidate_bytes(c) for c in pending),
+            'requests': requests_needed,
+            'projected_seconds': max(rate_seconds, latency_seconds)
+        })
+
+    def _run_batch(self, session_ids: List[str]) -> Tuple[Dict[str, Optional[str]], int]:
+        """Run one batch; returns the error per session and requests made"""
+        self.journal.record(self.action, session_ids, 'started')
+        results = None
+        # Sessions whose request raised; the server may have acted on them
+        in_doubt = set()
+        request_count = 0
+        if len(session_ids) > 1 and self.backend.supports_batch:
+            self.bucket.acquire()
+            request_count += 1
+            try:
+                results = self.backend.execute_batch(session_ids)
+            except (requests.RequestException, OSError) as e:
+                results = {session_id: str(e) for session_id in session_ids}
+                in_doubt.update(session_ids)
+        if results is None:
+            results = {}
+            for session_id in session_ids:
+                self.bucket.acquire()
+                request_count += 1
+                try:
+                    results[session_id] = self.backend.execute_one(session_id)
+                except (requests.RequestException, OSError) as e:
+                    results[session_id] = str(e)
+                    in_doubt.add(session_id)
+
+        done = [session_id for session_id, error in results.items() if error is None]
+        failed = {session_id: error for session_id, error in results.items()
+                  if error is not None and session_id not in in_doubt}
+        doubtful = {session_id: results[session_id] for session_id in in_doubt}
+        if done:
+            self.journal.record(self.action, done, 'done')
+        if failed:
+            self.journal.record(self.action, failed, 'failed', errors=failed)
+        if doubtful:
+            self.journal.record(self.action, doubtful, 'in_doubt', errors=doubtful)
+        return results, request_count
+
+    def run(self, candidates: List[Dict], dry_run: bool = False) -> Dict:
+        """
+        Delete or archive candidate sessions
+
+        Args:
+            candidates: large_files entries or session dicts
+            dry_run: Only report the projection
+
+        Returns:
+            Summary counts, bytes freed and timings
+        """
+        summary = self.plan(candidates)
+        summary['dry_run'] = dry_run
+        if dry_run:
+            return summary
+
+        pending, counts = self._resolve(candidates, verify=True)
+        summary.update(counts)
+        sizes = {_candidate_id(c): _candidate_bytes(c) for c in pending}
+        session_ids = list(sizes)
+        batch_size = self.batch_size if self.backend.supports_batch else 1
+        batches = [session_ids[i:i + batch_size] for i in range(0, len(session_ids), batch_size)]
+
+        summary.update({'sessions': len(session_ids), 'projected_bytes': sum(sizes.values()), 'succeeded': 0, 'failed': 0,
+                        'bytes_freed': 0, 'requests': 0, 'errors': {}})
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._run_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                results, request_count = future.result()
+                summary['requests'] += request_count
+                for session_id, error in results.items():
+                    if error is None:
+                        summary['succeeded'] += 1
+                        summary['bytes_freed'] += sizes[session_id]
+                    else:
+                        summary['failed'] += 1
+                        summary['errors'][session_id] = error
+                done = summary['succeeded'] + summary['failed']
+                logger.info(f"🗑️ {self.action}: {done}/{len(session_ids)} sessions processed")
+
+        summary['elapsed_seconds'] = time.perf_counter() - start
+        return summary
@@ -3,16 +3,17 @@
 Debug script to check API response structure
 """
 
-import requests
 import json
 
+from api_client import ApiClient
+
 API_BASE_URL = 'https://gymnasticsapi.onrender.com'
 
 def debug_api_response():
     """Debug the API response structure"""
     try:
         print("Fetching sessions from production server...")
-        response = requests.get(f"{API_BASE_URL}/getSessions", timeout=30)
+        response = ApiClient(API_BASE_URL).get("/getSessions", timeout=30)
         
         print(f"Status Code: {response.status_code}")
         print(f"Headers: {dict(response.headers)}")
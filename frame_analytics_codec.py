@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Compact binary encoding for per-frame analytics
+
+Frame analytics are served as JSON lists of dicts such as
+
+    {"frame_number": 11, "timestamp": 333.33, "video_time": 0.33,
+     "analytics": {"acl_risk": 89.69, "tumbling_phase": "landing", ...},
+     "extracted_at": "2025-09-27T21:29:30.229Z"}
+
+where most of the bytes are repeated key names and float64 digits far
+beyond what the measurements carry. encode_payload stores them column by
+column instead:
+1. Numbers are quantized to a fixed number of decimal places per field
+   (see below) and kept as integers. Each integer column is delta-encoded
+   when that narrows its range (frame numbers, timestamps), otherwise
+   offset by its minimum, then narrowed to the smallest unsigned dtype and
+   byte-shuffled
+2. Strings with few distinct values (tumbling_phase) become dictionary codes
+3. ISO datetimes (extracted_at) become microsecond integers, kept only when
+   they format back to exactly the original string
+4. Anything else (lists, nulls, mixed types) is kept as JSON, so nothing is
+   dropped
+
+The result is zstd-compressed when the zstandard package is installed and
+zlib-compressed otherwise; the first bytes record which.
+
+Precision (decimal places kept):
+    timestamps (timestamp, video_time, relative_timestamp, *_time)  6
+    angles (*_angle, *_lean)                                         2  (0.01 degrees)
+    risk and quality scores (*risk*, *score, confidence)             2
+    landing_force                                                    1  (0.1 N)
+    any other float                                                  4
+    integers, strings, booleans, datetimes                           exact
+
+decode_payload(encode_payload(payload)) returns the payload with every
+float rounded to those places, and encoding the decoded payload again
+gives the same bytes.
+
+Usage:
+    python frame_analytics_codec.py sample_frame_data.json [--output FILE]
+"""
+
+import argparse
+import json
+import re
+import struct
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_MAGIC = b'GFA1'
+CODEC_VERSION = 1
+_COMPRESSION_ZLIB = 1
+_COMPRESSION_ZSTD = 2
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+TIME_DECIMALS = 6
+ANGLE_DECIMALS = 2
+SCORE_DECIMALS = 2
+DEFAULT_DECIMALS = 4
+# Fields with their own precision, by name under any parent
+FIELD_DECIMALS = {
+    'timestamp': TIME_DECIMALS,
+    'video_time': TIME_DECIMALS,
+    'relative_timestamp': TIME_DECIMALS,
+    'landing_force': 1,
+    'confidence': SCORE_DECIMALS,
+}
+
+# Keys of the frame list in the payload shapes the backend serves
+FRAME_LIST_KEYS = ('analytics', 'frame_data')
+
+# Quantized values must stay exact integers in float64
+_MAX_QUANTIZED = 2 ** 53
+_EPOCH = datetime(1970, 1, 1)
+_FRACTION = re.compile(r'T\d\d:\d\d:\d\d(?:\.(\d+))?')
+_TIMESPECS = {0: 'seconds', 3: 'milliseconds', 6: 'microseconds'}
+
+def field_decimals(name: str) -> int:
+    """Decimal places kept for a float column such as 'analytics.acl_risk'"""
+    field = name.rsplit('.', 1)[-1]
+    if field in FIELD_DECIMALS:
+        return FIELD_DECIMALS[field]
+    if field.endswith('_time'):
+        return TIME_DECIMALS
+    if field.endswith(('_angle', '_lean')) or field == 'lean':
+        return ANGLE_DECIMALS
+    if 'risk' in field or field.endswith('score'):
+        return SCORE_DECIMALS
+    return DEFAULT_DECIMALS
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _flatten_frame(frame: Dict) -> Tuple[Dict[str, object], Dict]:
+    """
+    Split a frame into columns and leftovers
+
+    Returns:
+        ({column name: scalar}, {key: value kept as JSON}); scalars inside a
+        nested dict such as analytics become 'analytics.<name>'
+    """
+    columns = {}
+    extras = {}
+    for key, value in frame.items():
+        if '.' in key:
+            extras[key] = value
+        elif isinstance(value, dict) and value and all(
+                '.' not in sub and not isinstance(sub_value, (dict, list)) for sub, sub_value in value.items()):
+            for sub, sub_value in value.items():
+                columns[f'{key}.{sub}'] = sub_value
+        elif isinstance(value, (dict, list)):
+            extras[key] = value
+        else:
+            columns[key] = value
+    return columns, extras
+
+def _datetime_format(value: str) -> Optional[Tuple[str, str]]:
+    """(timespec, suffix) that reproduces an ISO datetime string, or None"""
+    match = _FRACTION.search(value)
+    if not match:
+        return None
+    timespec = _TIMESPECS.get(len(match.group(1) or ''))
+    if timespec is None:
+        return None
+    return timespec, 'Z' if value.endswith('Z') else ''
+
+def _datetime_micros(values: List[str]) -> Optional[Tuple[List[int], str, str]]:
+    """Microseconds since the epoch for ISO strings that all format back exactly"""
+    spec = _datetime_format(values[0])
+    if spec is None:
+        return None
+    timespec, suffix = spec
+    micros = []
+    for value in values:
+        try:
+            moment = datetime.fromisoformat(value[:-1] if suffix and value.endswith('Z') else value)
+        except ValueError:
+            return None
+        if moment.tzinfo is not None or moment.isoformat(timespec=timespec) + suffix != value:
+            return None
+        micros.append((moment - _EPOCH) // timedelta(microseconds=1))
+    return micros, timespec, suffix
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """Group the Nth byte of every value together; runs of equal high bytes compress well"""
+    if values.dtype.itemsize == 1:
+        return values.tobytes()
+    return values.view(np.uint8).reshape(-1, values.dtype.itemsize).T.tobytes()
+
+def _unshuffle(data: bytes, dtype: str, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    if dtype.itemsize == 1:
+        return np.frombuffer(data, dtype=dtype, count=count)
+    return np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count).T.copy().view(dtype).ravel()
+
+def _pack_ints(values: np.ndarray, info: Dict, blocks: List[bytes]):
+    """Store an int64 column as delta or frame-of-reference in the narrowest unsigned dtype"""
+    deltas = np.diff(values, prepend=np.int64(0)) if len(values) else values
+    use_delta = len(values) > 1 and int(deltas[1:].max()) - int(deltas[1:].min()) < \
+        int(values.max()) - int(values.min())
+    stored = deltas if use_delta else values
+    if use_delta:
+        # The first value is absolute; keep it out of the range of the deltas
+        info['first'] = int(stored[0])
+        stored = stored[1:]
+    base = int(stored.min()) if len(stored) else 0
+    span = int(stored.max()) - base if len(stored) else 0
+    dtype = next(np.dtype(t) for t in ('u1', 'u2', 'u4', 'u8') if span < 2 ** (8 * np.dtype(t).itemsize))
+    info.update(delta=use_delta, base=base, dtype=dtype.str, block=len(blocks))
+    blocks.append(_shuffle((stored - base).astype(dtype)))
+
+def _unpack_ints(info: Dict, blocks: List[bytes], rows: int) -> np.ndarray:
+    count = rows - 1 if info['delta'] else rows
+    stored = _unshuffle(blocks[info['block']], info['dtype'], count).astype(np.int64) + info['base']
+    if info['delta']:
+        return np.cumsum(np.concatenate(([info['first']], stored)))
+    return stored
+
+def _encode_column(name: str, values: List, present: np.ndarray, blocks: List[bytes]) -> Dict:
+    """Pick a storage kind for one column and append its blocks"""
+    info = {'name': name}
+    if not present.all():
+        info['present'] = len(blocks)
+        blocks.append(np.packbits(present).tobytes())
+    observed = [value for value, here in zip(values, present) if here]
+    rows = len(values)
+
+    def fill(column, default):
+        # Absent rows repeat the previous value so they add nothing to deltas
+        filled = np.empty(rows, dtype=np.int64)
+        last = default
+        it = iter(column)
+        for i in range(rows):
+            if present[i]:
+                last = next(it)
+            filled[i] = last
+        return filled
+
+    if observed and all(isinstance(v, bool) for v in observed):
+        info['kind'] = 'bool'
+        info['block'] = len(blocks)
+        blocks.append(np.packbits(fill([int(v) for v in observed], 0).astype(bool)).tobytes())
+        return info
+
+    if observed and all(_is_number(v) for v in observed):
+        if all(isinstance(v, int) and -_MAX_QUANTIZED < v < _MAX_QUANTIZED for v in observed):
+            info['kind'] = 'int'
+            _pack_ints(fill(observed, observed[0]), info, blocks)
+            return info
+        floats = np.array(observed, dtype=np.float64)
+        decimals = field_decimals(name)
+        scaled = np.round(floats * 10 ** decimals)
+        if np.isfinite(scaled).all() and np.abs(scaled).max() < _MAX_QUANTIZED:
+            info.update(kind='float', decimals=decimals)
+            _pack_ints(fill(scaled.astype(np.int64).tolist(), int(scaled[0])), info, blocks)
+            return info
+
+    if observed and all(isinstance(v, str) for v in observed):
+        parsed = _datetime_micros(observed)
+        if parsed:
+            micros, timespec, suffix = parsed
+            info.update(kind='datetime', timespec=timespec, suffix=suffix)
+            _pack_ints(fill(micros, micros[0]), info, blocks)
+            return info
+        categories = {}
+        codes = [categories.setdefault(v, len(categories)) for v in observed]
+        if len(categories) <= len(observed) // 2:
+            info.update(kind='category', categories=list(categories))
+            _pack_ints(fill(codes, 0), info, blocks)
+            return info
+
+    info['kind'] = 'json'
+    info['block'] = len(blocks)
+    blocks.append(json.dumps(observed, separators=(',', ':')).encode())
+    return info
+
+def _decode_column(info: Dict, blocks: List[bytes], rows: int) -> Tuple[List, Optional[np.ndarray]]:
+    """Values for every row (absent rows hold filler) and the presence mask"""
+    present = None
+    if 'present' in info:
+        present = np.unpackbits(np.frombuffer(blocks[info['present']], dtype=np.uint8), count=rows).astype(bool)
+    kind = info['kind']
+
+    if kind == 'json':
+        observed = json.loads(blocks[info['block']])
+        if present is None:
+            return observed, None
+        values = [None] * rows
+        for i, value in zip(np.flatnonzero(present).tolist(), observed):
+            values[i] = value
+        return values, present
+    if kind == 'bool':
+        bits = np.unpackbits(np.frombuffer(blocks[info['block']], dtype=np.uint8), count=rows)
+        return bits.astype(bool).tolist(), present
+
+    ints = _unpack_ints(info, blocks, rows)
+    if kind == 'int':
+        return ints.tolist(), present
+    if kind == 'float':
+        return (ints / 10 ** info['decimals']).tolist(), present
+    if kind == 'category':
+        categories = info['categories']
+        return [categories[code] for code in ints.tolist()], present
+    if kind == 'datetime':
+        timespec, suffix = info['timespec'], info['suffix']
+        return [(_EPOCH + timedelta(microseconds=value)).isoformat(timespec=timespec) + suffix
+                for value in ints.tolist()], present
+    raise ValueError(f"Unknown column kind: {kind}")
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return bytes([_COMPRESSION_ZSTD]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return bytes([_COMPRESSION_ZLIB]) + zlib.compress(data, ZLIB_LEVEL)
+
+def _decompress(data: bytes) -> bytes:
+    method, body = data[0], data[1:]
+    if method == _COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    if method == _COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unknown compression method: {method}")
+
+def encode_frames(frames: List[Dict], envelope: Dict = None) -> bytes:
+    """
+    Encode a list of frame dicts
+
+    Args:
+        frames: Frame records
+        envelope: JSON-serializable data stored alongside (used by encode_payload)
+
+    Returns:
+        Encoded bytes
+    """
+    rows = len(frames)
+    flat = [_flatten_frame(frame) for frame in frames]
+    names = list(dict.fromkeys(name for columns, _ in flat for name in columns))
+    blocks = []
+    columns = []
+    for name in names:
+        present = np.fromiter((name in row for row, _ in flat), dtype=bool, count=rows)
+        values = [row.get(name) for row, _ in flat]
+        columns.append(_encode_column(name, values, present, blocks))
+
+    extras = {str(i): row_extras for i, (_, row_extras) in enumerate(flat) if row_extras}
+    # Key order of the first frame, so decoded frames serialize like the originals
+    order = list(frames[0]) if frames else []
+    header = {'version': CODEC_VERSION, 'rows': rows, 'columns': columns, 'order': order,
+              'sizes': [len(block) for block in blocks]}
+    if extras:
+        header['extras'] = extras
+    if envelope is not None:
+        header['envelope'] = envelope
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    body = struct.pack('<I', len(header_bytes)) + header_bytes + b''.join(blocks)
+    return CODEC_MAGIC + _compress(body)
+
+def _decode(data: bytes) -> Tuple[List[Dict], Dict]:
+    if data[:len(CODEC_MAGIC)] != CODEC_MAGIC:
+        raise ValueError("Not an encoded frame analytics payload")
+    body = _decompress(data[len(CODEC_MAGIC):])
+    header_size = struct.unpack_from('<I', body)[0]
+    header = json.loads(body[4:4 + header_size])
+    if header.get('version') != CODEC_VERSION:
+        raise ValueError(f"Unsupported codec version: {header.get('version')}")
+
+    blocks = []
+    offset = 4 + header_size
+    for size in header['sizes']:
+        blocks.append(body[offset:offset + size])
+        offset += size
+
+    rows = header['rows']
+    frames = [{} for _ in range(rows)]
+    nested = {}
+    for info in header['columns']:
+        values, present = _decode_column(info, blocks, rows)
+        parent, _, child = info['name'].partition('.')
+        for i, value in enumerate(values):
+            if present is not None and not present[i]:
+                continue
+            if child:
+                frame = frames[i]
+                target = frame.get(parent)
+                if target is None:
+                    target = frame[parent] = {}
+                target[child] = value
+            else:
+                frames[i][info['name']] = value
+
+    for i, row_extras in header.get('extras', {}).items():
+        frames[int(i)].update(row_extras)
+
+    order = header['order']
+    if order:
+        rank = {key: position for position, key in enumerate(order)}
+        frames = [dict(sorted(frame.items(), key=lambda item: rank.get(item[0], len(rank))))
+                  for frame in frames]
+    return frames, header.get('envelope')
+
+def decode_frames(data: bytes) -> List[Dict]:
+    """Frame records from encode_frames output"""
+    return _decode(data)[0]
+
+def encode_payload(payload) -> bytes:
+    """
+    Encode an analytics payload as served by the backend
+
+    Args:
+        payload: A list of frames, or a dict holding one under 'analytics'
+            or 'frame_data' next to other fields (metadata, statistics)
+    """
+    if isinstance(payload, dict):
+        key = next((k for k in FRAME_LIST_KEYS if isinstance(payload.get(k), list)), None)
+        if key is None:
+            return encode_frames([], envelope={'key': None, 'fields': payload})
+        rest = {k: v for k, v in payload.items()}
+        frames = rest.pop(key)
+        return encode_frames(frames, envelope={'key': key, 'fields': rest, 'order': list(payload)})
+    return encode_frames(list(payload))
+
+def decode_payload(data: bytes):
+    """Rebuild the payload passed to encode_payload (floats at codec precision)"""
+    frames, envelope = _decode(data)
+    if envelope is None:
+        return frames
+    if envelope['key'] is None:
+        return envelope['fields']
+    payload = dict(envelope['fields'])
+    payload[envelope['key']] = frames
+    return {key: payload[key] for key in envelope['order']}
+
+def compression_report(payload, json_bytes: int = None) -> Dict:
+    """
+    Compare a payload's JSON size with its encoded size
+
+    Args:
+        payload: Analytics payload
+        json_bytes: Size of the JSON as stored or served (default: compact re-serialization)
+    """
+    if json_bytes is None:
+        json_bytes = len(json.dumps(payload, separators=(',', ':')).encode())
+    encoded_bytes = len(encode_payload(payload))
+    return {
+        'json_bytes': json_bytes,
+        'encoded_bytes': encoded_bytes,
+        'ratio': encoded_bytes / json_bytes if json_bytes else 1.0,
+        'compression': 'zstd' if zstandard is not None else 'zlib'
+    }
+
+def main():
+    """Encode a JSON analytics file and check the round trip"""
+    parser = argparse.ArgumentParser(description="Compact encoding for per-frame analytics")
+    parser.add_argument("input", help="JSON analytics file, e.g. sample_frame_data.json")
+    parser.add_argument("--output", help="Write the encoded payload here")
+    args = parser.parse_args()
+
+    with open(args.input, 'rb') as f:
+        raw = f.read()
+    payload = json.loads(raw)
+    encoded = encode_payload(payload)
+    decoded = decode_payload(encoded)
+    stable = encode_payload(decoded) == encoded
+
+    report = compression_report(payload, json_bytes=len(raw))
+    print(f"📦 {args.input}: {report['json_bytes'] / 1024:.1f} KB JSON -> "
+          f"{report['encoded_bytes'] / 1024:.1f} KB encoded ({report['compression']}, "
+          f"{report['ratio'] * 100:.1f}% of the original)")
+    print(f"🔁 Round trip {'stable' if stable else 'NOT stable'}")
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(encoded)
+        print(f"💾 Saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Local SQLite mirror of backend sessions
+
+The first sync downloads the whole /getSessions list. After that, each
+sync sends the newest (created_at, _id) seen so far as `since` /
+`since_id`, so a backend that supports them returns only newer sessions.
+Sessions are upserted by _id with a content hash, so new and changed
+sessions are detected either way; a backend that ignores the parameters
+just costs a full download.
+
+Sessions deleted on the backend, and older sessions changed after they
+were synced, can only be noticed in a full listing. A full sync runs on
+the first sync, when requested, and once every FULL_SYNC_INTERVAL
+seconds, pruning local sessions it did not see.
+
+Queries run against indexed columns (created_at, total size, Cloudflare
+UID, analytics ID); the full session document is kept as JSON. The
+created_at column is normalized to ISO-8601 UTC with microseconds, so
+timestamps written with different offsets or precision sort correctly
+and the watermark really is the newest session. Each
+backend gets its own database file under SESSION_STORE_DIR.
+
+Usage:
+    python session_store.py sync [--backend-url URL] [--full]
+    python session_store.py stats
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+import logging
+
+import requests
+
+from api_client import ApiClient, iter_json_items
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_DIR = os.environ.get('SESSION_STORE_DIR', '.session_store')
+FULL_SYNC_INTERVAL = 24 * 3600
+SYNC_BATCH_SIZE = 500
+
+# Bumped when indexed columns change meaning; older stores are re-indexed on open
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created_at TEXT,
+    video_size INTEGER NOT NULL DEFAULT 0,
+    analytics_size INTEGER NOT NULL DEFAULT 0,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    cloudflare_uid TEXT,
+    analytics_id TEXT,
+    filename TEXT,
+    content_hash TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at, id);
+CREATE INDEX IF NOT EXISTS sessions_total_size ON sessions (total_size);
+CREATE INDEX IF NOT EXISTS sessions_cloudflare_uid ON sessions (cloudflare_uid);
+CREATE INDEX IF NOT EXISTS sessions_analytics_id ON sessions (analytics_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def normalize_created_at(value) -> Optional[str]:
+    """
+    ISO-8601 UTC form of a created_at value, e.g. 2025-09-27T18:44:57.000000Z
+
+    Naive timestamps are taken as UTC. Returns None for anything that is
+    not an ISO string.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def _session_row(session: Dict, synced_at: float) -> Tuple:
+    """Indexed columns plus the JSON document of a session"""
+    doc = json.dumps(session, sort_keys=True, separators=(',', ':'), default=str)
+    meta = session.get('meta') or {}
+    video_size = session.get('video_size') or 0
+    analytics_size = session.get('analytics_size') or 0
+    return (
+        str(session['_id']),
+        normalize_created_at(session.get('created_at')),
+        video_size,
+        analytics_size,
+        video_size + analytics_size,
+        meta.get('cloudflare_uid') or meta.get('cloudflare_stream_id'),
+        session.get('analytics_id') or session.get('gridfs_analytics_id'),
+        session.get('processed_video_filename') or session.get('original_filename'),
+        hashlib.sha1(doc.encode()).hexdigest(),
+        synced_at,
+        doc
+    )
+
+def store_path_for(backend_url: str) -> str:
+    """Database file for a backend, e.g. .session_store/localhost_5004.sqlite3"""
+    host = urlparse(backend_url).netloc or backend_url
+    return os.path.join(SESSION_STORE_DIR, re.sub(r'[^A-Za-z0-9.-]+', '_', host) + '.sqlite3')
+
+class SessionStore:
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) the local session database
+
+        Args:
+            path: SQLite file
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self._migrate()
+
+    def _migrate(self):
+        """Re-derive indexed columns written by an older schema version"""
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.db:
+            rows = self.db.execute("SELECT id, doc FROM sessions").fetchall()
+            self.db.executemany("UPDATE sessions SET created_at = ? WHERE id = ?",
+                                [(normalize_created_at(json.loads(doc).get('created_at')), session_id)
+                                 for session_id, doc in rows])
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @classmethod
+    def for_backend(cls, backend_url: str) -> 'SessionStore':
+        """Open the store that mirrors a backend"""
+        return cls(store_path_for(backend_url))
+
+    def close(self):
+        self.db.close()
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value):
+        self.db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def watermark(self) -> Optional[Tuple[str, str]]:
+        """Newest (created_at, _id) stored, or None before the first sync"""
+        return self.db.execute(
+            "SELECT created_at, id FROM sessions WHERE created_at IS NOT NULL "
+            "ORDER BY created_at DESC, id DESC LIMIT 1"
+        ).fetchone()
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _upsert(self, sessions: List[Dict], synced_at: float, counts: Dict):
+        """Insert new sessions and rewrite changed ones"""
+        rows = [_session_row(session, synced_at) for session in sessions]
+        placeholders = ','.join('?' * len(rows))
+        known = dict(self.db.execute(
+            f"SELECT id, content_hash FROM sessions WHERE id IN ({placeholders})",
+            [row[0] for row in rows]
+        ).fetchall())
+
+        changed = []
+        for row in rows:
+            if row[0] not in known:
+                counts['inserted'] += 1
+                changed.append(row)
+            elif known[row[0]] != row[8]:
+                counts['updated'] += 1
+                changed.append(row)
+            else:
+                counts['unchanged'] += 1
+
+        self.db.executemany(
+            "INSERT OR REPLACE INTO sessions (id, created_at, video_size, analytics_size, total_size, "
+            "cloudflare_uid, analytics_id, filename, content_hash, synced_at, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", changed
+        )
+        # Seen but unchanged sessions still count as present in this sync
+        changed_ids = {row[0] for row in changed}
+        self.db.executemany("UPDATE sessions SET synced_at = ? WHERE id = ?",
+                            [(synced_at, row[0]) for row in rows if row[0] not in changed_ids])
+
+    def sync(self, client: ApiClient, full: bool = None) -> Dict:
+        """
+        Pull new and changed sessions from the backend
+
+        Args:
+            client: Client for the backend
+            full: Force (True) or skip (False) a full listing; by default a
+                full sync runs first and then every FULL_SYNC_INTERVAL
+
+        Returns:
+            Counts of received, inserted, updated, unchanged and deleted
+            sessions, whether the sync was full, and the elapsed time
+
+        Raises:
+            requests.RequestException: If the backend could not be reached
+        """
+        with self.lock:
+            watermark = self.watermark()
+            last_full = float(self._state('last_full_sync') or 0)
+            if full is None:
+                full = watermark is None or time.time() - last_full > FULL_SYNC_INTERVAL
+
+            params = {}
+            if not full and watermark:
+                params = {'since': watermark[0], 'since_id': watermark[1]}
+
+            counts = {'received': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0,
+                      'full': full}
+            start = time.perf_counter()
+            synced_at = time.time()
+
+            response = client.get("/getSessions", params=params, stream=True)
+            try:
+                if response.status_code != 200:
+                    raise requests.RequestException(f"/getSessions returned {response.status_code}")
+                batch = []
+                with self.db:
+                    for session in iter_json_items(response.iter_content(chunk_size=65536),
+                                                   [('sessions',), ()]):
+                        if not isinstance(session, dict) or '_id' not in session:
+                            continue
+                        counts['received'] += 1
+                        batch.append(session)
+                        if len(batch) >= SYNC_BATCH_SIZE:
+                            self._upsert(batch, synced_at, counts)
+                            batch = []
+                    if batch:
+                        self._upsert(batch, synced_at, counts)
+
+                    if full and not counts['received'] and self.watermark():
+                        logger.warning("Full session sync returned no sessions; keeping the local copy")
+                    elif full:
+                        counts['deleted'] = self.db.execute(
+                            "DELETE FROM sessions WHERE synced_at < ?", (synced_at,)
+                        ).rowcount
+                        self._set_state('last_full_sync', synced_at)
+                    self._set_state('last_sync', synced_at)
+            finally:
+                response.close()
+
+        counts['elapsed_seconds'] = time.perf_counter() - start
+        logger.info(f"Session sync ({'full' if full else 'incremental'}): {counts['received']} received, "
+                    f"{counts['inserted']} new, {counts['updated']} changed, "
+                    f"{counts['deleted']} deleted, {self.count()} stored")
+        return counts
+
+    def _query(self, where: str = "", params: Iterable = (), order: str = "rowid",
+               limit: int = None) -> Iterator[Dict]:
+        sql = f"SELECT doc FROM sessions {'WHERE ' + where if where else ''} ORDER BY {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            docs = self.db.execute(sql, tuple(params)).fetchall()
+        for (doc,) in docs:
+            yield json.loads(doc)
+
+    def sessions(self) -> List[Dict]:
+        """All stored sessions, in the order they were first synced"""
+        return list(self._query())
+
+    def iter_sessions(self, batch_size: int = SYNC_BATCH_SIZE) -> Iterator[Dict]:
+        """Stored sessions one at a time, in the order they were first synced
+
+        Pages through the table by rowid so only one batch is in memory at a time.
+        """
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    "SELECT rowid, doc FROM sessions WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for rowid, doc in rows:
+                yield json.loads(doc)
+            last_rowid = rows[-1][0]
+
+    def largest(self, limit: int = 10, min_bytes: int = 0) -> List[Dict]:
+        """Sessions by video + analytics size, largest first"""
+        return list(self._query("total_size >= ?", (min_bytes,), "total_size DESC", limit))
+
+    def created_between(self, start: str = None, end: str = None) -> List[Dict]:
+        """Sessions with start <= created_at < end (ISO strings; either bound optional)"""
+        clauses, params = [], []
+        if start:
+            clauses.append("created_at >= ?")
+            params.append(normalize_created_at(start) or start)
+        if end:
+            clauses.append("created_at < ?")
+            params.append(normalize_created_at(end) or end)
+        return list(self._query(" AND ".join(clauses), params, "created_at, id"))
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        return next(self._query("id = ?", (session_id,), limit=1), None)
+
+    def remove(self, session_ids: Iterable[str]) -> int:
+        """Drop sessions from the local copy, e.g. once they are deleted upstream"""
+        with self.lock, self.db:
+            return self.db.executemany("DELETE FROM sessions WHERE id = ?",
+                                       [(session_id,) for session_id in session_ids]).rowcount
+
+    def by_cloudflare_uid(self, uid: str) -> Optional[Dict]:
+        return next(self._query("cloudflare_uid = ?", (uid,), limit=1), None)
+
+    def by_analytics_id(self, analytics_id: str) -> Optional[Dict]:
+        return next(self._query("analytics_id = ?", (analytics_id,), limit=1), None)
+
+    def with_cloudflare_video(self, limit: int = None) -> List[Dict]:
+        """Sessions that have a Cloudflare Stream UID"""
+        return list(self._query("cloudflare_uid IS NOT NULL", limit=limit))
+
+    def with_analytics(self, limit: int = None) -> List[Dict]:
+        """Sessions that reference an analytics document"""
+        return list(self._query("analytics_id IS NOT NULL", limit=limit))
+
+    def stats(self) -> Dict:
+        """Summary of the stored sessions and sync state"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_size), 0), COUNT(cloudflare_uid), COUNT(analytics_id), "
+                "MIN(created_at), MAX(created_at) FROM sessions"
+            ).fetchone()
+            last_sync = self._state('last_sync')
+            last_full = self._state('last_full_sync')
+            watermark = self.watermark()
+        return {
+            'path': self.path,
+            'sessions': row[0],
+            'total_bytes': row[1],
+            'with_cloudflare_uid': row[2],
+            'with_analytics': row[3],
+            'oldest_created_at': row[4],
+            'newest_created_at': row[5],
+            'watermark': watermark,
+            'last_sync': float(last_sync) if last_sync else None,
+            'last_full_sync': float(last_full) if last_full else None
+        }
+
+def main():
+    """Sync or inspect the local session store"""
+    parser = argparse.ArgumentParser(description="Local SQLite mirror of backend sessions")
+    parser.add_argument("command", choices=["sync", "stats"])
+    parser.add_argument("--backend-url", default="https://gymnasticsapi.onrender.com",
+                        help="Gymnastics analytics backend URL")
+    parser.add_argument("--db", help="SQLite file (default: one per backend under SESSION_STORE_DIR)")
+    parser.add_argument("--full", action="store_true", help="Download the full session list")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = SessionStore(args.db) if args.db else SessionStore.for_backend(args.backend_url)
+
+    if args.command == "sync":
+        store.sync(ApiClient(args.backend_url), full=True if args.full else None)
+
+    stats = store.stats()
+    print(f"🗄️ SESSION STORE: {stats['path']}")
+    print(f"   Sessions: {stats['sessions']} ({stats['total_bytes'] / 1024 / 1024:.1f} MB of video + analytics)")
+    print(f"   With Cloudflare UID: {stats['with_cloudflare_uid']}")
+    print(f"   With analytics: {stats['with_analytics']}")
+    print(f"   Created: {stats['oldest_created_at']} .. {stats['newest_created_at']}")
+    if stats['last_sync']:
+        print(f"   Last sync: {time.ctime(stats['last_sync'])} "
+              f"(last full: {time.ctime(stats['last_full_sync']) if stats['last_full_sync'] else 'never'})")
+
+if __name__ == "__main__":
+    main()
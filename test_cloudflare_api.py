@@ -8,6 +8,9 @@ import json
 import re
 from datetime import datetime
 
+from api_client import ApiClient
+from session_store import SessionStore
+
 # Configuration
 API_BASE_URL = 'https://gymnasticsapi.onrender.com'
 
@@ -16,11 +19,11 @@ def log(message, level='INFO'):
     timestamp = datetime.now().strftime('%H:%M:%S')
     print(f"[{timestamp}] {level}: {message}")
 
-def test_api_connection():
+def test_api_connection(client):
     """Test basic API connection"""
     try:
         log("Testing API connection...")
-        response = requests.get(f"{API_BASE_URL}/health", timeout=10)
+        response = client.get("/health", timeout=10)
         if response.status_code == 200:
             log("✅ API connection successful", 'SUCCESS')
             return True
@@ -31,27 +34,24 @@ def test_api_connection():
         log(f"❌ API connection failed: {e}", 'ERROR')
         return False
 
-def fetch_sessions():
-    """Fetch sessions from production server"""
+def fetch_sessions(client, store):
+    """Sync sessions from production server into the local store and return them"""
     try:
-        log("Fetching sessions from production server...")
-        response = requests.get(f"{API_BASE_URL}/getSessions", timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('sessions'):
-                sessions = data['sessions']
-                log(f"✅ Found {len(sessions)} sessions", 'SUCCESS')
-                return sessions
-            else:
-                log("❌ No sessions found in response", 'ERROR')
-                return []
-        else:
-            log(f"❌ Failed to fetch sessions: {response.status_code}", 'ERROR')
-            return []
+        log("Syncing sessions from production server...")
+        sync = store.sync(client)
+        log(f"Synced {sync['received']} sessions ({sync['inserted']} new, {sync['updated']} changed)")
     except Exception as e:
         log(f"❌ Error fetching sessions: {e}", 'ERROR')
-        return []
+        if not store.count():
+            return []
+        log("⚠️ Using the local copy of the sessions", 'WARNING')
+    
+    sessions = store.sessions()
+    if sessions:
+        log(f"✅ Found {len(sessions)} sessions", 'SUCCESS')
+    else:
+        log("❌ No sessions found in response", 'ERROR')
+    return sessions
 
 def analyze_sessions(sessions):
     """Analyze sessions for Cloudflare Stream URLs"""
@@ -87,11 +87,11 @@ def analyze_sessions(sessions):
     log(f"Found {len(cloudflare_sessions)} sessions with Cloudflare Stream URLs", 'SUCCESS')
     return cloudflare_sessions
 
-def test_cloudflare_url(cloudflare_url):
+def test_cloudflare_url(client, cloudflare_url):
     """Test if Cloudflare Stream URL is accessible"""
     try:
         log(f"Testing Cloudflare Stream URL: {cloudflare_url}")
-        response = requests.head(cloudflare_url, timeout=10)
+        response = client.head(cloudflare_url, timeout=10)
         
         if response.status_code == 200:
             log("✅ Cloudflare Stream URL is accessible", 'SUCCESS')
@@ -239,14 +239,16 @@ def generate_html_test(cloudflare_sessions):
 def main():
     """Main test function"""
     log("Starting Cloudflare Stream API test...")
+    client = ApiClient(API_BASE_URL)
+    store = SessionStore.for_backend(API_BASE_URL)
     
     # Test API connection
-    if not test_api_connection():
+    if not test_api_connection(client):
         log("❌ API connection failed, exiting", 'ERROR')
         return
     
     # Fetch sessions
-    sessions = fetch_sessions()
+    sessions = fetch_sessions(client, store)
     if not sessions:
         log("❌ No sessions found, exiting", 'ERROR')
         return
@@ -260,7 +262,7 @@ def main():
     # Test first Cloudflare URL
     if cloudflare_sessions:
         first_session = cloudflare_sessions[0]
-        test_cloudflare_url(first_session['cloudflare_url'])
+        test_cloudflare_url(client, first_session['cloudflare_url'])
     
     # Generate HTML test file
     html_file = generate_html_test(cloudflare_sessions)
@@ -15,23 +15,587 @@ import time
 from datetime import datetime
 import os
 import sys
-from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
 import logging
 
+import numpy as np
+
+from analytics_cache import ANALYTICS_CACHE_DIR, AnalyticsCache
+from api_client import ApiClient, iter_json_items
+from session_store import SessionStore
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Where each endpoint's record array may sit in its response
+SESSION_ARRAY_PATHS = [('sessions',), ()]
+ANALYTICS_ARRAY_PATHS = [(), ('analytics',), ('frame_data',)]
+PER_FRAME_ARRAY_PATHS = [(), ('frame_data',)]
+
+# An interval this many times the median interval counts as a gap
+TIMESTAMP_GAP_FACTOR = 1.5
+
+# Source comparison defaults: values match when |a - b| <= atol + rtol * |b|
+DIFF_ATOL = 1e-6
+DIFF_RTOL = 1e-4
+MAX_REPORTED_RANGES = 20
+
+# Records FrameTable.from_records normalizes at a time
+FRAME_TABLE_CHUNK_RECORDS = 4096
+
+# Analytics for a GridFS ID are immutable; per-frame statistics are looked
+# up by filename and may be regenerated, so cached copies expire
+PER_FRAME_CACHE_TTL = 24 * 3600
+
+def _frame_records(analytics_data) -> Iterable[Dict]:
+    """
+    Frame records from an analytics payload
+    
+    Args:
+        analytics_data: A list of frames, a dict with an 'analytics' or
+            'frame_data' list, or an iterator of frames (e.g. from
+            iter_analytics_frames)
+    """
+    if isinstance(analytics_data, dict):
+        if 'analytics' in analytics_data:
+            return analytics_data['analytics']
+        if 'frame_data' in analytics_data:
+            return analytics_data['frame_data']
+        return []
+    return analytics_data or []
+
+def _frame_timestamp(frame: Dict) -> Optional[float]:
+    """Timestamp of a frame record, top-level or under metrics"""
+    if 'timestamp' in frame:
+        return frame['timestamp']
+    if 'metrics' in frame and 'timestamp' in frame['metrics']:
+        return frame['metrics']['timestamp']
+    return None
+
+def _frame_relative_timestamp(frame: Dict) -> Optional[float]:
+    """Relative timestamp of a frame record, under metrics or top-level"""
+    if 'metrics' in frame and 'relative_timestamp' in frame['metrics']:
+        return frame['metrics']['relative_timestamp']
+    return frame.get('relative_timestamp')
+
+def _typed_chunk(values: List) -> Optional[np.ndarray]:
+    """
+    Column of one chunk's values for a field, or None if any value is not numeric
+    
+    A chunk where every value is an int stays int64; anything else numeric
+    becomes float64 with NaN where the field is absent.
+    """
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        return np.array(values, dtype=np.int64)
+    if not kinds - {type(None)} <= {int, float}:
+        return None
+    return np.array(values, dtype=np.float64)
+
+def _join_chunks(parts: List[Optional[np.ndarray]], sizes: List[int]) -> Optional[np.ndarray]:
+    """
+    Concatenate a field's per-chunk columns, or None if it never had a value
+    
+    Integer fields present in every chunk stay int64; chunks without the
+    field (None parts) become NaN.
+    """
+    if all(part is not None and part.dtype == np.int64 for part in parts):
+        return np.concatenate(parts)
+    column = np.concatenate([np.full(size, np.nan) if part is None else part.astype(np.float64)
+                             for part, size in zip(parts, sizes)])
+    return None if np.isnan(column).all() else column
+
+class FrameTable:
+    """
+    Analytics frame records normalized into typed columns
+    
+    Backend payloads put frames in a bare list or under 'analytics' or
+    'frame_data', with timestamps either on the frame or under 'metrics'.
+    A FrameTable resolves all of that once; the analysis functions then
+    work on its arrays instead of walking the raw records again.
+    
+    Columns:
+        frame_numbers: int64, the record's position where absent or null
+        timestamps: float64, NaN where absent
+        relative_timestamps: float64, NaN where absent
+        metrics: {name: array} of every numeric field under 'metrics' plus
+            numeric top-level fields ('metrics' wins on a name clash
+            wherever it has a value)
+    """
+    
+    def __init__(self, frame_numbers: np.ndarray, timestamps: np.ndarray,
+                 relative_timestamps: np.ndarray, metrics: Dict[str, np.ndarray]):
+        self.frame_numbers = frame_numbers
+        self.timestamps = timestamps
+        self.relative_timestamps = relative_timestamps
+        self.metrics = metrics
+        
+    def __len__(self) -> int:
+        return len(self.frame_numbers)
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'FrameTable':
+        """
+        Normalize frame records
+        
+        Records are consumed in chunks of FRAME_TABLE_CHUNK_RECORDS, so a
+        streamed iterator is never materialized whole. Within a chunk each
+        field is gathered with one comprehension, which is several times
+        faster than appending record by record.
+        """
+        sizes = []
+        frame_numbers, timestamps, relative_timestamps = [], [], []
+        # Top-level and nested fields: {name: [column or None per chunk]}
+        fields = ({}, {})
+        rejected = (set(), set())
+        
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, FRAME_TABLE_CHUNK_RECORDS))
+            if not chunk:
+                break
+            offset = sum(sizes)
+            # An explicit null frame_number falls back to the position too
+            frame_numbers.append(np.array([offset + i if frame.get('frame_number') is None else frame['frame_number']
+                                           for i, frame in enumerate(chunk)], dtype=np.int64))
+            timestamps.append(np.array([_frame_timestamp(frame) for frame in chunk], dtype=np.float64))
+            relative_timestamps.append(np.array([_frame_relative_timestamp(frame) for frame in chunk],
+                                                dtype=np.float64))
+            
+            nested = [frame['metrics'] if isinstance(frame.get('metrics'), dict) else {} for frame in chunk]
+            for rows, columns, bad, skip in ((chunk, fields[0], rejected[0], {'frame_number', 'timestamp'}),
+                                             (nested, fields[1], rejected[1], set())):
+                for name in set(itertools.chain.from_iterable(rows)) - skip - bad:
+                    part = _typed_chunk([row.get(name) for row in rows])
+                    if part is None:
+                        bad.add(name)
+                        columns.pop(name, None)
+                    else:
+                        columns.setdefault(name, [None] * len(sizes)).append(part)
+                for parts in columns.values():
+                    if len(parts) == len(sizes):
+                        parts.append(None)
+            sizes.append(len(chunk))
+        
+        if not sizes:
+            empty = np.zeros(0, dtype=np.float64)
+            return cls(np.zeros(0, dtype=np.int64), empty, empty.copy(), {})
+        
+        # 'metrics' wins on a name clash, in the records where it has a value
+        metrics = {}
+        for columns in fields:
+            for name, parts in columns.items():
+                column = _join_chunks(parts, sizes)
+                if column is None:
+                    continue
+                if name in metrics and column.dtype == np.float64:
+                    column = np.where(np.isnan(column), metrics[name], column)
+                metrics[name] = column
+        return cls(np.concatenate(frame_numbers), np.concatenate(timestamps),
+                   np.concatenate(relative_timestamps), metrics)
+    
+    @classmethod
+    def from_payload(cls, analytics_data) -> 'FrameTable':
+        """Normalize any analytics payload accepted by _frame_records"""
+        return cls.from_records(_frame_records(analytics_data))
+    
+    @classmethod
+    def coerce(cls, data) -> 'FrameTable':
+        """Return data if it is already a table, otherwise normalize it as a payload"""
+        return data if isinstance(data, cls) else cls.from_payload(data)
+    
+    @property
+    def has_timestamp(self) -> np.ndarray:
+        """Mask of frames with a timestamp"""
+        return ~np.isnan(self.timestamps)
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns"""
+        return (self.frame_numbers.nbytes + self.timestamps.nbytes + self.relative_timestamps.nbytes
+                + sum(column.nbytes for column in self.metrics.values()))
+
+class FrameTimeIndex:
+    """
+    Frame number <-> timestamp <-> video time lookups over sorted arrays
+    
+    Replaces per-frame dicts keyed by ints and floats: a player asking
+    which frame is on screen at 3.217s gets an answer from a binary
+    search rather than an exact float match. Frames are kept sorted by
+    frame number, with a second ordering by video time for time lookups.
+    Scalar and array queries are both accepted.
+    """
+    
+    def __init__(self, frames: np.ndarray, timestamps: np.ndarray, video_times: np.ndarray,
+                 fps: float = 30.0, total_frames: int = None):
+        """
+        Wrap per-frame arrays
+        
+        Args:
+            frames: Frame numbers
+            timestamps: Backend timestamp of each frame
+            video_times: Position of each frame in the video, in seconds
+            fps: Video frame rate
+            total_frames: Frame records seen, including any without a
+                timestamp (default: number of indexed frames)
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        video_times = np.asarray(video_times, dtype=np.float64)
+        
+        # Sort by frame number; a repeated frame number keeps its last record
+        order = np.argsort(frames, kind='stable')
+        frames = frames[order]
+        last = np.append(frames[1:] != frames[:-1], True) if frames.size else np.zeros(0, bool)
+        self.frames = frames[last]
+        self.timestamps = timestamps[order][last]
+        self.video_times = video_times[order][last]
+        
+        # Usually video time already rises with frame number, and the frame
+        # order doubles as the time order
+        if (np.diff(self.video_times) >= 0).all():
+            self.time_order = None
+            self.sorted_times = self.video_times
+        else:
+            self.time_order = np.argsort(self.video_times, kind='stable')
+            self.sorted_times = self.video_times[self.time_order]
+        self.fps = fps
+        self.total_frames = len(self.frames) if total_frames is None else total_frames
+        
+    def __len__(self) -> int:
+        return len(self.frames)
+    
+    @classmethod
+    def from_table(cls, table: FrameTable, fps: float = 30.0) -> 'FrameTimeIndex':
+        """
+        Build an index from the timestamped frames of a FrameTable
+        
+        Unix timestamps (above 1e9) are converted to video time by dividing
+        by 1000; smaller timestamps are already relative seconds.
+        """
+        has_timestamp = table.has_timestamp
+        timestamps = table.timestamps[has_timestamp]
+        video_times = np.where(timestamps > 1000000000, timestamps / 1000, timestamps)
+        return cls(table.frame_numbers[has_timestamp], timestamps, video_times,
+                   fps=fps, total_frames=len(table))
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], fps: float = 30.0) -> 'FrameTimeIndex':
+        """Build an index from analytics frame records"""
+        return cls.from_table(FrameTable.from_records(records), fps=fps)
+    
+    @property
+    def metadata(self) -> Dict:
+        """Summary matching the old mapping's metadata block"""
+        return {
+            "fps": self.fps,
+            "total_frames": self.total_frames,
+            "indexed_frames": len(self),
+            "video_duration": float(self.sorted_times[-1]) if len(self) else 0,
+            "index_bytes": self.nbytes
+        }
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the index arrays"""
+        arrays = [self.frames, self.timestamps, self.video_times]
+        if self.time_order is not None:
+            arrays += [self.time_order, self.sorted_times]
+        return sum(array.nbytes for array in arrays)
+    
+    def _frames_in_time_order(self, position):
+        """Frame numbers at positions of the time-sorted view"""
+        if self.time_order is None:
+            return self.frames[position]
+        return self.frames[self.time_order[position]]
+    
+    def _positions(self, frame_number):
+        """Array positions of frame numbers, -1 where absent"""
+        frame_number = np.asarray(frame_number, dtype=np.int64)
+        if not len(self):
+            return np.full(frame_number.shape, -1, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.frames, frame_number), len(self) - 1)
+        return np.where(self.frames[position] == frame_number, position, -1)
+    
+    def _lookup(self, values: np.ndarray, frame_number):
+        # Position -1 reads the NaN sentinel
+        result = np.append(values, np.nan)[self._positions(frame_number)]
+        if np.ndim(result) == 0:
+            return None if np.isnan(result) else float(result)
+        return result
+    
+    def timestamp_of_frame(self, frame_number):
+        """Backend timestamp of frame numbers (None / NaN where absent)"""
+        return self._lookup(self.timestamps, frame_number)
+    
+    def video_time_of_frame(self, frame_number):
+        """Video time in seconds of frame numbers (None / NaN where absent)"""
+        return self._lookup(self.video_times, frame_number)
+    
+    def frame_at_time(self, video_time, mode: str = 'floor'):
+        """
+        Frame number at a video time
+        
+        Args:
+            video_time: Seconds, scalar or array
+            mode: 'floor' for the frame on screen (latest frame starting at
+                or before the time) or 'nearest' for the closest frame
+                
+        Returns:
+            Frame number(s); -1 for floor queries before the first frame
+            and for an empty index
+        """
+        video_time = np.asarray(video_time, dtype=np.float64)
+        if not len(self):
+            result = np.full(video_time.shape, -1, dtype=np.int64)
+            return int(result) if result.ndim == 0 else result
+        
+        right = np.searchsorted(self.sorted_times, video_time, side='right')
+        if mode == 'floor':
+            position = right - 1
+            valid = position >= 0
+        elif mode == 'nearest':
+            before = np.maximum(right - 1, 0)
+            after = np.minimum(right, len(self) - 1)
+            closer_after = np.abs(self.sorted_times[after] - video_time) < np.abs(video_time - self.sorted_times[before])
+            position = np.where(closer_after, after, before)
+            valid = np.ones(video_time.shape, bool)
+        else:
+            raise ValueError(f"Unknown lookup mode: {mode}")
+        
+        result = np.where(valid, self._frames_in_time_order(np.maximum(position, 0)), -1)
+        return int(result) if result.ndim == 0 else result
+    
+    def frames_between(self, start_time: float, end_time: float) -> np.ndarray:
+        """Frame numbers whose video time falls in [start_time, end_time), in time order"""
+        first, last = np.searchsorted(self.sorted_times, [start_time, end_time], side='left')
+        return self._frames_in_time_order(slice(first, last))
+    
+    def frame_range(self, first_frame: int, last_frame: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Frame numbers and video times for frames in [first_frame, last_frame]"""
+        first, last = np.searchsorted(self.frames, [first_frame, last_frame], side='left')
+        last += int(last < len(self.frames) and self.frames[last] == last_frame)
+        return self.frames[first:last], self.video_times[first:last]
+    
+    def to_dict(self) -> Dict:
+        """JSON-serializable form"""
+        return {
+            "fps": self.fps,
+            "total_frames": self.total_frames,
+            "frames": self.frames.tolist(),
+            "timestamps": self.timestamps.tolist(),
+            "video_times": self.video_times.tolist()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FrameTimeIndex':
+        """Rebuild an index from to_dict() output"""
+        return cls(data["frames"], data["timestamps"], data["video_times"],
+                   fps=data["fps"], total_frames=data["total_frames"])
+    
+    def save(self, path: str):
+        """Save the index as a compressed .npz file"""
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, frames=self.frames, timestamps=self.timestamps,
+                                video_times=self.video_times, fps=self.fps,
+                                total_frames=self.total_frames)
+    
+    @classmethod
+    def load(cls, path: str) -> 'FrameTimeIndex':
+        """Load an index saved with save()"""
+        with np.load(path) as data:
+            return cls(data['frames'], data['timestamps'], data['video_times'],
+                       fps=float(data['fps']), total_frames=int(data['total_frames']))
+
+def _last_per_frame(frame_numbers: np.ndarray) -> np.ndarray:
+    """Positions of the last record for each frame number, in frame order"""
+    order = np.argsort(frame_numbers, kind='stable')
+    ordered = frame_numbers[order]
+    return order[np.append(ordered[1:] != ordered[:-1], True)] if ordered.size else order
+
+def _frame_runs(frame_numbers: np.ndarray) -> List[List[int]]:
+    """Collapse frame numbers into [first, last] runs of consecutive frames"""
+    if not frame_numbers.size:
+        return []
+    frame_numbers = np.sort(frame_numbers)
+    breaks = np.flatnonzero(np.diff(frame_numbers) != 1)
+    starts = np.append(frame_numbers[0], frame_numbers[breaks + 1])
+    ends = np.append(frame_numbers[breaks], frame_numbers[-1])
+    return [[int(start), int(end)] for start, end in zip(starts, ends)]
+
+def _align_by_timestamp(left_times: np.ndarray, right_times: np.ndarray,
+                        tolerance: float = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair each left record with the nearest right record in time
+    
+    Pairs further apart than tolerance (default: half the median left
+    frame interval) are dropped, as are later pairs reusing a right record.
+    
+    Returns:
+        (left positions, right positions) of the aligned pairs
+    """
+    left = np.flatnonzero(~np.isnan(left_times))
+    right = np.flatnonzero(~np.isnan(right_times))
+    if not left.size or not right.size:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    left = left[np.argsort(left_times[left], kind='stable')]
+    right = right[np.argsort(right_times[right], kind='stable')]
+    sorted_right = right_times[right]
+    
+    if tolerance is None:
+        intervals = np.diff(left_times[left])
+        intervals = intervals[intervals > 0]
+        tolerance = float(np.median(intervals)) / 2 if intervals.size else 0.0
+    
+    query = left_times[left]
+    after = np.minimum(np.searchsorted(sorted_right, query), len(right) - 1)
+    before = np.maximum(after - 1, 0)
+    nearest = np.where(np.abs(sorted_right[after] - query) < np.abs(query - sorted_right[before]), after, before)
+    close = np.abs(sorted_right[nearest] - query) <= tolerance
+    left, nearest = left[close], nearest[close]
+    # Matches are non-decreasing, so a reused right record is adjacent
+    first_use = np.append(True, nearest[1:] != nearest[:-1]) if nearest.size else np.zeros(0, bool)
+    return left[first_use], right[nearest[first_use]]
+
+def diff_frame_sources(left, right, align: str = 'frame',
+                       atol: float = DIFF_ATOL, rtol: float = DIFF_RTOL,
+                       time_tolerance: float = None) -> Dict:
+    """
+    Compare two sources of per-frame analytics frame by frame
+    
+    Records are aligned by frame number or by nearest timestamp, and every
+    metric both sides share is compared with a tolerance. One exact
+    equality pass over the aligned rows picks out the rows that differ at
+    all; only those are compared with the tolerance.
+    
+    Args:
+        left: FrameTable or payload of the first source (e.g. /getAnalytics)
+        right: FrameTable or payload of the second source (e.g. /getPerFrameStatistics)
+        align: 'frame' to pair equal frame numbers, 'timestamp' to pair
+            nearest timestamps
+        atol: Absolute tolerance
+        rtol: Tolerance relative to the right-hand value
+        time_tolerance: Largest timestamp difference for a pair when
+            aligning by timestamp (default: half a frame interval)
+            
+    Returns:
+        Report with alignment counts, frame ranges missing from either
+        side, per-metric max/mean deltas and mismatch counts, and the first
+        divergent frame
+    """
+    left = FrameTable.coerce(left)
+    right = FrameTable.coerce(right)
+    left_frames, left_times, left_columns = left.frame_numbers, left.timestamps, left.metrics
+    right_frames, right_times, right_columns = right.frame_numbers, right.timestamps, right.metrics
+    
+    if align == 'frame':
+        left_last = _last_per_frame(left_frames)
+        right_last = _last_per_frame(right_frames)
+        _, left_pos, right_pos = np.intersect1d(left_frames[left_last], right_frames[right_last],
+                                                assume_unique=True, return_indices=True)
+        left_rows, right_rows = left_last[left_pos], right_last[right_pos]
+        left_only = np.delete(left_frames[left_last], left_pos)
+        right_only = np.delete(right_frames[right_last], right_pos)
+    elif align == 'timestamp':
+        left_rows, right_rows = _align_by_timestamp(left_times, right_times, time_tolerance)
+        order = np.argsort(left_frames[left_rows], kind='stable')
+        left_rows, right_rows = left_rows[order], right_rows[order]
+        left_only = np.delete(left_frames, left_rows)
+        right_only = np.delete(right_frames, right_rows)
+        left_only = left_only[_last_per_frame(left_only)]
+        right_only = right_only[_last_per_frame(right_only)]
+    else:
+        raise ValueError(f"Unknown alignment: {align}")
+    
+    common = sorted(set(left_columns) & set(right_columns))
+    aligned_frames = left_frames[left_rows]
+    
+    report = {
+        "align": align,
+        "left_frames": int(left_frames.size),
+        "right_frames": int(right_frames.size),
+        "aligned_frames": int(left_rows.size),
+        "left_only_count": int(left_only.size),
+        "left_only_ranges": _frame_runs(left_only)[:MAX_REPORTED_RANGES],
+        "right_only_count": int(right_only.size),
+        "right_only_ranges": _frame_runs(right_only)[:MAX_REPORTED_RANGES],
+        "common_metrics": common,
+        "left_only_metrics": sorted(set(left_columns) - set(right_columns)),
+        "right_only_metrics": sorted(set(right_columns) - set(left_columns)),
+        "identical_rows": 0,
+        "metrics": {},
+        "first_divergent_frame": None
+    }
+    if not common or not left_rows.size:
+        report["identical"] = not (left_only.size or right_only.size)
+        return report
+    
+    left_matrix = np.column_stack([left_columns[name][left_rows].astype(np.float64) for name in common])
+    right_matrix = np.column_stack([right_columns[name][right_rows].astype(np.float64) for name in common])
+    
+    # Only rows that differ exactly need the tolerance comparison
+    left_missing = np.isnan(left_matrix)
+    right_missing = np.isnan(right_matrix)
+    same = (left_matrix == right_matrix) | (left_missing & right_missing)
+    rows = np.flatnonzero(~same.all(axis=1))
+    report["identical_rows"] = int(left_rows.size - rows.size)
+    
+    compared = (~left_missing & ~right_missing).sum(axis=0)
+    max_delta = np.zeros(len(common))
+    delta_sum = np.zeros(len(common))
+    mismatches = np.zeros(len(common), dtype=np.int64)
+    first_divergent = [None] * len(common)
+    
+    if rows.size:
+        left_values = left_matrix[rows]
+        right_values = right_matrix[rows]
+        delta = np.abs(left_values - right_values)
+        one_missing = left_missing[rows] != right_missing[rows]
+        mismatch = one_missing | (delta > atol + rtol * np.abs(right_values))
+        delta = np.nan_to_num(delta, nan=0.0)
+        
+        max_delta = delta.max(axis=0)
+        delta_sum = delta.sum(axis=0)
+        mismatches = mismatch.sum(axis=0)
+        for column in np.flatnonzero(mismatches):
+            first_divergent[column] = int(aligned_frames[rows[np.argmax(mismatch[:, column])]])
+    
+    for column, name in enumerate(common):
+        report["metrics"][name] = {
+            "compared": int(compared[column]),
+            "mismatches": int(mismatches[column]),
+            "max_abs_delta": float(max_delta[column]),
+            "mean_abs_delta": float(delta_sum[column] / compared[column]) if compared[column] else 0.0,
+            "first_divergent_frame": first_divergent[column]
+        }
+    
+    divergent = [frame for frame in first_divergent if frame is not None]
+    report["first_divergent_frame"] = min(divergent) if divergent else None
+    report["identical"] = not (divergent or left_only.size or right_only.size)
+    return report
+
 class RealCloudflareIntegrationTester:
-    def __init__(self, backend_url: str = "https://gymnasticsapi.onrender.com"):
+    def __init__(self, backend_url: str = "https://gymnasticsapi.onrender.com",
+                 cache: Optional[AnalyticsCache] = None, store: Optional[SessionStore] = None):
         """
         Initialize the tester with backend server URL
         
         Args:
             backend_url: URL of the gymnastics analytics backend server
+            cache: Local cache for analytics and per-frame statistics (optional)
+            store: Local session mirror; sessions are synced into it and
+                queried locally (optional)
         """
         self.backend_url = backend_url.rstrip('/')
-        self.session = requests.Session()
+        self.client = ApiClient(self.backend_url)
+        self.cache = cache
+        self.store = store
         
         # Test server connectivity
         self.test_server_connection()
@@ -39,7 +603,7 @@ class RealCloudflareIntegrationTester:
     def test_server_connection(self):
         """Test if the backend server is accessible"""
         try:
-            response = self.session.get(f"{self.backend_url}/health", timeout=5)
+            response = self.client.get("/health", timeout=5)
             if response.status_code == 200:
                 logger.info("✅ Backend server is accessible")
                 return True
@@ -50,44 +614,125 @@ class RealCloudflareIntegrationTester:
             logger.error(f"❌ Cannot connect to backend server: {e}")
             return False
     
+    def sync_sessions(self) -> bool:
+        """Pull new and changed sessions into the local store; False if the backend was unreachable"""
+        try:
+            self.store.sync(self.client)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error syncing sessions: {e}")
+            return False
+    
     def get_sessions(self) -> List[Dict]:
-        """Get all sessions from the backend"""
+        """Get all sessions, from the synced local store when there is one"""
+        if self.store:
+            if not self.sync_sessions() and self.store.count():
+                logger.warning("⚠️ Using the local copy of the sessions")
+            sessions = self.store.sessions()
+            logger.info(f"📊 {len(sessions)} sessions in local store")
+            return sessions
+        sessions = list(self.iter_sessions())
+        logger.info(f"📊 Retrieved {len(sessions)} valid sessions")
+        return sessions
+    
+    def _stream_items(self, path: str, array_paths: Sequence[Tuple[str, ...]],
+                      **kwargs) -> Iterator:
+        """
+        Stream a GET response and yield its array elements as they are parsed
+        
+        Args:
+            path: Endpoint path relative to the backend URL
+            array_paths: Candidate key paths to the array (see iter_json_items)
+            **kwargs: Passed to ApiClient.get
+        """
+        response = self.client.get(path, stream=True, **kwargs)
         try:
-            response = self.session.get(f"{self.backend_url}/getSessions")
-            if response.status_code == 200:
-                data = response.json()
-                
-                # The API returns a dict with 'count' and 'sessions' keys
-                if isinstance(data, dict) and 'sessions' in data:
-                    sessions = data['sessions']
-                    logger.info(f"✅ Retrieved {len(sessions)} sessions (total: {data.get('count', len(sessions))})")
+            if response.status_code != 200:
+                logger.error(f"❌ Failed to stream {path}: {response.status_code}")
+                return
+            yield from iter_json_items(response.iter_content(chunk_size=65536), array_paths)
+        finally:
+            response.close()
+    
+    def iter_sessions(self) -> Iterator[Dict]:
+        """Yield sessions one at a time while /getSessions is still downloading"""
+        try:
+            for session in self._stream_items("/getSessions", SESSION_ARRAY_PATHS):
+                if isinstance(session, dict):
+                    yield session
                 else:
-                    # Fallback: treat as direct array
-                    sessions = data if isinstance(data, list) else []
-                    logger.info(f"✅ Retrieved {len(sessions)} sessions (direct array)")
-                
-                # Ensure sessions are dictionaries
-                processed_sessions = []
-                for session in sessions:
-                    if isinstance(session, dict):
-                        processed_sessions.append(session)
-                    else:
-                        logger.warning(f"⚠️ Unexpected session type: {type(session)}")
-                        continue
-                
-                logger.info(f"📊 Processed {len(processed_sessions)} valid sessions")
-                return processed_sessions
-            else:
-                logger.error(f"❌ Failed to get sessions: {response.status_code}")
-                return []
-        except Exception as e:
-            logger.error(f"❌ Error getting sessions: {e}")
-            return []
+                    logger.warning(f"⚠️ Unexpected session type: {type(session)}")
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"❌ Error streaming sessions: {e}")
+    
+    def _iter_cached_items(self, key: str, path: str, array_paths: Sequence[Tuple[str, ...]],
+                           max_age: Optional[float] = None, **kwargs) -> Iterator[Dict]:
+        """
+        Yield records from the cache, or stream them and cache them as they pass
+        
+        Either way records are parsed one at a time: cached payloads are
+        decompressed incrementally, and streamed records are serialized
+        straight into a cache temp file that is only published once the
+        stream completes. A stream that fails part way raises and is never
+        cached.
+        """
+        if self.cache:
+            chunks = self.cache.iter_raw(key, max_age=max_age)
+            if chunks is not None:
+                yield from iter_json_items(chunks, array_paths)
+                return
+        writer = self.cache.open_writer(key) if self.cache else None
+        
+        def spool(data: bytes, commit: bool = False):
+            nonlocal writer
+            try:
+                writer.write(data)
+                if commit:
+                    writer.commit()
+            except OSError as e:
+                # A full or unwritable cache must not fail the download
+                logger.warning(f"Could not cache {key}: {e}")
+                writer.close()
+                writer = None
+        
+        try:
+            count = 0
+            for record in self._stream_items(path, array_paths, **kwargs):
+                if writer:
+                    spool((b',' if count else b'[') + json.dumps(record, separators=(',', ':')).encode())
+                count += 1
+                yield record
+            if writer and count:
+                spool(b']', commit=True)
+        finally:
+            if writer:
+                writer.close()
+    
+    def iter_analytics_frames(self, analytics_id: str) -> Iterator[Dict]:
+        """
+        Yield the frame records of an analytics document as they are parsed
+        
+        Raises:
+            requests.RequestException, ValueError: If the stream fails part way
+        """
+        yield from self._iter_cached_items(f"analytics:{analytics_id}", f"/getAnalytics/{analytics_id}",
+                                           ANALYTICS_ARRAY_PATHS)
+    
+    def iter_per_frame_statistics(self, video_filename: str) -> Iterator[Dict]:
+        """
+        Yield per-frame statistics records as they are parsed
+        
+        Raises:
+            requests.RequestException, ValueError: If the stream fails part way
+        """
+        yield from self._iter_cached_items(f"per_frame:{video_filename}", "/getPerFrameStatistics",
+                                           PER_FRAME_ARRAY_PATHS, max_age=PER_FRAME_CACHE_TTL,
+                                           params={"video_filename": video_filename})
     
     def get_session_details(self, session_id: str) -> Optional[Dict]:
         """Get detailed session information"""
         try:
-            response = self.session.get(f"{self.backend_url}/getSession/{session_id}")
+            response = self.client.get(f"/getSession/{session_id}")
             if response.status_code == 200:
                 session = response.json()
                 logger.info(f"✅ Retrieved session details for {session_id}")
@@ -99,45 +744,47 @@ class RealCloudflareIntegrationTester:
             logger.error(f"❌ Error getting session details: {e}")
             return None
     
-    def get_analytics_data(self, analytics_id: str) -> Optional[Dict]:
-        """Get analytics data for a specific analytics ID"""
+    def get_analytics_table(self, analytics_id: str) -> Optional[FrameTable]:
+        """
+        Normalize an analytics document into a FrameTable as it streams in
+        
+        Records come from the cache when available. At most
+        FRAME_TABLE_CHUNK_RECORDS raw records are held at a time either way.
+        """
         try:
-            response = self.session.get(f"{self.backend_url}/getAnalytics/{analytics_id}")
-            if response.status_code == 200:
-                analytics = response.json()
-                logger.info(f"✅ Retrieved analytics data for {analytics_id}")
-                return analytics
-            else:
-                logger.error(f"❌ Failed to get analytics: {response.status_code}")
-                return None
-        except Exception as e:
+            table = FrameTable.from_records(self.iter_analytics_frames(analytics_id))
+        except (requests.RequestException, TypeError, ValueError) as e:
             logger.error(f"❌ Error getting analytics: {e}")
             return None
+        if not len(table):
+            logger.error(f"❌ No analytics frames for {analytics_id}")
+            return None
+        logger.info(f"✅ Retrieved {len(table)} analytics frames for {analytics_id}")
+        return table
     
-    def get_per_frame_statistics(self, video_filename: str) -> Optional[Dict]:
-        """Get per-frame statistics for a video"""
+    def get_per_frame_table(self, video_filename: str) -> Optional[FrameTable]:
+        """Normalize per-frame statistics for a video into a FrameTable as they stream in"""
         try:
-            response = self.session.get(
-                f"{self.backend_url}/getPerFrameStatistics",
-                params={"video_filename": video_filename}
-            )
-            if response.status_code == 200:
-                stats = response.json()
-                logger.info(f"✅ Retrieved per-frame statistics for {video_filename}")
-                return stats
-            else:
-                logger.error(f"❌ Failed to get per-frame statistics: {response.status_code}")
-                return None
-        except Exception as e:
+            table = FrameTable.from_records(self.iter_per_frame_statistics(video_filename))
+        except (requests.RequestException, TypeError, ValueError) as e:
             logger.error(f"❌ Error getting per-frame statistics: {e}")
             return None
+        if not len(table):
+            logger.error(f"❌ No per-frame statistics for {video_filename}")
+            return None
+        logger.info(f"✅ Retrieved per-frame statistics for {video_filename}")
+        return table
     
     def analyze_video_timestamps(self, analytics_data: Dict) -> Dict:
         """
         Analyze timestamp structure and alignment in analytics data
         
+        Every frame is analysed, with all checks vectorized over the
+        columns of a FrameTable.
+        
         Args:
-            analytics_data: Analytics data from backend
+            analytics_data: FrameTable, analytics data from backend, or an
+                iterator of frame records
             
         Returns:
             Analysis results with timestamp information
@@ -151,94 +798,103 @@ class RealCloudflareIntegrationTester:
         }
         
         try:
-            # Extract frame data
-            frame_data = []
-            if isinstance(analytics_data, list):
-                frame_data = analytics_data
-            elif isinstance(analytics_data, dict) and 'analytics' in analytics_data:
-                frame_data = analytics_data['analytics']
-            elif isinstance(analytics_data, dict) and 'frame_data' in analytics_data:
-                frame_data = analytics_data['frame_data']
-            
-            if not frame_data:
+            table = FrameTable.coerce(analytics_data)
+            analysis["total_frames"] = len(table)
+            if not len(table):
                 analysis["alignment_issues"].append("No frame data found in analytics")
                 return analysis
             
-            analysis["total_frames"] = len(frame_data)
-            
-            # Analyze timestamp structure
-            timestamps = []
-            frame_numbers = []
-            relative_timestamps = []
-            
-            for i, frame in enumerate(frame_data[:100]):  # Analyze first 100 frames
-                frame_num = frame.get('frame_number', i)
-                frame_numbers.append(frame_num)
-                
-                # Check for timestamp in different locations
-                timestamp = None
-                if 'timestamp' in frame:
-                    timestamp = frame['timestamp']
-                elif 'metrics' in frame and 'timestamp' in frame['metrics']:
-                    timestamp = frame['metrics']['timestamp']
-                
-                if timestamp:
-                    timestamps.append(timestamp)
-                    
-                    # Check for relative timestamp
-                    if 'metrics' in frame and 'relative_timestamp' in frame['metrics']:
-                        relative_timestamps.append(frame['metrics']['relative_timestamp'])
-                    elif 'relative_timestamp' in frame:
-                        relative_timestamps.append(frame['relative_timestamp'])
+            frame_numbers = table.frame_numbers
+            has_timestamp = table.has_timestamp
+            timestamps = table.timestamps[has_timestamp]
+            relative_timestamps = table.relative_timestamps[has_timestamp]
+            relative_timestamps = relative_timestamps[~np.isnan(relative_timestamps)]
             
             # Analyze timestamp patterns
-            if timestamps:
+            if timestamps.size:
                 analysis["timestamp_info"] = {
-                    "first_timestamp": timestamps[0],
-                    "last_timestamp": timestamps[-1],
-                    "timestamp_range": timestamps[-1] - timestamps[0],
+                    "first_timestamp": float(timestamps[0]),
+                    "last_timestamp": float(timestamps[-1]),
+                    "timestamp_range": float(timestamps[-1] - timestamps[0]),
                     "timestamp_type": "unix" if timestamps[0] > 1000000000 else "relative",
-                    "sample_timestamps": timestamps[:5]
+                    "sample_timestamps": timestamps[:5].tolist()
                 }
                 
                 # Check for timestamp consistency
-                if len(timestamps) > 1:
-                    intervals = [timestamps[i+1] - timestamps[i] for i in range(len(timestamps)-1)]
-                    analysis["timestamp_info"]["average_interval"] = sum(intervals) / len(intervals)
-                    analysis["timestamp_info"]["interval_variance"] = max(intervals) - min(intervals)
+                if timestamps.size > 1:
+                    intervals = np.diff(timestamps)
+                    positive = intervals[intervals > 0]
+                    typical = float(np.median(positive)) if positive.size else 0.0
+                    gaps = intervals > TIMESTAMP_GAP_FACTOR * typical if typical else np.zeros(intervals.size, bool)
+                    
+                    analysis["timestamp_info"].update({
+                        "average_interval": float(intervals.mean()),
+                        "median_interval": typical,
+                        "min_interval": float(intervals.min()),
+                        "max_interval": float(intervals.max()),
+                        "interval_variance": float(intervals.var()),
+                        "interval_std": float(intervals.std()),
+                        "interval_range": float(intervals.max() - intervals.min()),
+                        "gap_count": int(gaps.sum()),
+                        "gap_positions": (np.flatnonzero(gaps)[:10] + 1).tolist(),
+                        "duplicate_timestamp_count": int((intervals == 0).sum()),
+                        "backward_timestamp_count": int((intervals < 0).sum())
+                    })
             
-            if relative_timestamps:
+            if relative_timestamps.size:
                 analysis["timestamp_info"]["relative_timestamps"] = {
-                    "first_relative": relative_timestamps[0],
-                    "last_relative": relative_timestamps[-1],
-                    "relative_range": relative_timestamps[-1] - relative_timestamps[0],
-                    "sample_relative": relative_timestamps[:5]
+                    "first_relative": float(relative_timestamps[0]),
+                    "last_relative": float(relative_timestamps[-1]),
+                    "relative_range": float(relative_timestamps[-1] - relative_timestamps[0]),
+                    "sample_relative": relative_timestamps[:5].tolist()
                 }
             
             # Check frame number consistency
-            if frame_numbers:
-                expected_frame_numbers = list(range(min(frame_numbers), min(frame_numbers) + len(frame_numbers)))
-                if frame_numbers != expected_frame_numbers:
-                    analysis["alignment_issues"].append("Frame numbers are not sequential")
-                
-                analysis["frame_structure"] = {
-                    "first_frame": min(frame_numbers),
-                    "last_frame": max(frame_numbers),
-                    "frame_count": len(frame_numbers),
-                    "frame_interval": frame_numbers[1] - frame_numbers[0] if len(frame_numbers) > 1 else 1
-                }
+            first_frame = int(frame_numbers.min())
+            steps = np.diff(frame_numbers)
+            non_sequential = int((steps != 1).sum())
+            # Distinct frame numbers; sorting is only needed when out of order
+            ordered = frame_numbers if (steps >= 0).all() else np.sort(frame_numbers)
+            unique_frames = 1 + int(np.count_nonzero(np.diff(ordered)))
+            if non_sequential:
+                analysis["alignment_issues"].append("Frame numbers are not sequential")
+            
+            analysis["frame_structure"] = {
+                "first_frame": first_frame,
+                "last_frame": int(frame_numbers.max()),
+                "frame_count": int(frame_numbers.size),
+                "frame_interval": int(steps[0]) if steps.size else 1,
+                "non_sequential_count": non_sequential,
+                "duplicate_frame_count": int(frame_numbers.size - unique_frames),
+                "missing_frame_count": int(frame_numbers.max() - first_frame + 1 - unique_frames)
+            }
+            
+            ts_info = analysis["timestamp_info"]
+            if ts_info.get("gap_count"):
+                analysis["alignment_issues"].append(
+                    f"{ts_info['gap_count']} timestamp gaps longer than "
+                    f"{TIMESTAMP_GAP_FACTOR}x the median interval"
+                )
+            if ts_info.get("duplicate_timestamp_count"):
+                analysis["alignment_issues"].append(
+                    f"{ts_info['duplicate_timestamp_count']} frames repeat the previous timestamp"
+                )
+            if ts_info.get("backward_timestamp_count"):
+                analysis["alignment_issues"].append(
+                    f"{ts_info['backward_timestamp_count']} timestamps go backwards"
+                )
             
             # Generate recommendations
-            if not timestamps:
+            if not timestamps.size:
                 analysis["recommendations"].append("Add timestamps to frame data")
             
-            if not relative_timestamps:
+            if not relative_timestamps.size:
                 analysis["recommendations"].append("Convert timestamps to relative time for video sync")
             
-            if analysis["timestamp_info"].get("timestamp_type") == "unix":
+            if ts_info.get("timestamp_type") == "unix":
                 analysis["recommendations"].append("Convert Unix timestamps to relative time")
             
-            if analysis["timestamp_info"].get("interval_variance", 0) > 1.0:
+            if ts_info.get("interval_range", 0) > 1.0:
                 analysis["recommendations"].append("Timestamp intervals are inconsistent - check frame rate")
             
         except Exception as e:
@@ -247,113 +903,70 @@ class RealCloudflareIntegrationTester:
         
         return analysis
     
-    def generate_frame_timestamp_mapping(self, analytics_data: Dict, video_fps: float = 30.0) -> Dict:
+    def generate_frame_timestamp_mapping(self, analytics_data: Dict, video_fps: float = 30.0) -> FrameTimeIndex:
         """
         Generate a mapping between frame numbers and timestamps for video synchronization
         
         Args:
-            analytics_data: Analytics data from backend
+            analytics_data: FrameTable, analytics data from backend, or an
+                iterator of frame records
             video_fps: Video frame rate (default 30 FPS)
             
         Returns:
-            Frame timestamp mapping
-        """
-        mapping = {
-            "frame_to_timestamp": {},
-            "timestamp_to_frame": {},
-            "frame_to_video_time": {},
-            "video_time_to_frame": {},
-            "metadata": {
-                "fps": video_fps,
-                "total_frames": 0,
-                "video_duration": 0
-            }
-        }
-        
+            Frame/time index (empty if the data could not be read)
+        """
         try:
-            # Extract frame data
-            frame_data = []
-            if isinstance(analytics_data, list):
-                frame_data = analytics_data
-            elif isinstance(analytics_data, dict) and 'analytics' in analytics_data:
-                frame_data = analytics_data['analytics']
-            elif isinstance(analytics_data, dict) and 'frame_data' in analytics_data:
-                frame_data = analytics_data['frame_data']
-            
-            if not frame_data:
-                return mapping
-            
-            mapping["metadata"]["total_frames"] = len(frame_data)
-            
-            for frame in frame_data:
-                frame_num = frame.get('frame_number', 0)
-                
-                # Get timestamp
-                timestamp = None
-                if 'timestamp' in frame:
-                    timestamp = frame['timestamp']
-                elif 'metrics' in frame and 'timestamp' in frame['metrics']:
-                    timestamp = frame['metrics']['timestamp']
-                
-                if timestamp:
-                    # Calculate video time (seconds)
-                    if timestamp > 1000000000:  # Unix timestamp
-                        # Convert to relative time (this should be done by backend)
-                        video_time = timestamp / 1000  # Convert to seconds
-                    else:  # Relative timestamp
-                        video_time = timestamp
-                    
-                    # Store mappings
-                    mapping["frame_to_timestamp"][frame_num] = timestamp
-                    mapping["timestamp_to_frame"][timestamp] = frame_num
-                    mapping["frame_to_video_time"][frame_num] = video_time
-                    mapping["video_time_to_frame"][video_time] = frame_num
-            
-            # Calculate video duration
-            if mapping["frame_to_video_time"]:
-                max_time = max(mapping["frame_to_video_time"].values())
-                mapping["metadata"]["video_duration"] = max_time
-            
-            logger.info(f"✅ Generated frame mapping for {len(frame_data)} frames")
-            
+            index = FrameTimeIndex.from_table(FrameTable.coerce(analytics_data), fps=video_fps)
+            if index.total_frames:
+                logger.info(f"✅ Generated frame mapping for {index.total_frames} frames "
+                            f"({index.nbytes / 1024:.1f} KB)")
+            return index
         except Exception as e:
             logger.error(f"Error generating frame mapping: {e}")
-        
-        return mapping
+            return FrameTimeIndex([], [], [], fps=video_fps)
     
     def test_cloudflare_stream_integration(self):
         """Test the complete Cloudflare Stream integration workflow"""
         logger.info("🧪 Starting Cloudflare Stream Integration Test")
         
-        # Step 1: Get all sessions
-        sessions = self.get_sessions()
-        if not sessions:
+        # Steps 1-2: Find a session with a Cloudflare Stream video, remembering
+        # the first session with analytics as a fallback. With a local store
+        # this is an indexed query after an incremental sync; otherwise the
+        # session list is streamed until a match turns up.
+        test_session = None
+        fallback_session = None
+        scanned = 0
+        if self.store:
+            self.sync_sessions()
+            scanned = self.store.count()
+            test_session = next(iter(self.store.with_cloudflare_video(limit=1)), None)
+            fallback_session = next(iter(self.store.with_analytics(limit=1)), None)
+        else:
+            for session in self.iter_sessions():
+                scanned += 1
+                if (session.get('meta', {}).get('cloudflare_stream_id') or 
+                    session.get('meta', {}).get('cloudflare_uid')):
+                    test_session = session
+                    break
+                if fallback_session is None and session.get('analytics_id'):
+                    fallback_session = session
+        
+        if not scanned:
             logger.error("❌ No sessions found - cannot test integration")
             return
         
-        logger.info(f"📊 Found {len(sessions)} sessions")
-        
-        # Step 2: Find sessions with Cloudflare Stream videos
-        cloudflare_sessions = []
-        for session in sessions:
-            if (session.get('meta', {}).get('cloudflare_stream_id') or 
-                session.get('meta', {}).get('cloudflare_uid')):
-                cloudflare_sessions.append(session)
+        logger.info(f"📊 Scanned {scanned} sessions")
         
-        if not cloudflare_sessions:
+        if test_session is None:
             logger.warning("⚠️ No sessions with Cloudflare Stream videos found")
             # Test with any session that has analytics
-            for session in sessions:
-                if session.get('analytics_id'):
-                    cloudflare_sessions.append(session)
-                    break
+            test_session = fallback_session
         
-        if not cloudflare_sessions:
+        if test_session is None:
             logger.error("❌ No sessions with analytics found")
             return
         
         # Step 3: Test with first available session
-        test_session = cloudflare_sessions[0]
         session_id = test_session['_id']
         logger.info(f"🎯 Testing with session: {session_id}")
         
@@ -372,42 +985,43 @@ class RealCloudflareIntegrationTester:
             return
         
         logger.info(f"📊 Getting analytics for ID: {analytics_id}")
-        analytics_data = self.get_analytics_data(analytics_id)
-        if not analytics_data:
+        # Frames are normalized once, as they stream in, for every analysis below
+        frame_table = self.get_analytics_table(analytics_id)
+        if frame_table is None:
             logger.error("❌ Failed to get analytics data")
             return
         
         # Step 6: Analyze timestamp structure
         logger.info("🔍 Analyzing timestamp structure...")
-        timestamp_analysis = self.analyze_video_timestamps(analytics_data)
+        timestamp_analysis = self.analyze_video_timestamps(frame_table)
         
         # Step 7: Generate frame mapping
         logger.info("🗺️ Generating frame timestamp mapping...")
-        frame_mapping = self.generate_frame_timestamp_mapping(analytics_data)
+        frame_mapping = self.generate_frame_timestamp_mapping(frame_table)
         
         # Step 8: Display results
-        self.display_integration_results(test_session, session_details, analytics_data, 
+        self.display_integration_results(test_session, session_details, frame_table, 
                                        timestamp_analysis, frame_mapping)
         
         # Step 9: Test video filename-based analytics
         video_filename = session_details.get('original_filename') or session_details.get('processed_video_filename')
         if video_filename:
             logger.info(f"🎬 Testing per-frame statistics for: {video_filename}")
-            per_frame_stats = self.get_per_frame_statistics(video_filename)
-            if per_frame_stats:
+            per_frame_stats = self.get_per_frame_table(video_filename)
+            if per_frame_stats is not None:
                 logger.info("✅ Per-frame statistics retrieved successfully")
                 # Compare with analytics data
-                self.compare_analytics_sources(analytics_data, per_frame_stats)
+                self.compare_analytics_sources(frame_table, per_frame_stats)
         
         return {
             "session": test_session,
             "session_details": session_details,
-            "analytics_data": analytics_data,
+            "frame_table": frame_table,
             "timestamp_analysis": timestamp_analysis,
             "frame_mapping": frame_mapping
         }
     
-    def display_integration_results(self, session, session_details, analytics_data, 
+    def display_integration_results(self, session, session_details, frame_table, 
                                   timestamp_analysis, frame_mapping):
         """Display the integration test results"""
         print("\n" + "="*80)
@@ -442,17 +1056,16 @@ class RealCloudflareIntegrationTester:
                 print(f"   Average Interval: {ts_info['average_interval']:.3f}")
         
         # Frame Mapping
-        if frame_mapping['metadata']['total_frames'] > 0:
+        metadata = frame_mapping.metadata
+        if metadata['total_frames'] > 0:
             print(f"\n🗺️ FRAME MAPPING:")
-            print(f"   Total Frames: {frame_mapping['metadata']['total_frames']}")
-            print(f"   Video Duration: {frame_mapping['metadata']['video_duration']:.2f} seconds")
-            print(f"   FPS: {frame_mapping['metadata']['fps']}")
+            print(f"   Total Frames: {metadata['total_frames']}")
+            print(f"   Video Duration: {metadata['video_duration']:.2f} seconds")
+            print(f"   FPS: {metadata['fps']}")
             
             # Show sample mappings
-            sample_frames = list(frame_mapping['frame_to_video_time'].keys())[:5]
             print(f"   Sample Frame Mappings:")
-            for frame_num in sample_frames:
-                video_time = frame_mapping['frame_to_video_time'][frame_num]
+            for frame_num, video_time in zip(frame_mapping.frames[:5], frame_mapping.video_times[:5]):
                 print(f"     Frame {frame_num}: {video_time:.3f}s")
         
         # Issues and Recommendations
@@ -468,38 +1081,277 @@ class RealCloudflareIntegrationTester:
         
         print("\n" + "="*80)
     
-    def compare_analytics_sources(self, analytics_data, per_frame_stats):
-        """Compare analytics from different sources"""
-        print(f"\n🔍 ANALYTICS SOURCE COMPARISON:")
+    def compare_analytics_sources(self, analytics_data, per_frame_stats, align: str = 'frame') -> Dict:
+        """
+        Compare analytics from different sources frame by frame
         
-        # Extract frame counts
-        analytics_frames = 0
-        if isinstance(analytics_data, list):
-            analytics_frames = len(analytics_data)
-        elif isinstance(analytics_data, dict) and 'analytics' in analytics_data:
-            analytics_frames = len(analytics_data['analytics'])
+        Args:
+            analytics_data: FrameTable or payload from /getAnalytics
+            per_frame_stats: FrameTable or payload from /getPerFrameStatistics
+            align: 'frame' or 'timestamp' (see diff_frame_sources)
+            
+        Returns:
+            Report from diff_frame_sources
+        """
+        print(f"\n🔍 ANALYTICS SOURCE COMPARISON:")
         
-        per_frame_frames = 0
-        if isinstance(per_frame_stats, list):
-            per_frame_frames = len(per_frame_stats)
-        elif isinstance(per_frame_stats, dict) and 'frame_data' in per_frame_stats:
-            per_frame_frames = len(per_frame_stats['frame_data'])
+        report = diff_frame_sources(analytics_data, per_frame_stats, align=align)
         
-        print(f"   Analytics API frames: {analytics_frames}")
-        print(f"   Per-frame API frames: {per_frame_frames}")
+        print(f"   Analytics API frames: {report['left_frames']}")
+        print(f"   Per-frame API frames: {report['right_frames']}")
+        print(f"   Aligned by {align}: {report['aligned_frames']} frames "
+              f"({report['identical_rows']} identical)")
         
-        if analytics_frames != per_frame_frames:
+        if report['left_frames'] != report['right_frames']:
             print(f"   ⚠️ Frame count mismatch between sources")
         else:
             print(f"   ✅ Frame counts match between sources")
+        
+        if report['left_only_count']:
+            print(f"   Only in analytics: {report['left_only_count']} frames {report['left_only_ranges']}")
+        if report['right_only_count']:
+            print(f"   Only in per-frame statistics: {report['right_only_count']} frames {report['right_only_ranges']}")
+        if report['left_only_metrics'] or report['right_only_metrics']:
+            print(f"   Metrics on one side only: {report['left_only_metrics'] + report['right_only_metrics']}")
+        
+        if report['first_divergent_frame'] is None:
+            print(f"   ✅ {len(report['common_metrics'])} shared metrics agree on every aligned frame")
+        else:
+            print(f"   ⚠️ First divergent frame: {report['first_divergent_frame']}")
+            for name, stats in report['metrics'].items():
+                if stats['mismatches']:
+                    print(f"     {name}: {stats['mismatches']}/{stats['compared']} frames differ, "
+                          f"max Δ {stats['max_abs_delta']:.4g}, mean Δ {stats['mean_abs_delta']:.4g}, "
+                          f"first at frame {stats['first_divergent_frame']}")
+        
+        return report
+
+class AsyncRateLimiter:
+    """Token bucket limiting request starts per host"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Requests per second allowed for each host
+            burst: Requests a host may make back to back before throttling
+        """
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self, host: str):
+        """Wait until a request to host may start"""
+        while True:
+            async with self.lock:
+                tokens, updated = self.buckets.get(host, (self.burst, time.monotonic()))
+                now = time.monotonic()
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            await asyncio.sleep(wait)
+
+class AsyncSessionCrawler:
+    """
+    Validate every session concurrently against the backend
+    
+    Each session goes through the same steps as
+    test_cloudflare_stream_integration: session details, analytics,
+    timestamp analysis, frame mapping and per-frame statistics. Sessions
+    are handed to a fixed set of workers through a bounded queue, so only
+    the concurrency limit's worth are in flight at once. The tester's
+    blocking calls and the CPU-bound analysis run on a thread pool of the
+    same size, keeping the event loop free. Each request waits for the
+    per-host rate limiter, and every session's result is appended to a
+    JSON Lines file as soon as it is done.
+    """
+    
+    def __init__(self, tester: 'RealCloudflareIntegrationTester', concurrency: int = 8,
+                 requests_per_second: float = 5.0, output_file: str = None):
+        """
+        Args:
+            tester: Tester whose backend methods are used for each request
+            concurrency: Sessions processed at the same time
+            requests_per_second: Request rate allowed per backend host
+            output_file: JSON Lines results file (optional)
+        """
+        self.tester = tester
+        self.concurrency = concurrency
+        self.limiter = AsyncRateLimiter(requests_per_second, burst=concurrency)
+        self.host = urlparse(tester.backend_url).netloc
+        if not output_file:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = f"cloudflare_session_crawl_{timestamp}.jsonl"
+        self.output_file = output_file
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        
+        # Let every worker thread keep its own pooled connection
+        tester.client.set_pool_size(concurrency)
+    
+    async def _call(self, method: Callable, *args, limited: bool = True):
+        """Run one blocking backend call once the rate limiter allows it"""
+        if limited:
+            await self.limiter.acquire(self.host)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, method, *args)
+    
+    def _analyse_table(self, frame_table: FrameTable) -> Tuple[Dict, Dict]:
+        """Timestamp analysis and frame mapping metadata for one session"""
+        return (self.tester.analyze_video_timestamps(frame_table),
+                self.tester.generate_frame_timestamp_mapping(frame_table).metadata)
+    
+    async def crawl_session(self, session: Dict) -> Dict:
+        """
+        Fetch and analyse one session
+        
+        Returns:
+            JSON-serializable result for the session
+        """
+        session_id = session.get('_id')
+        result = {"session_id": session_id, "status": "ok", "issues": []}
+        start = time.perf_counter()
+        
+        session_details = await self._call(self.tester.get_session_details, session_id)
+        if not session_details:
+            result["status"] = "error"
+            result["issues"].append("Failed to get session details")
+            return result
+        
+        analytics_id = (session_details.get('analytics_id') or
+                        session_details.get('gridfs_analytics_id'))
+        result["analytics_id"] = analytics_id
+        meta = session_details.get('meta', {})
+        result["cloudflare_uid"] = meta.get('cloudflare_uid') or meta.get('cloudflare_stream_id')
+        
+        if not analytics_id:
+            result["status"] = "skipped"
+            result["issues"].append("No analytics ID found in session")
+            return result
+        
+        # Cache hits never reach the backend, so they skip the rate limiter
+        cache = self.tester.cache
+        cached = cache is not None and cache.contains(f"analytics:{analytics_id}")
+        frame_table = await self._call(self.tester.get_analytics_table, analytics_id, limited=not cached)
+        if frame_table is None:
+            result["status"] = "error"
+            result["issues"].append("Failed to get analytics data")
+            return result
+        
+        result["timestamp_analysis"], result["frame_mapping_metadata"] = await self._call(
+            self._analyse_table, frame_table, limited=False)
+        result["issues"].extend(result["timestamp_analysis"]["alignment_issues"])
+        
+        video_filename = session_details.get('original_filename') or session_details.get('processed_video_filename')
+        if video_filename:
+            cached = cache is not None and cache.contains(f"per_frame:{video_filename}",
+                                                          max_age=PER_FRAME_CACHE_TTL)
+            per_frame_stats = await self._call(self.tester.get_per_frame_table, video_filename,
+                                               limited=not cached)
+            result["per_frame_statistics_available"] = per_frame_stats is not None
+            if per_frame_stats is not None:
+                result["source_diff"] = await self._call(diff_frame_sources, frame_table, per_frame_stats,
+                                                         limited=False)
+        
+        result["elapsed_seconds"] = time.perf_counter() - start
+        return result
+    
+    async def crawl(self, sessions: Iterable[Dict] = None) -> Dict:
+        """
+        Crawl all sessions, writing results as they complete
+        
+        Args:
+            sessions: Sessions to validate, consumed only as workers free up
+                (default: fetch /getSessions)
+            
+        Returns:
+            Summary counts by status
+        """
+        if sessions is None:
+            sessions = await self._call(self.tester.get_sessions)
+        
+        summary = {"total": 0, "ok": 0, "skipped": 0, "error": 0, "output_file": self.output_file}
+        total = len(sessions) if hasattr(sessions, '__len__') else None
+        pending = asyncio.Queue(maxsize=self.concurrency)
+        start = time.perf_counter()
+        
+        with open(self.output_file, 'w') as out:
+            async def worker():
+                while True:
+                    session = await pending.get()
+                    if session is None:
+                        return
+                    try:
+                        result = await self.crawl_session(session)
+                    except Exception as e:
+                        result = {"session_id": session.get('_id'), "status": "error", "issues": [str(e)]}
+                    out.write(json.dumps(result, default=str) + "\n")
+                    out.flush()
+                    summary[result["status"]] += 1
+                    done = summary["ok"] + summary["skipped"] + summary["error"]
+                    if done % 10 == 0 or done == total:
+                        logger.info(f"🕸️ Crawled {done}/{total or '?'} sessions")
+            
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                for session in sessions:
+                    await pending.put(session)
+                    summary["total"] += 1
+                for _ in workers:
+                    await pending.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+        
+        self.executor.shutdown()
+        summary["elapsed_seconds"] = time.perf_counter() - start
+        logger.info(f"✅ Crawl complete: {summary}")
+        return summary
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Cloudflare Stream integration test")
+    parser.add_argument("--backend-url", default="https://gymnasticsapi.onrender.com",
+                        help="Gymnastics analytics backend URL")
+    parser.add_argument("--crawl", action="store_true",
+                        help="Validate every session concurrently instead of the first one")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Sessions processed at once when crawling")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="Requests per second per host when crawling")
+    parser.add_argument("--output", help="JSON Lines results file when crawling")
+    parser.add_argument("--cache-dir", default=ANALYTICS_CACHE_DIR,
+                        help="Local cache for analytics and per-frame statistics")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always download analytics instead of using the local cache")
+    parser.add_argument("--no-session-store", action="store_true",
+                        help="Download the session list instead of syncing a local SQLite copy")
+    return parser.parse_args()
 
 def main():
     """Main test function"""
+    args = parse_args()
+    
     print("Cloudflare Stream Integration Test")
     print("="*50)
     
     # Initialize tester
-    tester = RealCloudflareIntegrationTester()
+    cache = None if args.no_cache else AnalyticsCache(args.cache_dir)
+    store = None if args.no_session_store else SessionStore.for_backend(args.backend_url)
+    tester = RealCloudflareIntegrationTester(args.backend_url, cache=cache, store=store)
+    
+    if args.crawl:
+        crawler = AsyncSessionCrawler(tester, concurrency=args.concurrency,
+                                      requests_per_second=args.rate, output_file=args.output)
+        summary = asyncio.run(crawler.crawl())
+        print(f"\n📁 Per-session results saved to: {summary['output_file']}")
+        tester.client.log_stats()
+        if cache:
+            cache.log_stats()
+        return
     
     # Run integration test
     results = tester.test_cloudflare_stream_integration()
@@ -518,7 +1370,7 @@ def main():
             "analytics_id": results["session_details"].get("analytics_id"),
             "total_frames": results["timestamp_analysis"]["total_frames"],
             "timestamp_analysis": results["timestamp_analysis"],
-            "frame_mapping_metadata": results["frame_mapping"]["metadata"]
+            "frame_mapping_metadata": results["frame_mapping"].metadata
         }
         
         with open(results_file, 'w') as f:
@@ -527,6 +1379,10 @@ def main():
         print(f"📁 Results saved to: {results_file}")
     else:
         print("\n❌ Integration test failed!")
+    
+    tester.client.log_stats()
+    if cache:
+        cache.log_stats()
 
 if __name__ == "__main__":
     main()
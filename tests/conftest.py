@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+VIDEO_FRAMES = 75
+
+@pytest.fixture(scope="session")
+def video(tmp_path_factory):
+    """Path to a short 30 fps mp4 whose frames each show their own index"""
+    cv2 = pytest.importorskip("cv2")
+    path = str(tmp_path_factory.mktemp("video") / "numbered.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (96, 64))
+    if not writer.isOpened():
+        pytest.skip("No mp4v encoder available")
+    for i in range(VIDEO_FRAMES):
+        # Every frame looks different so a misplaced seek changes the pixels
+        image = np.full((64, 96, 3), (i * 3) % 256, dtype=np.uint8)
+        cv2.putText(image, str(i), (5, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        writer.write(image)
+    writer.release()
+    return path
+
+@pytest.fixture(scope="session")
+def video_digests(video):
+    """Pixel digest of every frame of the test video from one sequential read"""
+    import cv2
+    from test_cloudflare_frame_extraction import _frame_digest
+    capture = cv2.VideoCapture(video)
+    digests = []
+    while True:
+        ret, image = capture.read()
+        if not ret:
+            break
+        digests.append(_frame_digest(image))
+    capture.release()
+    return digests
+
+@pytest.fixture
+def extractor(video):
+    import test_cloudflare_frame_extraction as extraction
+    extractor = extraction.CloudflareFrameExtractor(video_url=video)
+    assert extractor.load_video()
+    yield extractor
+    extractor.cap.release()
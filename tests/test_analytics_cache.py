@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+import pytest
+
+from analytics_cache import AnalyticsCache
+
+def test_round_trip(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    payload = {"frame_data": [{"frame_number": 0, "metrics": {"acl_risk": 12.5}}]}
+
+    assert cache.get("analytics:a1") is None
+    cache.put("analytics:a1", payload)
+
+    assert cache.contains("analytics:a1")
+    assert cache.get("analytics:a1") == payload
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_identical_payloads_share_one_object(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    assert cache.put("analytics:a1", [1, 2, 3]) == cache.put("analytics:a2", [1, 2, 3])
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["objects"]) == (2, 1)
+
+def test_max_age_expires_entries(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    cache.put("per_frame:x.mp4", [1])
+    ref_path = cache._ref_path("per_frame:x.mp4")
+    ref = cache._read_ref(ref_path)
+    ref["stored_at"] -= 100
+    cache._write_atomic(ref_path, json.dumps(ref).encode())
+
+    assert cache.get("per_frame:x.mp4", max_age=10) is None
+    assert cache.get("per_frame:x.mp4", max_age=1000) == [1]
+
+def test_corrupt_object_is_dropped(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    digest = cache.put("analytics:a1", {"a": 1})
+    with open(cache._object_path(digest), "wb") as f:
+        f.write(b"not zlib")
+
+    assert cache.get("analytics:a1") is None
+    assert not cache.contains("analytics:a1")
+
+def test_get_or_fetch_does_not_cache_none(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return None if len(calls) == 1 else {"a": 1}
+
+    assert cache.get_or_fetch("analytics:a1", fetch) is None
+    assert cache.get_or_fetch("analytics:a1", fetch) == {"a": 1}
+    assert cache.get_or_fetch("analytics:a1", fetch) == {"a": 1}
+    assert len(calls) == 2
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = AnalyticsCache(str(tmp_path), compression_level=0)
+    for i in range(3):
+        cache.put(f"analytics:a{i}", {"i": i, "pad": "x" * 1000})
+        past = time.time() - 100 + i
+        os.utime(cache._ref_path(f"analytics:a{i}"), (past, past))
+    cache.get("analytics:a0")
+
+    per_object = cache.stats()["compressed_bytes"] // 3
+    cache.evict(max_bytes=2 * per_object)
+
+    assert cache.contains("analytics:a0")
+    assert not cache.contains("analytics:a1")
+    assert cache.contains("analytics:a2")
+
+def test_streamed_writes_match_put(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    records = [{"frame_number": i, "acl_risk": i / 3} for i in range(1000)]
+    with cache.open_writer("analytics:streamed") as writer:
+        for i, record in enumerate(records):
+            writer.write((b"," if i else b"[") + json.dumps(record, separators=(",", ":")).encode())
+        writer.write(b"]")
+        digest = writer.commit()
+
+    assert cache.put("analytics:whole", records) == digest
+    assert json.loads(b"".join(cache.iter_raw("analytics:streamed", chunk_size=64))) == records
+
+def test_uncommitted_writer_leaves_nothing_behind(tmp_path):
+    cache = AnalyticsCache(str(tmp_path))
+    with cache.open_writer("analytics:a1") as writer:
+        writer.write(b"[1,")
+
+    assert not cache.contains("analytics:a1")
+    assert os.listdir(cache.objects_dir) == []
+
+def test_iter_raw_raises_on_corrupt_entry(tmp_path):
+    cache = AnalyticsCache(str(tmp_path), compression_level=0)
+    digest = cache.put("analytics:a1", list(range(100)))
+    path = cache._object_path(digest)
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    data[20] ^= 0xFF
+    with open(path, "wb") as f:
+        f.write(bytes(data))
+
+    with pytest.raises(ValueError):
+        b"".join(cache.iter_raw("analytics:a1"))
+    assert not cache.contains("analytics:a1")
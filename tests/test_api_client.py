@@ -0,0 +1,130 @@
+import http.server
+import os
+import threading
+
+import pytest
+import requests
+
+from api_client import ApiClient
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """Fails the first `failures` requests per path, then answers 200 (or 304 for a matching ETag)"""
+
+    failures = {}
+    status = 503
+    hits = {}
+    seen_etags = []
+
+    def _answer(self):
+        hits = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.headers.get('Content-Length'):
+            self.rfile.read(int(self.headers['Content-Length']))
+        if hits <= self.failures.get(self.path, 0):
+            self.send_response(self.status)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = f'{{"path": "{self.path}"}}'.encode()
+        if self.path.startswith('/tagged'):
+            self.seen_etags.append(self.headers.get('If-None-Match'))
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('ETag', '"v1"')
+                self.end_headers()
+                return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.path.startswith('/tagged'):
+            self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = _answer
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    ScriptedHandler.failures = {}
+    ScriptedHandler.status = 503
+    ScriptedHandler.hits = {}
+    ScriptedHandler.seen_etags = []
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def client(server, tmp_path, **kwargs):
+    kwargs.setdefault('etag_cache_dir', str(tmp_path / "etags"))
+    return ApiClient(server, max_retries=3, backoff_base=0.001, backoff_max=0.01, **kwargs)
+
+def test_idempotent_requests_retry_server_errors(server, tmp_path):
+    ScriptedHandler.failures = {'/flaky': 2}
+    api = client(server, tmp_path)
+    response = api.get("/flaky")
+    assert response.status_code == 200
+    assert ScriptedHandler.hits['/flaky'] == 3
+    assert api.stats()[f"GET 127.0.0.1:{server.rsplit(':', 1)[1]}/flaky"]['retries'] == 2
+
+def test_retries_give_up_after_max_retries(server, tmp_path):
+    ScriptedHandler.failures = {'/down': 10}
+    assert client(server, tmp_path).get("/down").status_code == 503
+    assert ScriptedHandler.hits['/down'] == 4
+
+def test_post_is_not_retried_after_a_server_error(server, tmp_path):
+    ScriptedHandler.failures = {'/create': 1}
+    assert client(server, tmp_path).post("/create", json={}).status_code == 503
+    assert ScriptedHandler.hits['/create'] == 1
+
+def test_post_is_retried_when_rate_limited(server, tmp_path):
+    ScriptedHandler.failures = {'/create': 1}
+    ScriptedHandler.status = 429
+    assert client(server, tmp_path).post("/create", json={}).status_code == 200
+    assert ScriptedHandler.hits['/create'] == 2
+
+def test_connection_errors_on_post_are_raised_at_once(tmp_path):
+    api = client("http://127.0.0.1:9", tmp_path)
+    with pytest.raises(requests.ConnectionError):
+        api.post("/create", json={})
+    assert list(api.stats().values())[0]['retries'] == 0
+
+def test_etag_revalidation_returns_the_cached_body(server, tmp_path):
+    api = client(server, tmp_path)
+    first = api.get("/tagged")
+    second = api.get("/tagged")
+    assert ScriptedHandler.seen_etags == [None, '"v1"']
+    assert not first.from_etag_cache and second.from_etag_cache
+    assert second.json() == first.json() == {'path': '/tagged'}
+    assert list(api.stats().values())[0]['not_modified'] == 1
+
+def test_etags_persist_between_clients(server, tmp_path):
+    client(server, tmp_path).get("/tagged?x=1")
+    response = client(server, tmp_path).get("/tagged", params={'x': 1})
+    assert ScriptedHandler.seen_etags == [None, '"v1"']
+    assert response.from_etag_cache and response.json() == {'path': '/tagged?x=1'}
+
+def test_unreadable_etag_cache_entries_are_dropped(server, tmp_path):
+    api = client(server, tmp_path)
+    api.get("/tagged")
+    for name in os.listdir(tmp_path / "etags"):
+        (tmp_path / "etags" / name).write_bytes(b"not zlib")
+
+    response = client(server, tmp_path).get("/tagged")
+    assert ScriptedHandler.seen_etags == [None, None]
+    assert response.status_code == 200 and not response.from_etag_cache
+
+def test_streamed_and_unconditional_gets_skip_revalidation(server, tmp_path):
+    api = client(server, tmp_path)
+    api.get("/tagged")
+    api.get("/tagged", stream=True).close()
+    api.get("/tagged", conditional=False)
+    assert ScriptedHandler.seen_etags == [None, None, None]
+
+def test_endpoint_names_collapse_record_ids():
+    assert ApiClient.endpoint_name('GET', 'http://h/getAnalytics/64f1a2b3c4d5e6f7a8b9c0d1') == 'GET h/getAnalytics/{id}'
+    assert ApiClient.endpoint_name('DELETE', 'http://h/sessions/42/video') == 'DELETE h/sessions/{id}/video'
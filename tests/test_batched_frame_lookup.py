@@ -0,0 +1,64 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+import test_cloudflare_frame_extraction as extraction
+
+class CountingCapture:
+    """Wraps a VideoCapture and counts seeks that move off the start"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.seeks = []
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES and value:
+            self.seeks.append(value)
+        return self.cap.set(prop, value)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+TIMES = [2.0, 0.1, 1.0, 0.1, 0.5, 2.4, 1.05]
+
+def test_results_follow_the_callers_order(extractor):
+    results = extractor.analyze_frames_at_times(TIMES, max_forward_gap=5)
+    assert [r['frame_number'] for r in results] == [int(t * 30) + 1 for t in TIMES]
+    assert [r['video_time'] for r in results] == TIMES
+    for result, time in zip(results, TIMES):
+        single = extractor.analyze_frame_at_time(time)
+        assert (result['frame_number'], result['frame_shape']) == (single['frame_number'], single['frame_shape'])
+
+@pytest.mark.parametrize("gap", [0, 5, 100])
+def test_targets_decode_the_right_pixels(video, video_digests, gap):
+    extractor = extraction.CloudflareFrameExtractor(video_url=video, frame_cache_bytes=64 * 96 * 64 * 3)
+    assert extractor.load_video()
+    try:
+        results = extractor.analyze_frames_at_times(TIMES, max_forward_gap=gap)
+        for result in results:
+            index = result['frame_number'] - 1
+            assert extraction._frame_digest(extractor.frame_cache.get(index)) == video_digests[index], (gap, index)
+    finally:
+        extractor.cap.release()
+
+def test_nearby_targets_share_a_seek(extractor):
+    extractor.cap = counting = CountingCapture(extractor.cap)
+    extractor.analyze_frames_at_times(TIMES, max_forward_gap=20)
+    # Sorted frames 3, 3, 15, 30, 31, 60, 72: only 30 -> 60 is beyond the gap
+    assert counting.seeks == [60]
+
+    counting.seeks.clear()
+    extractor.analyze_frames_at_times(TIMES, max_forward_gap=0)
+    assert counting.seeks == [3, 15, 30, 60, 72]
+
+def test_gap_defaults_to_the_measured_seek_cost(extractor):
+    results = extractor.analyze_frames_at_times([0.2, 1.9])
+    assert [r['frame_number'] for r in results] == [7, 58]
+
+def test_targets_past_the_end(extractor):
+    results = extractor.analyze_frames_at_times([0.5, 60.0], max_forward_gap=10)
+    assert results[0]['frame_number'] == 16
+    assert results[1] is None
+
+def test_video_not_loaded():
+    assert extraction.CloudflareFrameExtractor(video_url="unused.mp4").analyze_frames_at_times([0.1, 0.2]) == [None, None]
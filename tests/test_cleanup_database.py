@@ -0,0 +1,88 @@
+import importlib.util
+import os
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+from session_store import SessionStore
+
+# The script name has a hyphen, so it cannot be imported by name
+_spec = importlib.util.spec_from_file_location(
+    "cleanup_database", os.path.join(os.path.dirname(__file__), os.pardir, "cleanup-database.py"))
+cleanup_database = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(cleanup_database)
+
+MB = cleanup_database.MB
+
+def session(session_id, video_mb, analytics_mb=0, created_at="2025-01-01T00:00:00Z", **extra):
+    return dict({'_id': session_id, 'original_filename': f"{session_id}.mp4",
+                 'video_size': int(video_mb * MB), 'analytics_size': int(analytics_mb * MB),
+                 'created_at': created_at}, **extra)
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    yield store
+    store.close()
+
+def fill(store, sessions):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    with store.db:
+        store._upsert(sessions, time.time(), counts)
+
+def test_top_k_matches_a_full_sort():
+    rng = random.Random(3)
+    # Whole-MB sizes so there are ties, which keep arrival order
+    sessions = [session(f"s{i}", rng.randrange(0, 40), rng.randrange(0, 5)) for i in range(500)]
+    analyzer = cleanup_database.StorageAnalyzer(top_k=15).consume(sessions)
+
+    large = [s for s in sessions if s['video_size'] + s['analytics_size'] > cleanup_database.LARGE_FILE_BYTES]
+    expected = sorted(large, key=lambda s: -(s['video_size'] + s['analytics_size']))[:15]
+    assert [entry['session_id'] for entry in analyzer.largest()] == [s['_id'] for s in expected]
+    assert analyzer.large_file_count == len(large)
+    assert analyzer.large_file_bytes_total == sum(s['video_size'] + s['analytics_size'] for s in large)
+    assert analyzer.session_count == 500
+
+def test_top_k_with_fewer_large_files_than_k():
+    analyzer = cleanup_database.StorageAnalyzer(top_k=5).consume(
+        [session('a', 12), session('b', 1), session('c', 30)])
+    assert [entry['session_id'] for entry in analyzer.largest()] == ['c', 'a']
+
+def test_size_and_age_histograms():
+    now = datetime(2025, 3, 1)
+    analyzer = cleanup_database.StorageAnalyzer(now=now).consume([
+        session('a', 0.5, created_at="2025-03-01T00:00:00Z"),       # < 1 MB, < 1 day
+        session('b', 1, created_at="2025-02-28T00:00:00+00:00"),    # 1-2 MB, 1-2 days
+        session('c', 3, created_at="2025-02-25T12:00:00Z"),         # 2-4 MB, 2-4 days
+        session('d', 3.5, created_at=None),
+        session('e', 2, created_at="not a date"),
+    ])
+    assert analyzer.size_histogram == {0: [1, int(0.5 * MB)], 1: [1, MB], 2: [3, 3 * MB + int(3.5 * MB) + 2 * MB]}
+    assert {bucket: count for bucket, (count, _) in analyzer.age_histogram.items()} == {0: 1, 1: 1, 2: 1, None: 2}
+
+def test_report_duplicates_lists_removable_copies(store, monkeypatch):
+    fill(store, [
+        session('old', 20, created_at="2025-01-01T00:00:00Z"),
+        session('copy', 20, 1, created_at="2025-01-05T00:00:00Z"),
+        session('reencode', 8, created_at="2025-01-03T00:00:00Z"),
+        {'_id': 'no-video', 'created_at': "2025-01-02T00:00:00Z"},
+    ])
+    seen = []
+
+    class FakeDetector:
+        def __init__(self, client, store):
+            pass
+
+        def find_duplicates(self, sessions, perceptual=True):
+            seen.extend(s['_id'] for s in sessions)
+            return {'exact': [['old', 'copy']], 'near': [['old', 'reencode']] if perceptual else []}
+
+    monkeypatch.setattr(cleanup_database, 'DuplicateDetector', FakeDetector)
+    copies = cleanup_database.report_duplicates(None, store)
+
+    # Sessions without a video are never handed to the detector
+    assert sorted(seen) == ['copy', 'old', 'reencode']
+    assert [(c['session_id'], round(c['total_size_mb'])) for c in copies] == [('copy', 21), ('reencode', 8)]
+    assert [c['session_id'] for c in cleanup_database.report_duplicates(None, store, perceptual=False)] == ['copy']
@@ -0,0 +1,145 @@
+import pytest
+import requests
+
+from api_client import ApiClient
+from cleanup_executor import CleanupExecutor, CleanupJournal, HttpCleanupBackend
+
+class FakeBackend:
+    """Deletes from an in-memory set; can drop the response after acting"""
+
+    action = 'delete'
+    supports_batch = True
+
+    def __init__(self, sessions):
+        self.sessions = set(sessions)
+        self.calls = []
+        self.lose_response = False
+
+    def execute_batch(self, session_ids):
+        self.calls.append(list(session_ids))
+        self.sessions.difference_update(session_ids)
+        if self.lose_response:
+            raise requests.ConnectionError("connection reset")
+        return {session_id: None for session_id in session_ids}
+
+    def execute_one(self, session_id):
+        return self.execute_batch([session_id])[session_id]
+
+    def exists(self, session_id):
+        return session_id in self.sessions
+
+def make_executor(backend, tmp_path):
+    return CleanupExecutor(backend, journal_path=str(tmp_path / "journal.jsonl"),
+                           requests_per_second=1000, batch_size=2)
+
+def candidates(*session_ids):
+    return [{'session_id': session_id, 'total_size_mb': 1.0} for session_id in session_ids]
+
+def test_resume_skips_sessions_done_in_a_previous_run(tmp_path):
+    backend = FakeBackend({'a', 'b', 'c'})
+    make_executor(backend, tmp_path).run(candidates('a', 'b'))
+    summary = make_executor(backend, tmp_path).run(candidates('a', 'b', 'c'))
+
+    assert summary['already_done'] == 2
+    assert backend.calls[-1] == ['c']
+    assert not backend.sessions
+
+def test_lost_response_is_verified_instead_of_reissued(tmp_path):
+    backend = FakeBackend({'a', 'b'})
+    backend.lose_response = True
+    first = make_executor(backend, tmp_path).run(candidates('a', 'b'))
+    assert first['failed'] == 2
+    assert CleanupJournal(str(tmp_path / "journal.jsonl")).state('delete') == {'a': 'in_doubt', 'b': 'in_doubt'}
+
+    backend.lose_response = False
+    second = make_executor(backend, tmp_path).run(candidates('a', 'b'))
+
+    assert (second['in_doubt'], second['verified_done']) == (2, 2)
+    assert len(backend.calls) == 1
+
+def test_crash_after_start_is_verified(tmp_path):
+    backend = FakeBackend({'b'})
+    CleanupJournal(str(tmp_path / "journal.jsonl")).record('delete', ['a', 'b'], 'started')
+    summary = make_executor(backend, tmp_path).run(candidates('a', 'b'))
+
+    assert (summary['in_doubt'], summary['verified_done'], summary['succeeded']) == (2, 1, 1)
+    assert backend.calls == [['b']]
+
+def test_rejected_sessions_are_retried_on_resume(tmp_path):
+    backend = FakeBackend({'a'})
+    CleanupJournal(str(tmp_path / "journal.jsonl")).record('delete', ['a'], 'failed', errors={'a': 'status 500'})
+    summary = make_executor(backend, tmp_path).run(candidates('a'))
+
+    assert summary['in_doubt'] == 0
+    assert backend.calls == [['a']]
+
+def test_dry_run_touches_nothing(tmp_path):
+    backend = FakeBackend({'a', 'b', 'c'})
+    summary = make_executor(backend, tmp_path).run(candidates('a', 'b', 'c'), dry_run=True)
+
+    assert (summary['sessions'], summary['requests']) == (3, 2)
+    assert not backend.calls
+    assert not (tmp_path / "journal.jsonl").exists()
+
+class TimeoutSession:
+    def __init__(self):
+        self.methods = []
+
+    def request(self, method, url, **kwargs):
+        self.methods.append(method)
+        raise requests.Timeout("read timed out")
+
+def test_batch_post_is_not_retried():
+    client = ApiClient("http://backend", max_retries=3, backoff_base=0, etag_cache_dir=None)
+    client.session = TimeoutSession()
+    backend = HttpCleanupBackend(client, action='delete')
+
+    with pytest.raises(requests.Timeout):
+        backend.execute_batch(['a', 'b'])
+    with pytest.raises(requests.Timeout):
+        backend.exists('a')
+    assert client.session.methods == ['POST'] + ['GET'] * 4
+
+class RoutedSession:
+    """Answers from a {(method, path): status} table; anything else is a 404"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        path = url.split("//", 1)[1].split("/", 1)[1]
+        self.calls.append((method, "/" + path))
+        response = requests.Response()
+        response.status_code = self.routes.get((method, "/" + path), 404)
+        response._content = b"{}"
+        return response
+
+class FakeStore:
+    def __init__(self):
+        self.removed = []
+
+    def remove(self, session_ids):
+        self.removed.extend(session_ids)
+
+def http_backend(routes):
+    client = ApiClient("http://backend", max_retries=0, etag_cache_dir=None)
+    client.session = RoutedSession(routes)
+    store = FakeStore()
+    return HttpCleanupBackend(client, action='delete', store=store), store
+
+def test_missing_route_is_not_mistaken_for_a_deleted_session(tmp_path):
+    # Neither the batch nor the single delete route exists, but the session does
+    backend, store = http_backend({('GET', '/getSession/a'): 200, ('GET', '/getSession/b'): 200})
+    summary = make_executor(backend, tmp_path).run(candidates('a', 'b'))
+
+    assert (summary['succeeded'], summary['failed'], summary['bytes_freed']) == (0, 2, 0)
+    assert store.removed == []
+    assert CleanupJournal(str(tmp_path / "journal.jsonl")).state('delete') == {'a': 'failed', 'b': 'failed'}
+
+def test_404_for_a_gone_session_counts_as_done(tmp_path):
+    backend, store = http_backend({})
+    summary = make_executor(backend, tmp_path).run(candidates('a'))
+
+    assert summary['succeeded'] == 1
+    assert store.removed == ['a']
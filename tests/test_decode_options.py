@@ -0,0 +1,88 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+import numpy as np
+
+import test_cloudflare_frame_extraction as extraction
+from conftest import VIDEO_FRAMES
+
+ROI = (10, 8, 40, 30)
+
+@pytest.fixture(scope="module")
+def full_frames(video):
+    capture = cv2.VideoCapture(video)
+    frames = []
+    while True:
+        ret, image = capture.read()
+        if not ret:
+            break
+        frames.append(image)
+    capture.release()
+    return frames
+
+def decoded(extractor, count=5):
+    images = []
+    for _ in range(count):
+        ret, image = extractor._read()
+        assert ret
+        images.append(image.copy())
+    return images
+
+@pytest.mark.parametrize("options, shape", [
+    ({'size': (48, 32)}, (32, 48, 3)),
+    ({'grayscale': True}, (64, 96)),
+    ({'roi': ROI}, (30, 40, 3)),
+    ({'roi': ROI, 'grayscale': True, 'size': (20, 15)}, (15, 20)),
+])
+def test_decoded_shapes(extractor, options, shape):
+    extractor.set_decode_options(**options)
+    shapes = [image.shape for _, image in extractor.iter_frames(25, 'read', retrieve=True)]
+    assert shapes == [shape] * 3
+
+def test_steps_match_converting_full_frames(extractor, full_frames):
+    extractor.set_decode_options(roi=ROI, grayscale=True, size=(20, 15))
+    x, y, width, height = ROI
+    for image, full in zip(decoded(extractor), full_frames):
+        gray = cv2.cvtColor(full[y:y + height, x:x + width], cv2.COLOR_BGR2GRAY)
+        assert np.array_equal(image, cv2.resize(gray, (20, 15), interpolation=cv2.INTER_AREA))
+
+def test_roi_only_is_an_exact_crop(extractor, full_frames):
+    extractor.set_decode_options(roi=ROI)
+    x, y, width, height = ROI
+    for image, full in zip(decoded(extractor), full_frames):
+        assert np.array_equal(image, full[y:y + height, x:x + width])
+
+def test_output_buffers_are_reused(extractor):
+    extractor.set_decode_options(grayscale=True, size=(48, 32))
+    _, first = extractor._read()
+    _, second = extractor._read()
+    assert first is second
+    assert set(extractor._buffers) == {'decode', 'gray', 'resize'}
+
+    # A new shape reallocates once, then reuses again
+    extractor.set_decode_options(size=(24, 16))
+    _, third = extractor._read()
+    _, fourth = extractor._read()
+    assert third is fourth and third.shape == (16, 24, 3)
+
+def test_clearing_options_restores_full_frames(extractor, full_frames):
+    extractor.set_decode_options(grayscale=True)
+    extractor.set_decode_options()
+    assert extractor.decode_options is None
+    assert np.array_equal(decoded(extractor, 1)[0], full_frames[0])
+
+def test_changing_options_drops_cached_frames(video):
+    extractor = extraction.CloudflareFrameExtractor(video_url=video, frame_cache_bytes=10 * 96 * 64 * 3)
+    assert extractor.load_video()
+    try:
+        assert extractor.analyze_frame_at_time(0.5)['frame_shape'] == (64, 96, 3)
+        extractor.set_decode_options(size=(48, 32))
+        assert extractor.cache_stats()['entries'] == 0
+        assert extractor.analyze_frame_at_time(0.5)['frame_shape'] == (32, 48, 3)
+    finally:
+        extractor.cap.release()
+
+def test_decode_mode_benchmark_counts_every_frame(video):
+    frames, elapsed, peak_rss_kb = extraction._benchmark_decode_mode(video, {'size': (48, 32), 'grayscale': True})
+    assert frames == VIDEO_FRAMES
+    assert elapsed > 0 and peak_rss_kb > 0
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from test_real_cloudflare_integration import DIFF_ATOL, DIFF_RTOL, diff_frame_sources
+
+def frames(numbers, **metrics):
+    """Records with a timestamp of frame / 30 and each metric from a function of the frame"""
+    return [dict({'frame_number': n, 'timestamp': n / 30}, **{name: f(n) for name, f in metrics.items()})
+            for n in numbers]
+
+def test_identical_sources():
+    records = frames(range(50), speed=lambda n: n * 0.5)
+    report = diff_frame_sources(records, list(records))
+    assert report['identical']
+    assert report['identical_rows'] == report['aligned_frames'] == 50
+    assert report['metrics']['speed']['mismatches'] == 0
+
+def test_missing_and_extra_frames_are_reported_as_ranges():
+    left = frames([*range(0, 10), *range(15, 30), 40], speed=float)
+    right = frames([*range(0, 20), *range(25, 35)], speed=float)
+    report = diff_frame_sources(left, right)
+
+    assert report['aligned_frames'] == 10 + 5 + 5
+    assert report['left_only_ranges'] == [[20, 24], [40, 40]]
+    assert report['left_only_count'] == 6
+    assert report['right_only_ranges'] == [[10, 14], [30, 34]]
+    assert report['right_only_count'] == 10
+    # Matching values, but the frame sets differ
+    assert report['metrics']['speed']['mismatches'] == 0
+    assert not report['identical']
+
+def test_tolerance_and_first_divergent_frame():
+    left = frames(range(20), speed=float, score=float)
+    right = frames(range(20), speed=lambda n: n + (DIFF_ATOL / 2 if n == 3 else 0.0),
+                   score=lambda n: n + (0.5 if n in (7, 12) else 0.0))
+    report = diff_frame_sources(left, right)
+
+    assert report['metrics']['speed']['mismatches'] == 0
+    assert report['metrics']['speed']['max_abs_delta'] == pytest.approx(DIFF_ATOL / 2)
+    assert report['metrics']['score']['mismatches'] == 2
+    assert report['metrics']['score']['first_divergent_frame'] == 7
+    assert report['metrics']['score']['mean_abs_delta'] == pytest.approx(1.0 / 20)
+    assert report['first_divergent_frame'] == 7
+    assert report['identical_rows'] == 17
+
+def test_a_value_missing_on_one_side_is_a_mismatch():
+    left = frames(range(4), speed=float)
+    right = frames(range(4), speed=float)
+    del right[2]['speed']
+    report = diff_frame_sources(left, right)
+    assert report['metrics']['speed']['mismatches'] == 1
+    assert report['metrics']['speed']['compared'] == 3
+    assert report['first_divergent_frame'] == 2
+
+def test_repeated_frames_compare_their_last_record():
+    left = frames([0, 1, 1, 2], speed=float)
+    left[1]['speed'] = 99.0
+    report = diff_frame_sources(left, frames(range(3), speed=float))
+    assert report['aligned_frames'] == 3
+    assert report['identical']
+
+def test_metric_sets_are_compared():
+    report = diff_frame_sources(frames(range(3), a=float, b=float), frames(range(3), b=float, c=float))
+    assert report['common_metrics'] == ['b']
+    assert report['left_only_metrics'] == ['a']
+    assert report['right_only_metrics'] == ['c']
+
+def test_timestamp_alignment_tolerates_renumbering_and_jitter():
+    left = frames(range(30), speed=float)
+    # Same frames numbered from 1000, timestamps off by a fraction of a frame,
+    # with frames 10-12 dropped and one stray record far from any left frame
+    right = [dict(record, frame_number=record['frame_number'] + 1000,
+                  timestamp=record['timestamp'] + 0.004)
+             for record in left if record['frame_number'] not in (10, 11, 12)]
+    right.append({'frame_number': 2000, 'timestamp': 50.0, 'speed': 0.0})
+    report = diff_frame_sources(left, right, align='timestamp')
+
+    assert report['aligned_frames'] == 27
+    assert report['left_only_ranges'] == [[10, 12]]
+    assert report['right_only_ranges'] == [[2000, 2000]]
+    assert report['metrics']['speed']['mismatches'] == 0
+
+def test_matches_a_record_by_record_comparison():
+    rng = random.Random(11)
+    left = [{'frame_number': n, 'm': rng.choice([float(n), n + rng.uniform(-1, 1), None])}
+            for n in rng.sample(range(300), 200)]
+    right = [{'frame_number': n, 'm': rng.choice([float(n), None])} for n in rng.sample(range(300), 200)]
+    report = diff_frame_sources(left, right)
+
+    by_left = {r['frame_number']: r['m'] for r in left}
+    by_right = {r['frame_number']: r['m'] for r in right}
+    common = sorted(by_left.keys() & by_right.keys())
+    mismatched = []
+    for n in common:
+        a, b = by_left[n], by_right[n]
+        if (a is None) != (b is None) or (a is not None and abs(a - b) > DIFF_ATOL + DIFF_RTOL * abs(b)):
+            mismatched.append(n)
+
+    assert report['aligned_frames'] == len(common)
+    assert report['left_only_count'] == len(by_left.keys() - by_right.keys())
+    assert report['metrics']['m']['mismatches'] == len(mismatched)
+    assert report['first_divergent_frame'] == (mismatched[0] if mismatched else None)
+
+def test_unknown_alignment():
+    with pytest.raises(ValueError):
+        diff_frame_sources([], [], align='nearest')
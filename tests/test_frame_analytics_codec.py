@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+import frame_analytics_codec
+from frame_analytics_codec import decode_frames, decode_payload, encode_frames, encode_payload, field_decimals
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "sample_frame_data.json")
+
+def _rounded(value, name=""):
+    """What the codec should give back for a value under a field name"""
+    if isinstance(value, dict):
+        return {key: _rounded(item, key) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item, name) for item in value]
+    if isinstance(value, float):
+        return round(value, field_decimals(name))
+    return value
+
+@pytest.fixture(params=["zstd", "zlib"])
+def compression(request, monkeypatch):
+    if request.param == "zstd":
+        monkeypatch.setattr(frame_analytics_codec, "zstandard", pytest.importorskip("zstandard"))
+    else:
+        monkeypatch.setattr(frame_analytics_codec, "zstandard", None)
+    return request.param
+
+@pytest.fixture
+def sample():
+    with open(SAMPLE_PATH) as f:
+        return json.load(f)
+
+def test_sample_round_trip_within_precision(sample, compression):
+    decoded = decode_payload(encode_payload(sample))
+
+    assert decoded['frame_data'] == pytest.approx(_rounded(sample['frame_data']), abs=1e-9)
+    assert decoded['metadata'] == sample['metadata']
+
+def test_reencoding_decoded_payload_is_stable(sample, compression):
+    encoded = encode_payload(sample)
+    assert encode_payload(decode_payload(encoded)) == encoded
+
+def test_irregular_frames_are_kept(compression):
+    frames = [
+        {"frame_number": 0, "timestamp": 0.0, "tags": ["a", 1], "note": None,
+         "extracted_at": "2025-09-27T21:29:30.229Z"},
+        {"frame_number": 1, "analytics": {"acl_risk": 10.126, "tumbling_phase": "flight"},
+         "extracted_at": "not a date"},
+        {"frame_number": 2, "flag": True, "mixed": "x"},
+        {"frame_number": 3, "mixed": 4.5},
+    ]
+    decoded = decode_frames(encode_frames(frames))
+
+    assert decoded[0] == frames[0]
+    assert decoded[1] == {"frame_number": 1, "analytics": {"acl_risk": 10.13, "tumbling_phase": "flight"},
+                          "extracted_at": "not a date"}
+    assert decoded[2:] == frames[2:]
+
+def test_empty_frame_list(compression):
+    assert decode_frames(encode_frames([])) == []
+
+def test_zstd_payload_without_zstandard_raises(sample, monkeypatch):
+    monkeypatch.setattr(frame_analytics_codec, "zstandard", pytest.importorskip("zstandard"))
+    encoded = encode_payload(sample)
+    monkeypatch.setattr(frame_analytics_codec, "zstandard", None)
+
+    with pytest.raises(ValueError):
+        decode_payload(encoded)
+
+def test_rejects_foreign_data():
+    with pytest.raises(ValueError):
+        decode_payload(b'{"frame_data": []}')
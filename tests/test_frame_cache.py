@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import test_cloudflare_frame_extraction as extraction
+from test_cloudflare_frame_extraction import FrameCache
+
+def frame(value, nbytes=100):
+    return np.full(nbytes, value, dtype=np.uint8)
+
+def test_least_recently_used_frames_are_evicted_by_bytes():
+    cache = FrameCache(300)
+    for i in range(3):
+        cache.put(i, frame(i))
+    # Touch 0 so 1 is now the oldest
+    assert cache.get(0)[0] == 0
+    cache.put(3, frame(3))
+    assert 1 not in cache
+    assert [i for i in range(4) if i in cache] == [0, 2, 3]
+
+    # A larger frame evicts as many as it needs
+    cache.put(4, frame(4, nbytes=250))
+    assert list(cache.frames) == [4]
+    assert cache.current_bytes == 250
+    assert cache.evictions == 4
+
+def test_oversized_frames_are_not_cached():
+    cache = FrameCache(300)
+    cache.put(0, frame(0))
+    cache.put(1, frame(1, nbytes=301))
+    assert 1 not in cache and 0 in cache
+    assert cache.evictions == 0
+
+def test_replacing_a_frame_keeps_the_byte_count():
+    cache = FrameCache(300)
+    cache.put(0, frame(0))
+    cache.put(0, frame(9, nbytes=200))
+    assert cache.current_bytes == 200
+    assert cache.get(0)[0] == 9
+
+def test_stats():
+    cache = FrameCache(300)
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.put(0, frame(0))
+    cache.get(0)
+    cache.get(0)
+    cache.get(1)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['bytes']) == (2, 1, 1, 100)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+    cache.clear()
+    assert (cache.stats()['entries'], cache.stats()['bytes'], cache.stats()['hits']) == (0, 0, 2)
+
+def test_extractor_reuses_prefetched_frames(video):
+    extractor = extraction.CloudflareFrameExtractor(video_url=video, frame_cache_bytes=10 * 96 * 64 * 3,
+                                                    prefetch_frames=3)
+    assert extractor.load_video()
+    try:
+        first = extractor.analyze_frame_at_time(1.0)
+        assert extractor.cache_stats()['entries'] == 4
+        # The frames just after the miss come from the cache
+        for offset in range(1, 4):
+            record = extractor.analyze_frame_at_time(1.0 + offset / extractor.fps)
+            assert record['frame_number'] == first['frame_number'] + offset
+        stats = extractor.cache_stats()
+        assert (stats['hits'], stats['misses']) == (3, 1)
+
+        # Prefetched frames hold the same pixels a direct read decodes
+        extractor.cap.set(extraction.cv2.CAP_PROP_POS_FRAMES, 32)
+        ret, image = extractor.cap.read()
+        assert ret and np.array_equal(extractor.frame_cache.get(32), image)
+    finally:
+        extractor.cap.release()
+
+def test_cache_is_off_by_default(extractor):
+    assert extractor.frame_cache is None
+    assert extractor.cache_stats() == {}
+    assert extractor.analyze_frame_at_time(0.5)['frame_number'] == 16
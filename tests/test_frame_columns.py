@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+import test_cloudflare_frame_extraction as extraction
+from test_cloudflare_frame_extraction import ColumnarFrameData, write_frame_columns
+
+def frame(number, **analytics):
+    return {'frame_number': number, 'timestamp': number * 1000 / 30, 'video_time': number / 30,
+            'extracted_at': '2025-01-01T00:00:00.500000', 'analytics': analytics}
+
+def roundtrip(tmp_path, frames):
+    directory = str(tmp_path / "columns")
+    assert write_frame_columns(frames, directory) == len(frames)
+    return ColumnarFrameData(directory)
+
+def test_records_round_trip(tmp_path):
+    frames = [frame(i * 30 + 1, acl_risk=i / 10, tumbling_phase=['takeoff', 'flight'][i % 2]) for i in range(5)]
+    frames[2]['analytics'].pop('acl_risk')
+    data = roundtrip(tmp_path, frames)
+
+    assert data.column('frame_number').dtype == np.int64
+    assert data.column('analytics.tumbling_phase', decode=True).tolist() == ['takeoff', 'flight'] * 2 + ['takeoff']
+    assert list(data.iter_records()) == frames
+    assert data.rows_for_frames(31, 91) == (1, 4)
+
+def test_non_scalar_fields_are_skipped(tmp_path):
+    frames = [dict(frame(1, acl_risk=0.1), frame_shape=[720, 1280, 3])]
+    data = roundtrip(tmp_path, frames)
+    assert 'frame_shape' not in data.column_names
+
+def test_a_string_in_a_numeric_column_demotes_it_to_json(tmp_path):
+    frames = [frame(i, elevation=float(i)) for i in range(3)] + [frame(3, elevation='n/a'), frame(4)]
+    data = roundtrip(tmp_path, frames)
+
+    assert data.header['columns']['analytics.elevation']['encoding'] == 'json'
+    assert data.column('analytics.elevation', decode=True).tolist() == [0.0, 1.0, 2.0, 'n/a', None]
+    assert list(data.iter_records(0, 4)) == frames[:4]
+
+def test_unhashable_values_in_a_category_column_demote_it_to_json(tmp_path):
+    frames = [frame(1, phase='landing'), frame(2, phase=['a', 'b']), frame(3, phase={'x': 1})]
+    data = roundtrip(tmp_path, frames)
+    assert data.column('analytics.phase', decode=True).tolist() == ['landing', ['a', 'b'], {'x': 1}]
+
+def test_unparseable_datetimes_demote_the_column(tmp_path):
+    frames = [frame(1), dict(frame(2), extracted_at='yesterday')]
+    data = roundtrip(tmp_path, frames)
+    assert [record['extracted_at'] for record in data.iter_records()] == [
+        '2025-01-01T00:00:00.500000', 'yesterday']
+
+def test_json_export_matches_the_records(tmp_path):
+    frames = [frame(i, acl_risk=i / 4) for i in range(4)]
+    data = roundtrip(tmp_path, frames)
+    with open(data.to_json(str(tmp_path / "frames.json"), 1, 3)) as f:
+        assert json.load(f) == frames[1:3]
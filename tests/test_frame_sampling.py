@@ -0,0 +1,29 @@
+import pytest
+
+import test_cloudflare_frame_extraction as extraction
+from conftest import VIDEO_FRAMES as FRAMES
+
+def test_seek_to_lands_on_the_decoded_frame(extractor, video_digests):
+    for target in (0, 1, 11, 12, 13, 40, len(video_digests) - 1):
+        assert extractor._seek_to(target)
+        ret, image = extractor.cap.read()
+        assert ret
+        assert extraction._frame_digest(image) == video_digests[target], target
+
+def test_seek_to_reports_targets_past_the_end(extractor):
+    assert not extractor._seek_to(FRAMES + 10)
+
+@pytest.mark.parametrize("strategy", ['grab', 'seek'])
+def test_sparse_strategies_decode_the_same_pixels_as_full_decode(extractor, strategy):
+    baseline = extraction._frame_digests(extractor.iter_frames(7, 'read', retrieve=True))
+    # Records number frames from 1
+    assert sorted(baseline) == list(range(1, FRAMES + 1, 7))
+    assert extraction._frame_digests(extractor.iter_frames(7, strategy, retrieve=True)) == baseline
+
+@pytest.mark.parametrize("strategy", ['read', 'seek'])
+def test_parallel_segments_match_a_single_pass(extractor, strategy):
+    serial = extraction._frame_digests(extractor.iter_frames(5, 'read', retrieve=True))
+    segmented = extractor.extract_frame_timestamps_parallel(sample_rate=5, workers=3, strategy=strategy,
+                                                            digests=True)
+    assert [frame['frame_number'] for frame in segmented] == sorted(serial)
+    assert {frame['frame_number']: frame['frame_digest'] for frame in segmented} == serial
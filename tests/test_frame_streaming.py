@@ -0,0 +1,98 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import test_cloudflare_frame_extraction as extraction
+
+@pytest.mark.parametrize("records", [
+    [],
+    [{'frame_number': 1}],
+    [{'frame_number': 1, 'analytics': {'phase': 'flight', 'angles': [1.5, 2]}, 'shape': [64, 96, 3]},
+     {'frame_number': 2, 'analytics': {}, 'note': None}],
+])
+def test_streamed_json_matches_json_dump(records, tmp_path):
+    path = str(tmp_path / "frames.json")
+    assert extraction._write_json_records(iter(records), path) == len(records)
+    with open(path) as f:
+        assert f.read() == json.dumps(records, indent=2)
+
+def test_save_frame_data_consumes_a_generator(tmp_path):
+    consumed = []
+
+    def records():
+        for n in range(5):
+            consumed.append(n)
+            yield {'frame_number': n}
+
+    extractor = extraction.CloudflareFrameExtractor(video_url="unused.mp4")
+    path = extractor.save_frame_data(records(), str(tmp_path / "frames.json"))
+    assert consumed == list(range(5))
+    with open(path) as f:
+        assert [r['frame_number'] for r in json.load(f)] == list(range(5))
+
+def test_prefetch_keeps_order_and_bounds_the_lookahead():
+    produced = []
+    ready = threading.Event()
+
+    def items():
+        for n in range(10):
+            produced.append(n)
+            if len(produced) == 4:
+                ready.set()
+            yield n
+
+    stream = extraction._prefetch(items(), 3)
+    assert next(stream) == 0
+    ready.wait(5)
+    # One item handed out, three buffered and at most one waiting to be put
+    assert len(produced) <= 5
+    assert list(stream) == list(range(1, 10))
+
+def test_prefetch_reraises_producer_errors():
+    def items():
+        yield 1
+        raise KeyError("decode failed")
+
+    stream = extraction._prefetch(items(), 2)
+    assert next(stream) == 1
+    with pytest.raises(KeyError):
+        next(stream)
+
+def test_closing_a_prefetched_stream_stops_the_producer():
+    closed = threading.Event()
+
+    def items():
+        try:
+            n = 0
+            while True:
+                yield n
+                n += 1
+        finally:
+            closed.set()
+
+    stream = extraction._prefetch(items(), 2)
+    assert next(stream) == 0
+    stream.close()
+    assert closed.wait(5)
+
+def test_iter_frames_with_lookahead_matches_on_demand(extractor):
+    on_demand = [(record['frame_number'], extraction._frame_digest(image))
+                 for record, image in extractor.iter_frames(10, 'read', retrieve=True)]
+    ahead = [(record['frame_number'], extraction._frame_digest(image))
+             for record, image in extractor.iter_frames(10, 'read', lookahead=4, retrieve=True)]
+    assert ahead == on_demand
+    assert [n for n, _ in on_demand] == list(range(1, 76, 10))
+
+def test_lookahead_images_are_private_copies_with_decode_options(extractor):
+    extractor.set_decode_options(size=(48, 32))
+    images = [image for _, image in extractor.iter_frames(25, 'read', lookahead=2, retrieve=True)]
+    assert len(images) == 3
+    assert len({id(image) for image in images}) == 3
+    assert not np.array_equal(images[0], images[1])
+
+def test_iter_analytics_enriches_a_frame_stream(extractor):
+    records = list(extractor.iter_analytics(extractor.iter_frames(25, 'read'), lookahead=2))
+    assert [r['frame_number'] for r in records] == [1, 26, 51]
+    assert all(r['analytics']['tumbling_phase'] in extraction.TUMBLING_PHASES for r in records)
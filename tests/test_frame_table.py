@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import test_real_cloudflare_integration as integration
+from test_real_cloudflare_integration import FrameTable
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Several chunks from a handful of records
+    monkeypatch.setattr(integration, 'FRAME_TABLE_CHUNK_RECORDS', 3)
+
+def test_missing_or_null_frame_numbers_use_the_record_position(small_chunks):
+    records = [{'frame_number': 10}, {'frame_number': None}, {}, {'frame_number': 13},
+               {'frame_number': None}, {'frame_number': 0}]
+    table = FrameTable.from_records(records)
+    assert table.frame_numbers.dtype == np.int64
+    assert table.frame_numbers.tolist() == [10, 1, 2, 13, 4, 0]
+
+def test_timestamps_from_the_frame_or_its_metrics(small_chunks):
+    records = [{'timestamp': 1.0}, {'metrics': {'timestamp': 2.0, 'relative_timestamp': 0.5}},
+               {'relative_timestamp': 0.75}, {}]
+    table = FrameTable.from_records(records)
+    assert np.array_equal(table.timestamps, [1.0, 2.0, np.nan, np.nan], equal_nan=True)
+    assert np.array_equal(table.relative_timestamps, [np.nan, 0.5, 0.75, np.nan], equal_nan=True)
+    assert table.has_timestamp.tolist() == [True, True, False, False]
+
+def test_metric_columns_across_chunks(small_chunks):
+    records = ([{'count': i, 'score': i} for i in range(3)]
+               + [{'count': i, 'score': i + 0.5} for i in range(3, 6)]
+               + [{'count': 6, 'label': 'x'}, {'count': 7, 'metrics': {'score': 9}}])
+    table = FrameTable.from_records(records)
+
+    # Integers in every chunk stay int64
+    assert table.metrics['count'].dtype == np.int64
+    assert table.metrics['count'].tolist() == list(range(8))
+    # A float chunk, and chunks without the field, widen to float64 with NaN
+    assert np.array_equal(table.metrics['score'], [0, 1, 2, 3.5, 4.5, 5.5, np.nan, 9], equal_nan=True)
+    # Strings are not metrics
+    assert 'label' not in table.metrics
+
+def test_non_numeric_values_reject_a_field_in_any_chunk(small_chunks):
+    records = [{'phase': 1}] * 3 + [{'phase': 'landing'}] + [{'phase': 2}] * 3
+    assert 'phase' not in FrameTable.from_records(records).metrics
+
+def test_nested_metrics_win_a_name_clash():
+    table = FrameTable.from_records([{'speed': 1, 'metrics': {'speed': 2}}])
+    assert table.metrics['speed'].tolist() == [2]
+
+def test_nested_metrics_only_override_the_records_that_have_them(small_chunks):
+    records = [{'speed': i} for i in range(5)] + [{'speed': 5, 'metrics': {'speed': 50.0}}]
+    assert FrameTable.from_records(records).metrics['speed'].tolist() == [0, 1, 2, 3, 4, 50]
+
+@pytest.mark.parametrize("payload", [
+    [{'frame_number': 1, 'timestamp': 5.0}],
+    {'analytics': [{'frame_number': 1, 'timestamp': 5.0}]},
+    {'frame_data': [{'frame_number': 1, 'timestamp': 5.0}]},
+])
+def test_payload_shapes(payload):
+    table = FrameTable.from_payload(payload)
+    assert table.frame_numbers.tolist() == [1]
+    assert table.timestamps.tolist() == [5.0]
+    assert FrameTable.coerce(table) is table
+
+def test_empty_input():
+    table = FrameTable.from_records(iter([]))
+    assert len(table) == 0
+    assert table.metrics == {}
+    assert table.frame_numbers.dtype == np.int64
@@ -0,0 +1,101 @@
+import random
+
+import numpy as np
+import pytest
+
+from test_real_cloudflare_integration import FrameTable, FrameTimeIndex
+
+def index(frames, video_times, **kwargs):
+    return FrameTimeIndex(frames, np.asarray(video_times) * 1000, video_times, **kwargs)
+
+@pytest.fixture
+def regular():
+    # Frames 0, 2, 4, ... 18 every 1/15s
+    frames = np.arange(0, 20, 2)
+    return index(frames, frames / 30)
+
+def test_frame_lookups_at_the_edges(regular):
+    assert regular.video_time_of_frame(0) == 0.0
+    assert regular.video_time_of_frame(18) == pytest.approx(0.6)
+    # Absent frames: between entries, before the first and after the last
+    for frame in (1, -1, 19, 100):
+        assert regular.timestamp_of_frame(frame) is None
+    values = regular.timestamp_of_frame(np.array([0, 1, 18, 20]))
+    assert np.array_equal(values, [0.0, np.nan, 600.0, np.nan], equal_nan=True)
+
+def test_floor_lookup_at_the_edges(regular):
+    assert regular.frame_at_time(-0.01) == -1
+    assert regular.frame_at_time(0.0) == 0
+    # Exactly on a frame's time returns that frame, just before it the previous one
+    assert regular.frame_at_time(4 / 30) == 4
+    assert regular.frame_at_time(4 / 30 - 1e-9) == 2
+    assert regular.frame_at_time(10.0) == 18
+    assert regular.frame_at_time(np.array([-1.0, 0.05, 10.0])).tolist() == [-1, 0, 18]
+
+def test_nearest_lookup_at_the_edges(regular):
+    assert regular.frame_at_time(-5.0, mode='nearest') == 0
+    assert regular.frame_at_time(10.0, mode='nearest') == 18
+    assert regular.frame_at_time(0.06, mode='nearest') == 2
+    # Halfway between two frames resolves to the earlier one
+    assert regular.frame_at_time(1 / 30, mode='nearest') == 0
+    with pytest.raises(ValueError):
+        regular.frame_at_time(0.0, mode='ceil')
+
+def test_lookups_match_brute_force_when_time_is_not_monotonic():
+    rng = random.Random(5)
+    frames = np.array(rng.sample(range(500), 200))
+    times = np.array([rng.uniform(0, 20) for _ in frames])
+    idx = index(frames, times)
+    assert idx.time_order is not None
+
+    for query in [rng.uniform(-1, 21) for _ in range(200)] + list(times[:20]):
+        on_screen = [(t, f) for f, t in zip(frames, times) if t <= query]
+        expected_floor = max(on_screen)[1] if on_screen else -1
+        assert idx.frame_at_time(query) == expected_floor
+        nearest = min(abs(t - query) for t in times)
+        assert abs(times[list(frames).index(idx.frame_at_time(query, mode='nearest'))] - query) == nearest
+
+    in_window = sorted((t, f) for f, t in zip(frames, times) if 5 <= t < 9)
+    assert idx.frames_between(5, 9).tolist() == [f for _, f in in_window]
+
+def test_repeated_frame_numbers_keep_the_last_record():
+    idx = index([3, 1, 3], [0.5, 0.1, 0.7])
+    assert idx.frames.tolist() == [1, 3]
+    assert idx.video_time_of_frame(3) == pytest.approx(0.7)
+
+def test_frame_range_is_inclusive(regular):
+    frames, times = regular.frame_range(4, 10)
+    assert frames.tolist() == [4, 6, 8, 10]
+    assert regular.frame_range(5, 9)[0].tolist() == [6, 8]
+    assert regular.frame_range(-10, 0)[0].tolist() == [0]
+    assert regular.frame_range(19, 40)[0].tolist() == []
+
+def test_frames_between_is_half_open(regular):
+    assert regular.frames_between(2 / 30, 6 / 30).tolist() == [2, 4]
+
+def test_empty_index():
+    idx = index(np.zeros(0, np.int64), np.zeros(0))
+    assert idx.frame_at_time(1.0) == -1
+    assert idx.frame_at_time(np.array([0.0, 1.0])).tolist() == [-1, -1]
+    assert idx.timestamp_of_frame(0) is None
+    assert idx.metadata['video_duration'] == 0
+
+def test_from_table_skips_frames_without_timestamps():
+    table = FrameTable.from_records([{'frame_number': 1, 'timestamp': 0.5}, {'frame_number': 2},
+                                     {'frame_number': 3, 'metrics': {'timestamp': 1.5}}])
+    idx = FrameTimeIndex.from_table(table, fps=25)
+    assert idx.frames.tolist() == [1, 3]
+    assert idx.metadata['total_frames'] == 3
+    assert idx.metadata['indexed_frames'] == 2
+
+def assert_same_index(copy, original):
+    assert np.array_equal(copy.frames, original.frames)
+    assert np.array_equal(copy.video_times, original.video_times)
+    assert copy.metadata == original.metadata
+
+def test_dict_round_trip(regular):
+    assert_same_index(FrameTimeIndex.from_dict(regular.to_dict()), regular)
+
+def test_file_round_trip(regular, tmp_path):
+    regular.save(str(tmp_path / "index.npz"))
+    assert_same_index(FrameTimeIndex.load(str(tmp_path / "index.npz")), regular)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import api_client
+from api_client import _ItemScanner, iter_json_items
+
+DOCUMENT = json.dumps({
+    "count": 3,
+    "meta": {"sessions": "not this one", "nested": [1, {"a": [2]}]},
+    "sessions": [
+        {"_id": "s1", "score": 12.5, "tags": ["a", "b"]},
+        -0.25e3,
+        "café ✓",
+    ],
+    "after": True,
+}, ensure_ascii=False).encode()
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.fixture(params=["scanner", "ijson"])
+def backend(request, monkeypatch):
+    if request.param == "ijson":
+        monkeypatch.setattr(api_client, "ijson", pytest.importorskip("ijson"))
+    else:
+        monkeypatch.setattr(api_client, "ijson", None)
+    return request.param
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_items_survive_every_chunk_boundary(backend, size):
+    items = list(iter_json_items(chunked(DOCUMENT, size), [("sessions",), ()]))
+    assert items == json.loads(DOCUMENT)["sessions"]
+
+def test_top_level_array(backend):
+    assert list(iter_json_items([b'[1, 2', b'0, {"x": 3}]'], [(), ("sessions",)])) == [1, 20, {"x": 3}]
+
+def test_empty_array_and_missing_path(backend):
+    assert list(iter_json_items([b'{"sessions": []}'], [("sessions",)])) == []
+    assert list(iter_json_items([b'{"other": [1, 2]}'], [("sessions",)])) == []
+
+def test_number_split_across_chunks():
+    # "12" | ".5" must decode as 12.5, not 12 followed by garbage
+    assert list(_ItemScanner([b'[12', b'.5, 3', b'e2]'], [()]).items()) == [12.5, 300.0]
+
+def test_items_are_yielded_before_the_stream_ends():
+    def chunks():
+        yield b'{"sessions": [{"_id": "s1"}, '
+        raise AssertionError("read past the first item")
+
+    assert next(_ItemScanner(chunks(), [("sessions",)]).items()) == {"_id": "s1"}
+
+def test_truncated_stream_raises():
+    with pytest.raises(ValueError):
+        list(_ItemScanner([b'{"sessions": [1, 2'], [("sessions",)]).items())
@@ -0,0 +1,110 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import test_cloudflare_frame_extraction as extraction
+from test_cloudflare_frame_extraction import PacketTimestampIndex
+
+@pytest.fixture
+def index():
+    # 12 frames at 0.1s with keyframes every 5 frames
+    return PacketTimestampIndex(np.arange(12) * 0.1, np.arange(12) % 5 == 0)
+
+def test_time_of_frame(index):
+    assert index.time_of_frame(0) == 0.0
+    assert index.time_of_frame(11) == pytest.approx(1.1)
+    assert index.time_of_frame(np.array([2, 4])) == pytest.approx([0.2, 0.4])
+    assert len(index) == 12
+
+def test_frame_at_time_is_clipped_at_the_edges(index):
+    assert index.frame_at_time(-1.0) == 0
+    assert index.frame_at_time(0.0) == 0
+    # A frame stays on screen until the next one starts
+    start = index.time_of_frame(3)
+    assert index.frame_at_time(start) == 3
+    assert index.frame_at_time(start - 1e-9) == 2
+    assert index.frame_at_time(60.0) == 11
+    assert index.frame_at_time(np.array([-1.0, 0.55, 60.0])).tolist() == [0, 5, 11]
+
+def test_keyframe_at_or_before(index):
+    assert index.keyframe_at_or_before(0) == 0
+    assert index.keyframe_at_or_before(4) == 0
+    assert index.keyframe_at_or_before(5) == 5
+    assert index.keyframe_at_or_before(11) == 10
+    assert index.keyframe_at_or_before(np.array([3, 7, 10])).tolist() == [0, 5, 10]
+
+def test_gop_sizes(index):
+    assert index.gop_sizes().tolist() == [5, 5, 2]
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "video.mp4.pts.npz")
+    index.save(path)
+    loaded = PacketTimestampIndex.load(path)
+    assert np.array_equal(loaded.pts, index.pts)
+    assert np.array_equal(loaded.keyframes, index.keyframes)
+    assert loaded.keyframe_indices.tolist() == [0, 5, 10]
+
+def test_load_or_build_reuses_a_fresh_index(index, tmp_path, monkeypatch):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"not decoded")
+    index.save(str(video) + extraction.TIMESTAMP_INDEX_SUFFIX)
+
+    monkeypatch.setattr(PacketTimestampIndex, 'build',
+                        classmethod(lambda cls, source: pytest.fail("index was rebuilt")))
+    assert len(PacketTimestampIndex.load_or_build(str(video))) == 12
+
+def test_load_or_build_rebuilds_a_stale_index(index, tmp_path, monkeypatch):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"not decoded")
+    index_path = str(video) + extraction.TIMESTAMP_INDEX_SUFFIX
+    index.save(index_path)
+    os.utime(index_path, (0, 0))
+
+    rebuilt = PacketTimestampIndex(np.arange(3) * 0.5, np.array([True, False, False]))
+    monkeypatch.setattr(PacketTimestampIndex, 'build', classmethod(lambda cls, source: rebuilt))
+    assert len(PacketTimestampIndex.load_or_build(str(video))) == 3
+    assert len(PacketTimestampIndex.load(index_path)) == 3
+
+def test_build_sorts_packets_into_presentation_order(monkeypatch):
+    # Decode order of an IPBB stream, offset by a nonzero start time
+    packets = [(1.0, True), (1.3, False), (1.1, False), (1.2, False)]
+    monkeypatch.setattr(extraction, 'av', None)
+    monkeypatch.setattr(extraction, '_ffprobe_packets', lambda source: packets)
+    index = PacketTimestampIndex.build("video.mp4")
+    assert index.pts == pytest.approx([0.0, 0.1, 0.2, 0.3])
+    assert index.keyframes.tolist() == [True, False, False, False]
+
+def test_build_without_packets(monkeypatch):
+    monkeypatch.setattr(extraction, 'av', None)
+    monkeypatch.setattr(extraction, '_ffprobe_packets', lambda source: [])
+    with pytest.raises(ValueError):
+        PacketTimestampIndex.build("video.mp4")
+
+def test_build_without_pyav_or_ffprobe(monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("ffprobe")
+    monkeypatch.setattr(extraction, 'av', None)
+    monkeypatch.setattr(extraction.subprocess, 'run', missing)
+    with pytest.raises(RuntimeError):
+        PacketTimestampIndex.build("video.mp4")
+
+def test_build_reads_a_real_container(tmp_path):
+    if extraction.av is None and not shutil.which('ffprobe'):
+        pytest.skip("Needs PyAV or ffprobe")
+    cv2 = pytest.importorskip("cv2")
+    path = str(tmp_path / "video.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 25, (32, 32))
+    if not writer.isOpened():
+        pytest.skip("No mp4v encoder available")
+    for i in range(40):
+        writer.write(np.full((32, 32, 3), i * 6, dtype=np.uint8))
+    writer.release()
+
+    index = PacketTimestampIndex.load_or_build(path)
+    assert len(index) == 40
+    assert index.pts[0] == 0.0
+    assert np.diff(index.pts) == pytest.approx(np.full(39, 1 / 25))
+    assert index.keyframes[0]
+    assert os.path.exists(path + extraction.TIMESTAMP_INDEX_SUFFIX)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import test_real_cloudflare_integration as integration
+from test_real_cloudflare_integration import AsyncRateLimiter, AsyncSessionCrawler
+
+class FakeClient:
+    def set_pool_size(self, size):
+        self.pool_size = size
+
+class FakeTester:
+    """Backend calls that sleep briefly and record which threads they ran on"""
+
+    backend_url = 'http://backend.test'
+    cache = None
+
+    def __init__(self):
+        self.client = FakeClient()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.analysis_threads = set()
+
+    def get_session_details(self, session_id):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        if session_id == 'broken':
+            raise RuntimeError("backend exploded")
+        if session_id == 'bare':
+            return {'_id': session_id}
+        return {'_id': session_id, 'analytics_id': f"a-{session_id}"}
+
+    def get_analytics_table(self, analytics_id):
+        return integration.FrameTable.from_records(
+            [{'frame_number': i, 'timestamp': i / 30} for i in range(10)])
+
+    def analyze_video_timestamps(self, frame_table):
+        self.analysis_threads.add(threading.current_thread().name)
+        return {'alignment_issues': []}
+
+    def generate_frame_timestamp_mapping(self, frame_table):
+        return integration.FrameTimeIndex.from_table(frame_table)
+
+def crawl(tmp_path, sessions, concurrency=3):
+    tester = FakeTester()
+    crawler = AsyncSessionCrawler(tester, concurrency=concurrency, requests_per_second=1000,
+                                  output_file=str(tmp_path / "crawl.jsonl"))
+    summary = asyncio.run(crawler.crawl(sessions))
+    with open(crawler.output_file) as f:
+        results = [json.loads(line) for line in f]
+    return tester, summary, results
+
+def test_every_session_gets_one_result(tmp_path):
+    sessions = [{'_id': f"s{i}"} for i in range(20)] + [{'_id': 'bare'}, {'_id': 'broken'}]
+    tester, summary, results = crawl(tmp_path, sessions)
+
+    assert sorted(result['session_id'] for result in results) == sorted(s['_id'] for s in sessions)
+    assert (summary['total'], summary['ok'], summary['skipped'], summary['error']) == (22, 20, 1, 1)
+    assert tester.max_active <= 3
+
+def test_analysis_runs_off_the_event_loop(tmp_path):
+    tester, _, results = crawl(tmp_path, [{'_id': 's1'}, {'_id': 's2'}])
+    assert tester.analysis_threads and threading.main_thread().name not in tester.analysis_threads
+    assert results[0]['frame_mapping_metadata']['indexed_frames'] == 10
+
+def test_sessions_are_pulled_only_as_workers_free_up(tmp_path):
+    pulled = []
+    finished = []
+
+    def sessions():
+        for i in range(30):
+            # Workers plus the queue bound how far ahead the producer runs
+            assert len(pulled) - len(finished) <= 2 * 3 + 1
+            pulled.append(i)
+            yield {'_id': f"s{i}"}
+
+    tester = FakeTester()
+    original = tester.get_session_details
+
+    def details(session_id):
+        try:
+            return original(session_id)
+        finally:
+            finished.append(session_id)
+
+    tester.get_session_details = details
+    crawler = AsyncSessionCrawler(tester, concurrency=3, requests_per_second=1000,
+                                  output_file=str(tmp_path / "crawl.jsonl"))
+    summary = asyncio.run(crawler.crawl(sessions()))
+    assert summary['total'] == summary['ok'] == 30
+
+def test_rate_limiter_spaces_requests_per_host():
+    async def run():
+        limiter = AsyncRateLimiter(rate=50, burst=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await limiter.acquire('a')
+        await limiter.acquire('b')
+        return time.monotonic() - start
+
+    # Two burst tokens, then four more at 50 per second; 'b' has its own bucket
+    assert 0.07 <= asyncio.run(run()) < 0.5
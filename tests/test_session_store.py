@@ -0,0 +1,126 @@
+import json
+
+import pytest
+import requests
+
+import session_store
+from session_store import SessionStore, normalize_created_at
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = json.dumps(body).encode()
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        # Small chunks so records straddle chunk boundaries
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+    def close(self):
+        self.closed = True
+
+class FakeClient:
+    """Serves /getSessions like a backend that honours since/since_id"""
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.requests = []
+        self.status_code = 200
+
+    def get(self, path, params=None, stream=False):
+        assert path == "/getSessions"
+        self.requests.append(dict(params or {}))
+        sessions = self.sessions
+        if params:
+            since = (params['since'], params['since_id'])
+            sessions = [s for s in sessions if (normalize_created_at(s['created_at']), s['_id']) > since]
+        return FakeResponse(self.status_code, {'sessions': sessions})
+
+def session(session_id, created_at, **extra):
+    return dict({'_id': session_id, 'created_at': created_at, 'video_size': 10}, **extra)
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    yield store
+    store.close()
+
+def test_normalize_created_at():
+    assert normalize_created_at('2025-01-02T00:00:00+05:00') == '2025-01-01T19:00:00.000000Z'
+    assert normalize_created_at('2025-01-01T19:00:00.5Z') == '2025-01-01T19:00:00.500000Z'
+    assert normalize_created_at('2025-01-01 19:00:00') == '2025-01-01T19:00:00.000000Z'
+    assert normalize_created_at('yesterday') is None
+    assert normalize_created_at(None) is None
+
+def test_first_sync_is_full_then_incremental_from_the_watermark(store):
+    client = FakeClient([session('a', '2025-01-01T00:00:00Z'), session('b', '2025-01-02T00:00:00Z')])
+    counts = store.sync(client)
+    assert counts['full'] and counts['inserted'] == 2
+    assert client.requests == [{}]
+
+    client.sessions.append(session('c', '2025-01-03T00:00:00+00:00'))
+    counts = store.sync(client)
+    assert not counts['full']
+    assert client.requests[-1] == {'since': '2025-01-02T00:00:00.000000Z', 'since_id': 'b'}
+    assert (counts['received'], counts['inserted']) == (1, 1)
+    assert store.watermark() == ('2025-01-03T00:00:00.000000Z', 'c')
+    assert [s['_id'] for s in store.iter_sessions(batch_size=2)] == ['a', 'b', 'c']
+
+def test_watermark_compares_normalized_times(store):
+    # The later instant sorts first as a raw string
+    client = FakeClient([session('late', '2025-01-01T23:00:00Z'), session('early', '2025-01-02T01:00:00+05:00')])
+    store.sync(client)
+    assert store.watermark() == ('2025-01-01T23:00:00.000000Z', 'late')
+
+def test_full_sync_detects_changes_and_deletions(store):
+    client = FakeClient([session('a', '2025-01-01T00:00:00Z'), session('b', '2025-01-02T00:00:00Z')])
+    store.sync(client)
+
+    client.sessions = [session('a', '2025-01-01T00:00:00Z', video_size=99)]
+    counts = store.sync(client, full=True)
+    assert (counts['updated'], counts['deleted'], counts['unchanged']) == (1, 1, 0)
+    assert store.get('a')['video_size'] == 99
+    assert store.get('b') is None
+
+def test_empty_full_listing_keeps_the_local_copy(store):
+    client = FakeClient([session('a', '2025-01-01T00:00:00Z')])
+    store.sync(client)
+    client.sessions = []
+    assert store.sync(client, full=True)['deleted'] == 0
+    assert store.count() == 1
+
+def test_backend_errors_raise_and_leave_the_store_alone(store):
+    client = FakeClient([session('a', '2025-01-01T00:00:00Z')])
+    client.status_code = 503
+    with pytest.raises(requests.RequestException):
+        store.sync(client)
+    assert store.count() == 0
+
+def test_queries(store):
+    store.sync(FakeClient([
+        session('a', '2025-01-01T00:00:00Z', analytics_size=5, analytics_id='x1', meta={'cloudflare_uid': 'u1'}),
+        session('b', '2025-01-03T00:00:00Z', video_size=500),
+        session('c', '2025-01-02T12:00:00+02:00'),
+    ]))
+    assert [s['_id'] for s in store.largest(limit=2)] == ['b', 'a']
+    assert [s['_id'] for s in store.created_between('2025-01-01T12:00:00Z', '2025-01-03T00:00:00Z')] == ['c']
+    assert store.by_cloudflare_uid('u1')['_id'] == 'a'
+    assert store.by_analytics_id('x1')['_id'] == 'a'
+    assert store.remove(['a', 'missing']) == 1
+    assert store.stats()['sessions'] == 2
+
+def test_older_stores_are_reindexed_on_open(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    store = SessionStore(path)
+    store.sync(FakeClient([session('a', '2025-01-02T01:00:00+05:00')]))
+    # Simulate a version 0 store that kept created_at as sent
+    with store.db:
+        store.db.execute("UPDATE sessions SET created_at = '2025-01-02T01:00:00+05:00'")
+        store.db.execute("PRAGMA user_version = 0")
+    store.close()
+
+    store = SessionStore(path)
+    assert store.watermark() == ('2025-01-01T20:00:00.000000Z', 'a')
+    assert store.db.execute("PRAGMA user_version").fetchone()[0] == session_store.SCHEMA_VERSION
+    store.close()
@@ -0,0 +1,84 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from test_cloudflare_frame_extraction import SharedFrameRing
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(2, 64)
+    yield ring
+    ring.close()
+
+def frame_mean(frame):
+    return float(frame.mean())
+
+def frame_fails(frame):
+    raise ValueError("bad frame")
+
+def test_write_and_view_round_trip(ring):
+    frame = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+    slot = ring.acquire()
+    shape, dtype = ring.write(slot, frame)
+    view = ring.view(slot, shape, dtype)
+    assert np.array_equal(view, frame)
+    # The view maps the slot rather than holding a copy
+    assert not view.flags.owndata
+
+def test_slots_do_not_overlap(ring):
+    first, second = ring.acquire(), ring.acquire()
+    ring.write(first, np.full(64, 1, dtype=np.uint8))
+    ring.write(second, np.full(64, 2, dtype=np.uint8))
+    assert ring.view(first, (64,), '|u1').tolist() == [1] * 64
+
+def test_acquire_times_out_when_every_slot_is_busy(ring):
+    slots = {ring.acquire(), ring.acquire()}
+    assert slots == {0, 1}
+    with pytest.raises(TimeoutError):
+        ring.acquire(timeout=0.05)
+    ring.release(1)
+    assert ring.acquire(timeout=1) == 1
+
+def test_oversized_frames_are_rejected(ring):
+    with pytest.raises(ValueError):
+        ring.write(ring.acquire(), np.zeros(65, dtype=np.uint8))
+
+def worker_sum(ring, slot, shape, dtype, results):
+    results.put(int(ring.view(slot, shape, dtype).sum()))
+    ring.release(slot)
+    ring.shm.close()
+
+def test_ring_is_shared_with_worker_processes():
+    # Spawned workers receive the ring pickled rather than inherited
+    context = multiprocessing.get_context('spawn')
+    ring = SharedFrameRing(1, 64, context=context)
+    try:
+        # Attaches by name without becoming the owner
+        copy = SharedFrameRing.__new__(SharedFrameRing)
+        copy.__setstate__(ring.__getstate__())
+        assert copy.shm.name == ring.shm.name and not copy.owner
+        copy.shm.close()
+
+        results = context.Queue()
+        slot = ring.acquire()
+        shape, dtype = ring.write(slot, np.full(10, 3, dtype=np.uint8))
+        process = context.Process(target=worker_sum, args=(ring, slot, shape, dtype, results))
+        process.start()
+        assert results.get(timeout=10) == 30
+        process.join()
+        # The worker handed the slot back
+        assert ring.acquire(timeout=1) == slot
+    finally:
+        ring.close()
+
+def test_process_frames_shared_matches_in_process_results(extractor):
+    expected = [frame_mean(frame) for _, frame in extractor.iter_frames(10, 'read', retrieve=True)]
+    records = extractor.process_frames_shared(frame_mean, sample_rate=10, workers=2, slots=2, strategy='read')
+    assert [record['frame_number'] for record in records] == list(range(1, 76, 10))
+    assert [record['analysis'] for record in records] == expected
+
+def test_process_frames_shared_reports_worker_errors(extractor):
+    records = extractor.process_frames_shared(frame_fails, sample_rate=25, workers=1, strategy='read')
+    assert len(records) == 3
+    assert all(record['analysis'] is None for record in records)
@@ -0,0 +1,52 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("cv2")
+import test_cloudflare_frame_extraction as extraction
+
+class DelayedHandler(http.server.BaseHTTPRequestHandler):
+    # path -> (delay seconds, status)
+    routes = {'/direct.mp4': (0.3, 200), '/iframe': (0.0, 200), '/missing': (0.0, 404)}
+
+    def do_HEAD(self):
+        delay, status = self.routes.get(self.path, (0.0, 404))
+        time.sleep(delay)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DelayedHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+def test_slower_preferred_url_beats_faster_fallback(server):
+    url, definitive = extraction._probe_stream_urls([f"{server}/direct.mp4", f"{server}/iframe"])
+    assert (url, definitive) == (f"{server}/direct.mp4", True)
+
+def test_fallback_is_used_once_preferred_urls_fail(server):
+    url, _ = extraction._probe_stream_urls([f"{server}/missing", f"{server}/iframe"])
+    assert url == f"{server}/iframe"
+
+def test_http_failures_are_definitive_but_connection_errors_are_not(server):
+    assert extraction._probe_stream_urls([f"{server}/missing"]) == (None, True)
+    assert extraction._probe_stream_urls([f"{server}/missing", "http://127.0.0.1:9/x"],
+                                         timeout=2) == (None, False)
+
+def test_transient_failure_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, 'STREAM_URL_CACHE_PATH', str(tmp_path / "urls.json"))
+    monkeypatch.setattr(extraction, '_probe_stream_urls', lambda urls: (None, False))
+    assert extraction.CloudflareFrameExtractor(video_id="abc").get_stream_url() is None
+    assert extraction._load_stream_url_cache() == {}
+
+    monkeypatch.setattr(extraction, '_probe_stream_urls', lambda urls: (None, True))
+    extraction.CloudflareFrameExtractor(video_id="abc").get_stream_url()
+    assert extraction._load_stream_url_cache()["abc"]["url"] is None
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from test_cloudflare_frame_extraction import TUMBLING_PHASES, generate_synthetic_analytics
+
+RANGES = {
+    'acl_risk': (0, 100),
+    'left_knee_angle': (0, 180),
+    'right_knee_angle': (0, 180),
+    'elevation_angle': (0, 45),
+    'forward_lean': (-30, 30),
+    'landing_force': (0, 2000),
+    'quality_score': (0, 100),
+}
+
+@pytest.fixture(scope="module")
+def analytics():
+    return generate_synthetic_analytics(5000, seed=7, fps=30, sample_rate=2)
+
+def test_same_seed_gives_the_same_columns(analytics):
+    again = generate_synthetic_analytics(5000, seed=7, fps=30, sample_rate=2)
+    assert analytics.columns.keys() == again.columns.keys()
+    for name, column in analytics.columns.items():
+        assert np.array_equal(column, again.columns[name]), name
+    other = generate_synthetic_analytics(5000, seed=8, fps=30, sample_rate=2)
+    assert not np.array_equal(analytics.columns['acl_risk'], other.columns['acl_risk'])
+
+def test_values_stay_in_range(analytics):
+    assert len(analytics) == 5000
+    for name, (low, high) in RANGES.items():
+        column = analytics.columns[name]
+        assert len(column) == 5000
+        assert low <= column.min() and column.max() <= high, name
+
+def test_phases_cycle_in_order(analytics):
+    phase = analytics.columns['tumbling_phase']
+    changes = phase[1:][phase[1:] != phase[:-1]]
+    previous = phase[:-1][phase[1:] != phase[:-1]]
+    assert phase[0] == 0
+    assert np.array_equal(changes, (previous + 1) % len(TUMBLING_PHASES))
+
+def test_landings_carry_the_force(analytics):
+    force = analytics.columns['landing_force']
+    landing = analytics.columns['tumbling_phase'] == 3
+    assert force[landing].mean() > 5 * force[~landing].mean()
+    risk = analytics.columns['acl_risk']
+    assert risk[landing].mean() > risk[~landing].mean()
+
+def test_default_records(analytics):
+    records = list(analytics.iter_records())
+    assert len(records) == 5000
+    assert [r['frame_number'] for r in records[:3]] == [1, 3, 5]
+    assert records[3]['video_time'] == pytest.approx(6 / 30)
+    assert records[3]['timestamp'] == pytest.approx(200.0)
+    analytics_row = records[3]['analytics']
+    assert analytics_row['tumbling_phase'] in TUMBLING_PHASES
+    assert analytics_row['acl_risk'] == analytics.columns['acl_risk'][3]
+    assert set(analytics_row) == set(RANGES) | {'tumbling_phase'}
+
+def test_records_for_given_frames():
+    analytics = generate_synthetic_analytics(3, seed=1)
+    frames = [{'frame_number': n} for n in (10, 20, 30, 40)]
+    records = analytics.to_records(frames)
+    # One row per frame, stopping at whichever runs out first
+    assert [r['frame_number'] for r in records] == [10, 20, 30]
+    assert records[1]['analytics'] == analytics.analytics_at(1)
+
+def test_empty():
+    analytics = generate_synthetic_analytics(0, seed=1)
+    assert len(analytics) == 0
+    assert analytics.to_records() == []
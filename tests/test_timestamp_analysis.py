@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from test_real_cloudflare_integration import TIMESTAMP_GAP_FACTOR, RealCloudflareIntegrationTester
+
+@pytest.fixture
+def tester(monkeypatch):
+    # The analysis never touches the backend
+    monkeypatch.setattr(RealCloudflareIntegrationTester, 'test_server_connection', lambda self: True)
+    return RealCloudflareIntegrationTester("http://backend.test")
+
+def records(timestamps, frame_numbers=None):
+    frame_numbers = range(len(timestamps)) if frame_numbers is None else frame_numbers
+    return [{'frame_number': n, 'timestamp': t, 'relative_timestamp': t}
+            for n, t in zip(frame_numbers, timestamps)]
+
+def test_clean_timeline_has_no_issues(tester):
+    analysis = tester.analyze_video_timestamps(records([i / 30 for i in range(300)]))
+    assert analysis['total_frames'] == 300
+    assert analysis['alignment_issues'] == []
+    info = analysis['timestamp_info']
+    assert info['median_interval'] == pytest.approx(1 / 30)
+    assert info['gap_count'] == info['duplicate_timestamp_count'] == info['backward_timestamp_count'] == 0
+    assert analysis['frame_structure']['missing_frame_count'] == 0
+
+def test_every_frame_is_checked_not_a_sample(tester):
+    timestamps = np.arange(20000) / 30
+    # One gap, one repeat and one step back near the end of a long timeline
+    timestamps[19000:] += 1.0
+    timestamps[19500] = timestamps[19499]
+    timestamps[19900] = timestamps[19899] - 0.01
+    analysis = tester.analyze_video_timestamps(records(timestamps.tolist()))
+    info = analysis['timestamp_info']
+
+    intervals = np.diff(timestamps)
+    assert info['gap_count'] == int((intervals > TIMESTAMP_GAP_FACTOR * np.median(intervals[intervals > 0])).sum())
+    assert 19000 in info['gap_positions']
+    assert info['duplicate_timestamp_count'] == 1
+    assert info['backward_timestamp_count'] == 1
+    assert len(analysis['alignment_issues']) == 3
+
+def test_frame_structure_counts_missing_and_repeated_frames(tester):
+    frame_numbers = [5, 6, 7, 9, 9, 12]
+    analysis = tester.analyze_video_timestamps(records([n / 30 for n in frame_numbers], frame_numbers))
+    structure = analysis['frame_structure']
+    assert (structure['first_frame'], structure['last_frame']) == (5, 12)
+    assert structure['duplicate_frame_count'] == 1
+    # 8, 10 and 11
+    assert structure['missing_frame_count'] == 3
+    assert "Frame numbers are not sequential" in analysis['alignment_issues']
+
+def test_frames_without_timestamps(tester):
+    analysis = tester.analyze_video_timestamps({'frame_data': [{'frame_number': 1}, {'frame_number': 2}]})
+    assert analysis['timestamp_info'] == {}
+    assert "Add timestamps to frame data" in analysis['recommendations']
+
+def test_unix_timestamps_are_flagged(tester):
+    analysis = tester.analyze_video_timestamps(records([1.7e9 + i / 30 for i in range(10)]))
+    assert analysis['timestamp_info']['timestamp_type'] == 'unix'
+    assert "Convert Unix timestamps to relative time" in analysis['recommendations']
+
+def test_empty_payload(tester):
+    analysis = tester.analyze_video_timestamps([])
+    assert analysis['alignment_issues'] == ["No frame data found in analytics"]
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import video_dedup
+from video_dedup import BKTree, DuplicateDetector, VideoHashCache, _groups, hamming
+
+def test_groups_are_connected_components():
+    pairs = [('a', 'b'), ('c', 'b'), ('d', 'e')]
+    assert _groups(pairs, ['a', 'b', 'c', 'd', 'e', 'f']) == [['a', 'b', 'c'], ['d', 'e']]
+
+def test_bktree_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # Near copies so some queries have matches
+    values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+    tree = BKTree()
+    for key, value in enumerate(values):
+        tree.add(value, key)
+
+    for probe in values[:40] + [rng.getrandbits(64) for _ in range(10)]:
+        expected = {(key, hamming(probe, value)) for key, value in enumerate(values)
+                    if hamming(probe, value) <= 12}
+        assert set(tree.query(probe, 12)) == expected
+
+def session(session_id, size=100):
+    return {'_id': session_id, 'original_filename': f"{session_id}.mp4", 'video_size': size,
+            'created_at': f"2025-01-0{session_id[-1]}T00:00:00Z"}
+
+@pytest.fixture
+def detector(tmp_path, monkeypatch):
+    if video_dedup.cv2 is None:
+        pytest.skip("OpenCV is not installed")
+    signatures = {}
+
+    def perceptual_hash(self, url):
+        signature = signatures[url]
+        if isinstance(signature, Exception):
+            raise signature
+        return signature
+
+    monkeypatch.setattr(DuplicateDetector, 'perceptual_hash', perceptual_hash)
+    detector = DuplicateDetector(None, None, cache=VideoHashCache(str(tmp_path / "hashes.sqlite3")),
+                                 video_url=lambda s: s['_id'], workers=1, max_distance=4)
+    detector.signatures = signatures
+    return detector
+
+def test_near_duplicates_group_similar_signatures(detector):
+    detector.signatures.update({'s1': '00ff', 's2': '00fe', 's3': 'ff00'})
+    sessions = [session('s1'), session('s2'), session('s3')]
+    assert detector.near_duplicates(sessions) == [['s1', 's2']]
+
+def test_exact_copies_of_an_unhashable_video_are_left_out(detector):
+    # s1 and s2 are exact copies; s1 is the one hashed and its decode fails
+    detector.signatures.update({'s1': video_dedup.cv2.error("corrupt stream"), 's3': '00ff'})
+    sessions = [session('s1'), session('s2'), session('s3')]
+    assert detector.near_duplicates(sessions, exclude=[['s1', 's2']]) == []
+
+def test_exact_copies_follow_their_hashed_original(detector):
+    detector.signatures.update({'s1': '00ff', 's3': '00fe'})
+    sessions = [session('s1'), session('s2'), session('s3')]
+    assert detector.near_duplicates(sessions, exclude=[['s1', 's2']]) == [['s1', 's2', 's3']]
+
+def test_near_duplicates_do_not_chain_past_the_oldest_session(detector):
+    # s2 is close to both, but s3 is 8 bits from s1, the session that is kept
+    detector.signatures.update({'s1': '0000', 's2': '000f', 's3': '00ff'})
+    sessions = [session('s3'), session('s2'), session('s1')]
+    assert detector.near_duplicates(sessions) == [['s1', 's2']]
+
+def test_duplicate_savings_compares_created_at_across_formats():
+    sessions_by_id = {
+        'utc': {'_id': 'utc', 'created_at': '2025-01-01T20:00:00Z', 'video_size': 10},
+        # Earlier instant, but sorts later as a raw string
+        'offset': {'_id': 'offset', 'created_at': '2025-01-02T00:00:00+05:00', 'video_size': 10},
+    }
+    [entry] = video_dedup.duplicate_savings([['utc', 'offset']], sessions_by_id)
+    assert entry['keep'] == 'offset'
+    assert entry['remove'] == ['utc']
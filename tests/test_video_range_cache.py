@@ -0,0 +1,141 @@
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+from conftest import VIDEO_FRAMES
+from test_cloudflare_frame_extraction import CloudflareFrameExtractor, VideoRangeCache
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves `files` with Range support on /video paths, failing the ranges listed in `broken`"""
+
+    files = {}
+    broken = set()
+    requests = []
+
+    def _headers(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.path.startswith('/video'):
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.requests.append(('HEAD', self.path, None))
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        body, content_type = self.files[self.path]
+        self._headers(200, body, content_type)
+
+    def do_GET(self):
+        body, content_type = self.files[self.path]
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        self.requests.append(('GET', self.path, match and (int(match[1]), int(match[2]))))
+        if match and self.path.startswith('/video'):
+            first, last = int(match[1]), int(match[2])
+            if (first, last) in self.broken:
+                self.send_error(500)
+                return
+            part = body[first:last + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {first}-{last}/{len(body)}')
+            self.send_header('Content-Length', str(len(part)))
+            self.end_headers()
+            self.wfile.write(part)
+            return
+        self._headers(200, body, content_type)
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    RangeHandler.files = {
+        '/video.mp4': (bytes(range(256)) * 40, 'video/mp4'),
+        '/video-b.mp4': (b'b' * 3000, 'video/mp4'),
+        '/plain.mp4': (b'p' * 2500, 'application/octet-stream'),
+        '/page': (b'<html></html>', 'text/html'),
+    }
+    RangeHandler.broken = set()
+    RangeHandler.requests = []
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def cache(tmp_path, **kwargs):
+    kwargs.setdefault('chunk_bytes', 1000)
+    videos = VideoRangeCache(str(tmp_path / "videos"), **kwargs)
+    # Keep retries of failed requests quick
+    videos.client.backoff_base = videos.client.backoff_max = 0.001
+    return videos
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def ranges():
+    return sorted(r for method, _, r in RangeHandler.requests if method == 'GET')
+
+def test_download_in_ranges_then_hit_without_network(server, tmp_path):
+    videos = cache(tmp_path)
+    path = videos.local_path(server + "/video.mp4")
+    assert read(path) == RangeHandler.files['/video.mp4'][0]
+    # 10240 bytes in 1000-byte chunks, the last one short
+    assert ranges() == [(first, min(first + 999, 10239)) for first in range(0, 10240, 1000)]
+
+    RangeHandler.requests.clear()
+    assert cache(tmp_path).local_path(server + "/video.mp4") == path
+    assert RangeHandler.requests == []
+
+def test_interrupted_download_resumes_missing_chunks(server, tmp_path):
+    RangeHandler.broken = {(3000, 3999)}
+    assert cache(tmp_path).local_path(server + "/video.mp4") is None
+
+    RangeHandler.broken = set()
+    RangeHandler.requests.clear()
+    path = cache(tmp_path).local_path(server + "/video.mp4")
+    assert read(path) == RangeHandler.files['/video.mp4'][0]
+    # Only the failed chunk was fetched again
+    assert ranges() == [(3000, 3999)]
+
+def test_servers_without_ranges_are_downloaded_whole(server, tmp_path):
+    path = cache(tmp_path).local_path(server + "/plain.mp4")
+    assert read(path) == b'p' * 2500
+    assert ranges() == [None]
+
+def test_non_video_urls_are_not_cached(server, tmp_path):
+    videos = cache(tmp_path)
+    assert videos.local_path(server + "/page") is None
+    assert videos.local_path(server + "/missing.mp4") is None
+    assert videos.local_path("http://127.0.0.1:9/video.mp4") is None
+    assert videos.stats()['videos'] == 0
+
+def test_least_recently_used_videos_are_evicted(server, tmp_path):
+    videos = cache(tmp_path, max_bytes=14000)
+    first = videos.local_path(server + "/video.mp4")
+    second = videos.local_path(server + "/video-b.mp4")
+    assert videos.stats() == {'videos': 2, 'bytes': 13240, 'max_bytes': 14000}
+
+    # Touch the first video so the second is the one evicted
+    videos.local_path(server + "/video.mp4")
+    videos.local_path(server + "/plain.mp4")
+    assert os.path.exists(first) and not os.path.exists(second)
+    assert videos.stats()['bytes'] == 10240 + 2500
+
+def test_load_video_reads_the_cached_copy(server, tmp_path, video):
+    RangeHandler.files['/video-real.mp4'] = (read(video), 'video/mp4')
+    extractor = CloudflareFrameExtractor(video_url=server + "/video-real.mp4",
+                                         video_cache=cache(tmp_path, chunk_bytes=4096))
+    assert extractor.load_video()
+    try:
+        assert extractor.stream_url.startswith(str(tmp_path))
+        assert extractor.total_frames == VIDEO_FRAMES
+    finally:
+        extractor.cap.release()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Duplicate video detection for the database cleanup tool
+
+Two passes over the sessions in the local session store:
+1. Exact duplicates. Only videos whose byte size matches another video's
+   can be identical, so only those are downloaded. Each is streamed
+   through SHA-256 in chunks and the sessions are grouped by digest.
+2. Near duplicates (re-encodes, rescaled or recompressed re-uploads).
+   PHASH_FRAMES evenly spaced frames are decoded as small grayscale images
+   by the CloudflareFrameExtractor capture code. Each frame is reduced to a
+   64-bit DCT perceptual hash, and the frame hashes are joined into one
+   signature per video. Videos are visited oldest first. Each one joins the
+   group of the closest representative within PHASH_MAX_DISTANCE bits, or
+   becomes the representative of a new group. Representatives live in a
+   BK-tree keyed on Hamming distance, so not every pair is compared. Every
+   member is within the threshold of its group's oldest session, the one
+   that is kept. Groups do not chain through intermediate videos.
+
+Hashes are cached per session in SQLite next to the session store. Each
+cached hash is keyed by the video's filename and size, so later runs only
+hash new or changed videos.
+
+Usage:
+    python video_dedup.py [--backend-url URL] [--no-perceptual]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+import logging
+
+import numpy as np
+import requests
+
+from api_client import ApiClient
+from session_store import SessionStore, normalize_created_at
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+# Failures that skip one video rather than the whole pass: downloads,
+# local files, and OpenCV choking on a corrupt or unsupported stream
+_HASH_ERRORS = (requests.RequestException, OSError) + ((cv2.error,) if cv2 is not None else ())
+
+CONTENT_HASH_CHUNK_BYTES = 1024 * 1024
+# Frames sampled per video for the perceptual signature (64 bits each)
+PHASH_FRAMES = 8
+# Frames are shrunk to this size before the DCT; the hash keeps the 8x8 lowest frequencies
+PHASH_IMAGE_SIZE = 32
+# Largest Hamming distance between signatures still treated as the same video
+PHASH_MAX_DISTANCE = 48
+HASH_WORKERS = 4
+
+_HASH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_hashes (
+    session_id TEXT PRIMARY KEY,
+    video_key TEXT NOT NULL,
+    content_hash TEXT,
+    phash TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+def video_filename(session: Dict) -> Optional[str]:
+    return session.get('processed_video_filename') or session.get('original_filename')
+
+def video_key(session: Dict) -> Optional[str]:
+    """What a cached hash was computed from; a change invalidates it"""
+    filename = video_filename(session)
+    if not filename:
+        return None
+    return f"{filename}:{session.get('video_size') or 0}"
+
+def frame_phash(gray: np.ndarray) -> int:
+    """
+    64-bit DCT perceptual hash of a grayscale frame
+
+    Args:
+        gray: PHASH_IMAGE_SIZE x PHASH_IMAGE_SIZE uint8 image
+
+    Returns:
+        One bit per low-frequency coefficient: set where it exceeds the median
+    """
+    low = cv2.dct(np.float32(gray))[:8, :8].ravel()
+    # The DC term only tracks overall brightness and would skew the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes under Hamming distance"""
+
+    def __init__(self):
+        # Node: [hash, keys with that hash, {distance: child node}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, key):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def query(self, value: int, radius: int) -> Iterator[Tuple[object, int]]:
+        """Yield (key, distance) for every stored hash within radius of value"""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                for key in node[1]:
+                    yield key, distance
+            # Triangle inequality: only children at distance within radius can match
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+
+class VideoHashCache:
+    """Per-session content and perceptual hashes, stored beside the session store"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite file (normally the session store's own file)
+        """
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_HASH_SCHEMA)
+        self.lock = threading.Lock()
+
+    def get(self, session_id: str, key: str) -> Dict:
+        """Cached hashes for a session, empty if missing or computed from another video"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT video_key, content_hash, phash FROM video_hashes WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if not row or row[0] != key:
+            return {}
+        return {name: value for name, value in (('content_hash', row[1]), ('phash', row[2])) if value}
+
+    def put(self, session_id: str, key: str, **hashes):
+        """Store content_hash and/or phash, dropping hashes of an older video"""
+        cached = self.get(session_id, key)
+        cached.update(hashes)
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO video_hashes (session_id, video_key, content_hash, phash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, key, cached.get('content_hash'), cached.get('phash'), time.time())
+            )
+
+def _age_order(session: Dict) -> Tuple[str, str]:
+    """Sort key: oldest first, comparing created_at in one normalized UTC form"""
+    return normalize_created_at(session.get('created_at')) or '', session['_id']
+
+def _groups(pairs: List[Tuple[str, str]], members: List[str]) -> List[List[str]]:
+    """Connected components of a pair list (union-find), largest first"""
+    parent = {member: member for member in members}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+    components = {}
+    for member in members:
+        components.setdefault(find(member), []).append(member)
+    return sorted((sorted(group) for group in components.values() if len(group) > 1),
+                  key=lambda group: (-len(group), group[0]))
+
+class DuplicateDetector:
+    def __init__(self, client: ApiClient, store: SessionStore, cache: VideoHashCache = None,
+                 video_url: Callable[[Dict], Optional[str]] = None, workers: int = HASH_WORKERS,
+                 max_distance: int = PHASH_MAX_DISTANCE):
+        """
+        Args:
+            client: API client used to stream videos
+            store: Local session store the sessions come from
+            cache: Hash cache (default: tables in the store's own database)
+            video_url: Where a session's video can be read (default: the
+                backend's /getVideo endpoint)
+            workers: Videos hashed concurrently
+            max_distance: Near-duplicate threshold in signature bits
+        """
+        self.client = client
+        self.store = store
+        self.cache = cache or VideoHashCache(store.path)
+        self.video_url = video_url or self._backend_video_url
+        self.workers = workers
+        self.max_distance = max_distance
+
+    def _backend_video_url(self, session: Dict) -> Optional[str]:
+        filename = video_filename(session)
+        return self.client.url(f"/getVideo?video_filename={quote(filename)}") if filename else None
+
+    def content_hash(self, url: str) -> str:
+        """SHA-256 of a video, read in chunks so it is never held in memory"""
+        digest = hashlib.sha256()
+        if os.path.exists(url):
+            with open(url, 'rb') as f:
+                for block in iter(lambda: f.read(CONTENT_HASH_CHUNK_BYTES), b''):
+                    digest.update(block)
+            return digest.hexdigest()
+        with self.client.get(url, stream=True, conditional=False) as response:
+            response.raise_for_status()
+            for block in response.iter_content(CONTENT_HASH_CHUNK_BYTES):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def perceptual_hash(self, url: str) -> Optional[str]:
+        """
+        Signature of PHASH_FRAMES evenly spaced frames, as hex
+
+        Returns:
+            The signature, or None if the video could not be decoded or is too short
+        """
+        # Imported here: the extraction module configures logging when imported
+        from test_cloudflare_frame_extraction import CloudflareFrameExtractor
+        extractor = CloudflareFrameExtractor(video_url=url)
+        try:
+            if not extractor.load_video() or extractor.total_frames <= PHASH_FRAMES:
+                return None
+            extractor.set_decode_options(size=(PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), grayscale=True)
+            # Sample positions 1..PHASH_FRAMES of PHASH_FRAMES + 1 steps, skipping the
+            # opening frame, which is black or a fade-in for many uploads
+            sample_rate = extractor.total_frames // (PHASH_FRAMES + 1)
+            signature = 0
+            sampled = 0
+            for record, image in extractor.iter_frames(sample_rate=sample_rate, retrieve=True):
+                if record['frame_number'] == 1:
+                    continue
+                signature = (signature << 64) | frame_phash(image)
+                sampled += 1
+                if sampled == PHASH_FRAMES:
+                    break
+            if sampled < PHASH_FRAMES:
+                return None
+            return f"{signature:0{PHASH_FRAMES * 16}x}"
+        finally:
+            # Not extractor.cleanup(): destroyAllWindows fails on headless OpenCV builds
+            if extractor.cap:
+                extractor.cap.release()
+
+    def _hash_sessions(self, sessions: List[Dict], name: str, compute: Callable[[str], Optional[str]]) -> Dict[str, str]:
+        """
+        Cached-or-computed hash per session
+
+        Returns:
+            session_id -> hash for every session that could be hashed
+        """
+        hashes = {}
+        missing = []
+        for session in sessions:
+            key = video_key(session)
+            cached = self.cache.get(session['_id'], key).get(name)
+            if cached:
+                hashes[session['_id']] = cached
+            else:
+                missing.append(session)
+        logger.info(f"🔑 {name}: {len(hashes)} cached, {len(missing)} to compute")
+
+        def work(session):
+            url = self.video_url(session)
+            if not url:
+                return session, None
+            try:
+                return session, compute(url)
+            except _HASH_ERRORS as e:
+                logger.warning(f"⚠️ Could not hash video for {session['_id']}: {e}")
+                return session, None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for done, (session, value) in enumerate(pool.map(work, missing), 1):
+                if value:
+                    hashes[session['_id']] = value
+                    self.cache.put(session['_id'], video_key(session), **{name: value})
+                if done % 10 == 0 or done == len(missing):
+                    logger.info(f"🔑 {name}: computed {done}/{len(missing)}")
+        return hashes
+
+    def exact_duplicates(self, sessions: List[Dict]) -> List[List[str]]:
+        """Groups of session IDs whose videos are byte-for-byte identical, oldest first"""
+        by_size = {}
+        for session in sessions:
+            if video_key(session) and session.get('video_size'):
+                by_size.setdefault(session['video_size'], []).append(session)
+        candidates = [session for group in by_size.values() if len(group) > 1 for session in group]
+        hashes = self._hash_sessions(candidates, 'content_hash', self.content_hash)
+
+        by_hash = {}
+        for session in candidates:
+            digest = hashes.get(session['_id'])
+            if digest:
+                by_hash.setdefault(digest, []).append(session)
+        # Oldest first: the session duplicate_savings keeps
+        groups = [[s['_id'] for s in sorted(group, key=_age_order)] for group in by_hash.values() if len(group) > 1]
+        return sorted(groups, key=lambda group: (-len(group), group[0]))
+
+    def near_duplicates(self, sessions: List[Dict], exclude: List[List[str]] = ()) -> List[List[str]]:
+        """
+        Groups of session IDs whose videos look the same
+
+        Args:
+            sessions: Sessions to compare
+            exclude: Exact duplicate groups; only the first session of each is
+                hashed and the rest are folded back into its group (unless
+                it could not be hashed, in which case they are left out)
+
+        Returns:
+            Groups in which every session is within max_distance of the
+            group's oldest session
+        """
+        if cv2 is None:
+            logger.warning("⚠️ OpenCV is not installed; skipping the perceptual pass")
+            return []
+        copies = {session_id: group[0] for group in exclude for session_id in group[1:]}
+        hashes = self._hash_sessions([s for s in sessions if video_key(s) and s['_id'] not in copies],
+                                     'phash', self.perceptual_hash)
+
+        # Only representatives go in the tree, so a video is grouped by its
+        # distance to the group's oldest session rather than to any member
+        by_id = {session['_id']: session for session in sessions}
+        tree = BKTree()
+        pairs = []
+        for session_id in sorted(hashes, key=lambda s: _age_order(by_id[s])):
+            value = int(hashes[session_id], 16)
+            matches = list(tree.query(value, self.max_distance))
+            if matches:
+                representative, _ = min(matches, key=lambda m: (m[1], _age_order(by_id[m[0]])))
+                pairs.append((representative, session_id))
+            else:
+                tree.add(value, session_id)
+        copies = {session_id: target for session_id, target in copies.items() if target in hashes}
+        pairs.extend(copies.items())
+        return _groups(pairs, list(hashes) + list(copies))
+
+    def find_duplicates(self, sessions: List[Dict] = None, perceptual: bool = True) -> Dict:
+        """
+        Run both passes
+
+        Returns:
+            'exact' and 'near' lists of duplicate groups (session IDs). Near
+            groups leave out sessions already listed as exact copies
+        """
+        if sessions is None:
+            sessions = self.store.sessions()
+        exact = self.exact_duplicates(sessions)
+        near = []
+        if perceptual:
+            # Exact copies are already accounted for; keep each exact group's first session
+            copies = {session_id for group in exact for session_id in group[1:]}
+            for group in self.near_duplicates(sessions, exclude=exact):
+                group = [session_id for session_id in group if session_id not in copies]
+                if len(group) > 1:
+                    near.append(group)
+        return {'exact': exact, 'near': near}
+
+def duplicate_savings(groups: List[List[str]], sessions_by_id: Dict[str, Dict]) -> List[Dict]:
+    """
+    Keep the oldest session of each group and count what removing the rest frees
+
+    Returns:
+        One entry per group: kept session, removable sessions and bytes
+    """
+    report = []
+    for group in groups:
+        members = sorted((sessions_by_id[session_id] for session_id in group), key=_age_order)
+        removable = members[1:]
+        report.append({
+            'keep': members[0]['_id'],
+            'remove': [session['_id'] for session in removable],
+            'bytes': sum((s.get('video_size') or 0) + (s.get('analytics_size') or 0) for s in removable)
+        })
+    return report
+
+def main():
+    """Report duplicate videos for a backend"""
+    parser = argparse.ArgumentParser(description="Find duplicate session videos")
+    parser.add_argument("--backend-url", default="http://localhost:5004",
+                        help="Gymnastics analytics backend URL")
+    parser.add_argument("--no-perceptual", action="store_true",
+                        help="Only look for byte-identical videos")
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS, help="Videos hashed at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    client = ApiClient(args.backend_url, pool_size=args.workers)
+    store = SessionStore.for_backend(args.backend_url)
+    store.sync(client)
+
+    detector = DuplicateDetector(client, store, workers=args.workers)
+    sessions = store.sessions()
+    duplicates = detector.find_duplicates(sessions, perceptual=not args.no_perceptual)
+    sessions_by_id = {session['_id']: session for session in sessions}
+    for kind in ('exact', 'near'):
+        report = duplicate_savings(duplicates[kind], sessions_by_id)
+        print(f"🧬 {kind.title()} duplicates: {len(report)} groups, "
+              f"{sum(entry['bytes'] for entry in report) / 1024 / 1024:.2f} MB removable")
+        for entry in report:
+            print(f"   keep {entry['keep']}, remove {', '.join(entry['remove'])}")
+
+if __name__ == "__main__":
+    main()